@@ -0,0 +1,76 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Compares per-tag Modbus decoding with register block decoding for a power quality meter
+that exposes a lot of 32bit float registers.
+
+Usage: python -m tests.benchmarks.modbus_register_block_benchmark [tags count] [polls count]
+"""
+
+import logging
+import sys
+from random import randint
+from time import perf_counter
+
+from thingsboard_gateway.connectors.modbus.bytes_modbus_uplink_converter import BytesModbusUplinkConverter
+from thingsboard_gateway.connectors.modbus.constants import REGISTER_BLOCKS_SECTION
+from thingsboard_gateway.connectors.modbus.register_block import RegisterBlock
+
+
+class DummyResponse:
+    def __init__(self, registers):
+        self.registers = registers
+
+
+def run(tags_count=240, polls=200):
+    logging.disable(logging.CRITICAL)
+
+    device_config = {"deviceName": "Power Meter", "unitId": 1, "byteOrder": "BIG", "wordOrder": "LITTLE",
+                     "timeseries": [{"tag": "value_%i" % i, "type": "32float", "functionCode": 3,
+                                     "address": i * 2, "objectsCount": 2, "multiplier": 1}
+                                    for i in range(tags_count)]}
+    registers = [randint(0, 0xFFFF) for _ in range(tags_count * 2)]
+
+    per_tag_data = {"timeseries": {
+        tag["tag"]: {"data_sent": tag, "input_data": DummyResponse(registers[tag["address"]:tag["address"] + 2])}
+        for tag in device_config["timeseries"]}}
+
+    blocks = RegisterBlock.build_blocks(device_config)
+    block_data = {REGISTER_BLOCKS_SECTION: [
+        (block, DummyResponse(registers[block.address:block.address + block.count])) for block in blocks]}
+
+    converter = BytesModbusUplinkConverter(device_config)
+
+    started = perf_counter()
+    for _ in range(polls):
+        per_tag_result = converter.convert(device_config, per_tag_data)
+    per_tag_time = perf_counter() - started
+    per_tag_result = dict(per_tag_result, telemetry=list(per_tag_result["telemetry"]))
+
+    started = perf_counter()
+    for _ in range(polls):
+        block_result = converter.convert(device_config, block_data)
+    block_time = perf_counter() - started
+
+    assert block_result == per_tag_result
+
+    print("%i tags in %i blocks, %i polls" % (tags_count, len(blocks), polls))
+    print("per-tag decoding: %8.2f ms/poll" % (per_tag_time / polls * 1000))
+    print("block decoding:   %8.2f ms/poll" % (block_time / polls * 1000))
+    print("speedup:          %8.1fx" % (per_tag_time / block_time))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,83 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Compares MQTT topic dispatch through the topic trie with the regex scan over all topic filters.
+
+Usage: python -m tests.benchmarks.mqtt_topic_trie_benchmark [filters count] [messages count]
+"""
+
+import sys
+from random import choice, seed
+from re import fullmatch
+from time import perf_counter
+
+from thingsboard_gateway.connectors.mqtt.topic_trie import TopicTrie
+from thingsboard_gateway.tb_utility.tb_utility import TBUtility
+
+
+def build_filters(count):
+    filters = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            filters.append('site%i/device%i/telemetry' % (i % 50, i))
+        elif kind == 1:
+            filters.append('site%i/+/attributes/%i' % (i % 50, i))
+        elif kind == 2:
+            filters.append('site%i/device%i/#' % (i % 50, i))
+        else:
+            filters.append('+/device%i/+' % i)
+    return filters
+
+
+def build_topics(count, filters_count):
+    return ['site%i/device%i/%s' % (i % 50, choice(range(filters_count)), choice(('telemetry', 'attributes', 'status')))
+            for i in range(count)]
+
+
+def run(filters_count=10000, messages=50000):
+    seed(1)
+    filters = build_filters(filters_count)
+    topics = build_topics(messages, filters_count)
+
+    trie = TopicTrie()
+    for topic_filter in filters:
+        trie.add(topic_filter, topic_filter)
+    regexes = [TBUtility.topic_to_regex(topic_filter) for topic_filter in filters]
+
+    started = perf_counter()
+    trie_matches = 0
+    for topic in topics:
+        trie_matches += len(trie.match(topic))
+    trie_time = perf_counter() - started
+
+    # The regex scan recompiles patterns once there are more filters than the re module caches,
+    # so it is too slow to run over all messages
+    regex_messages = min(messages, 20)
+    started = perf_counter()
+    regex_matches = 0
+    for topic in topics[:regex_messages]:
+        regex_matches += len([regex for regex in regexes if fullmatch(regex, topic)])
+    regex_time = perf_counter() - started
+
+    assert regex_matches == sum(len(trie.match(topic)) for topic in topics[:regex_messages])
+
+    print("%i filters, %i messages (%i for regex scan)" % (filters_count, messages, regex_messages))
+    print("topic trie: %12.0f msg/s" % (messages / trie_time))
+    print("regex scan: %12.0f msg/s" % (regex_messages / regex_time))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
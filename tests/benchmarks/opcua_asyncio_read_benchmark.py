@@ -0,0 +1,129 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+First poll of OpcUaConnectorAsyncIO against a local asyncua server with devices count x variables per device
+variables: the time until the values of all variables have been read and queued for the gateway, and the number
+of subscriptions and monitored items on the server. For comparison, the same variables are read one by one with
+get_child and read_data_value, as the connector did before batching.
+
+Usage: python -m tests.benchmarks.opcua_asyncio_read_benchmark [devices count] [variables per device]
+"""
+
+import asyncio
+import sys
+from threading import Event, Thread
+from time import perf_counter, sleep
+
+from asyncua import Client, Server
+
+from thingsboard_gateway.connectors.opcua_asyncio.opcua_connector import OpcUaConnectorAsyncIO
+
+PORT = 50350
+URL = 'opc.tcp://127.0.0.1:%i/benchmark/' % PORT
+
+
+class GatewayMock:
+    def __init__(self):
+        self.messages = 0
+
+    def send_to_storage(self, connector_name, data):
+        self.messages += 1
+
+
+class ServerThread(Thread):
+    def __init__(self, devices_count, variables_count):
+        super().__init__(daemon=True)
+        self.devices_count = devices_count
+        self.variables_count = variables_count
+        self.loop = asyncio.new_event_loop()
+        self.started = Event()
+        self.server = None
+
+    def run(self):
+        self.loop.run_until_complete(self.__start())
+        self.started.set()
+        self.loop.run_forever()
+
+    async def __start(self):
+        self.server = Server()
+        await self.server.init()
+        self.server.set_endpoint(URL)
+        namespace = await self.server.register_namespace('http://127.0.0.1')
+        for device_number in range(self.devices_count):
+            device = await self.server.nodes.objects.add_object(namespace, 'Device%i' % device_number)
+            await device.add_variable(namespace, 'serialNumber', 'SN-%i' % device_number)
+            for variable_number in range(self.variables_count):
+                await device.add_variable(namespace, 'Variable%i' % variable_number, float(variable_number))
+        await self.server.start()
+
+    def subscriptions(self):
+        subscriptions = self.server.iserver.subscription_service.subscriptions.values()
+        return len(subscriptions), sum(len(subscription.monitored_item_srv._monitored_items)
+                                       for subscription in subscriptions)
+
+
+async def read_one_by_one(devices_count, variables_count):
+    async with Client(URL, timeout=60) as client:
+        started = perf_counter()
+        for device_number in range(devices_count):
+            for variable_number in range(variables_count):
+                variable = await client.nodes.root.get_child(['0:Objects', '2:Device%i' % device_number,
+                                                              '2:Variable%i' % variable_number])
+                await variable.read_data_value()
+        return perf_counter() - started
+
+
+def run(devices_count=100, variables_count=100):
+    server = ServerThread(devices_count, variables_count)
+    server.start()
+    server.started.wait()
+
+    gateway = GatewayMock()
+    connector = OpcUaConnectorAsyncIO(gateway, {"server": {
+        "name": "Benchmark",
+        "url": URL,
+        "timeoutInMillis": 60000,
+        "scanPeriodInMillis": 3600000,
+        "identity": {"type": "anonymous"},
+        "mapping": [{
+            "deviceNodePattern": r"Objects.Device\d+",
+            "deviceNamePattern": r"Objects.Device\d+.serialNumber",
+            "attributes": [],
+            "timeseries": [{"key": "variable%i" % number, "path": "${2:Variable%i}" % number}
+                           for number in range(variables_count)]
+        }]
+    }}, 'opcua_asyncio')
+    started = perf_counter()
+    connector.open()
+    # Every device is sent as one message
+    while gateway.messages + OpcUaConnectorAsyncIO.DATA_TO_SEND.qsize() < devices_count:
+        sleep(.01)
+    first_poll = perf_counter() - started
+    # Monitored items are created after the values have been sent
+    sleep(5)
+    subscriptions, monitored_items = server.subscriptions()
+    connector.close()
+
+    one_by_one = asyncio.run(read_one_by_one(devices_count, variables_count))
+
+    print("%i devices, %i variables" % (devices_count, devices_count * variables_count))
+    print("connector first poll:   %8.2f s (with device discovery)" % first_poll)
+    print("subscriptions:          %8i" % subscriptions)
+    print("monitored items:        %8i" % monitored_items)
+    print("one by one reads:       %8.2f s" % one_by_one)
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
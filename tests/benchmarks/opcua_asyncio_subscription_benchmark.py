@@ -0,0 +1,105 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Subscription throughput of OpcUaConnectorAsyncIO: a local asyncua server changes every variable of devices count x
+variables per device variables in each round, the time until the gateway got every new value of a round is measured.
+
+Usage: python -m tests.benchmarks.opcua_asyncio_subscription_benchmark [devices count] [variables per device] [rounds]
+"""
+
+import asyncio
+import sys
+from threading import Lock
+from time import perf_counter, sleep
+
+from thingsboard_gateway.connectors.opcua_asyncio.opcua_connector import OpcUaConnectorAsyncIO
+from tests.benchmarks.opcua_asyncio_read_benchmark import URL, ServerThread
+
+
+class GatewayMock:
+    def __init__(self):
+        self.lock = Lock()
+        self.messages = 0
+        self.values = {}
+
+    def send_to_storage(self, connector_name, data):
+        with self.lock:
+            self.messages += 1
+            for item in data['telemetry']:
+                for key, value in item['values'].items():
+                    self.values[data['deviceName'], key] = value
+
+    def count(self, value):
+        with self.lock:
+            return sum(1 for current in self.values.values() if current == value)
+
+
+async def write_round(server, devices_count, variables_count, value):
+    namespace = await server.get_namespace_index('http://127.0.0.1')
+    for device_number in range(devices_count):
+        device = await server.nodes.objects.get_child('%i:Device%i' % (namespace, device_number))
+        for variable_number in range(variables_count):
+            variable = await device.get_child('%i:Variable%i' % (namespace, variable_number))
+            await variable.write_value(value)
+
+
+def run(devices_count=100, variables_count=10, rounds=5):
+    server = ServerThread(devices_count, variables_count)
+    server.start()
+    server.started.wait()
+    variables = devices_count * variables_count
+
+    gateway = GatewayMock()
+    connector = OpcUaConnectorAsyncIO(gateway, {"server": {
+        "name": "Benchmark",
+        "url": URL,
+        "timeoutInMillis": 60000,
+        "scanPeriodInMillis": 3600000,
+        "subCheckPeriodInMillis": 100,
+        "identity": {"type": "anonymous"},
+        "mapping": [{
+            "deviceNodePattern": r"Objects.Device\d+",
+            "deviceNamePattern": r"Objects.Device\d+.serialNumber",
+            "attributes": [],
+            "timeseries": [{"key": "variable%i" % number, "path": "${2:Variable%i}" % number}
+                           for number in range(variables_count)]
+        }]
+    }}, 'opcua_asyncio')
+    connector.open()
+    while server.subscriptions()[1] < variables:
+        sleep(.1)
+    sleep(1)
+
+    print("%i devices, %i variables" % (devices_count, variables))
+    delivery_times = []
+    messages = gateway.messages
+    for round_number in range(rounds):
+        value = 1000.0 + round_number
+        started = perf_counter()
+        asyncio.run_coroutine_threadsafe(write_round(server.server, devices_count, variables_count, value),
+                                         server.loop).result()
+        written = perf_counter() - started
+        while gateway.count(value) < variables:
+            sleep(.01)
+        delivery_times.append(perf_counter() - started)
+        print("round %i: written in %6.2f s, delivered in %6.2f s" % (round_number, written, delivery_times[-1]))
+
+    print("notifications per second: %10.0f" % (variables * rounds / sum(delivery_times)))
+    print("messages per round:        %10.1f" % ((gateway.messages - messages) / rounds))
+    connector.close()
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:4]])
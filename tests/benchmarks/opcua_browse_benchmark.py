@@ -0,0 +1,91 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Node search of the OPC-UA connector: a local server has the given number of devices with many variables each,
+two of them are mapped. The time of the first scan and of a rescan of the address space is measured.
+
+Usage: python -m tests.benchmarks.opcua_browse_benchmark [devices count] [variables per device]
+"""
+
+import sys
+from time import perf_counter, sleep
+
+from opcua import Server, ua
+
+from thingsboard_gateway.connectors.opcua.opcua_connector import OpcUaConnector
+
+PORT = 50340
+
+
+class GatewayMock:
+    def __init__(self):
+        self.messages = 0
+
+    def send_to_storage(self, connector_name, data):
+        self.messages += 1
+
+
+def run(devices_count=100, variables_count=50):
+    server = Server()
+    server.set_endpoint('opc.tcp://127.0.0.1:%i/benchmark/' % PORT)
+    server.set_security_policy([ua.SecurityPolicyType.NoSecurity])
+    namespace = server.register_namespace('http://127.0.0.1')
+    for device_number in range(devices_count):
+        device = server.nodes.objects.add_object(namespace, 'Device%i' % device_number)
+        device.add_variable(namespace, 'serialNumber', 'SN-%i' % device_number)
+        sensor = device.add_object(namespace, 'Sensor')
+        for variable_number in range(variables_count):
+            sensor.add_variable(namespace, 'Variable%i' % variable_number, variable_number)
+    server.start()
+
+    gateway = GatewayMock()
+    connector = OpcUaConnector(gateway, {"server": {
+        "name": "Benchmark",
+        "url": "127.0.0.1:%i/benchmark/" % PORT,
+        "timeoutInMillis": 60000,
+        "disableSubscriptions": True,
+        "scanPeriodInMillis": 3600000,
+        "identity": {"type": "anonymous"},
+        "mapping": [{
+            "deviceNodePattern": r"Root\\.Objects\\.Device\d+",
+            "deviceNamePattern": "Device ${serialNumber}",
+            "attributes": [],
+            "timeseries": [{"key": "first", "path": r"${Sensor\.Variable0}"},
+                           {"key": "last", "path": r"${Sensor\.Variable%i}" % (variables_count - 1)}]
+        }]
+    }}, 'opcua')
+    started = perf_counter()
+    connector.open()
+    while gateway.messages < devices_count * 2:
+        sleep(.01)
+    first_scan = perf_counter() - started
+
+    started = perf_counter()
+    connector.scan_nodes_from_config()
+    rescan = perf_counter() - started
+
+    print("%i devices, %i variables per device" % (devices_count, variables_count))
+    print("first scan:   %10.2f s" % first_scan)
+    print("rescan:       %10.2f s" % rescan)
+    browse_index = getattr(connector, 'browse_index', None)
+    if browse_index is not None:
+        print("indexed nodes:  %8i" % len(browse_index))
+        print("browse requests:%8i" % browse_index.browse_requests)
+    connector.close()
+    server.stop()
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,114 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Compares PS content package handling (register decoding and reply building) on hex strings,
+the way it was done before the binary codec, with the binary codec.
+
+Usage: python -m tests.benchmarks.ps_codec_benchmark [registers count] [frames count]
+"""
+
+import re
+import sys
+from random import randint
+from time import perf_counter
+
+from thingsboard_gateway.connectors.ps.ps_codec import RegisterLayout, build_frame, crc16, parse_frame
+from thingsboard_gateway.tb_utility.byte_math_cal import ByteMathCal
+
+DEVICE_FLAG = '0000000000AA'
+SERVER_FLAG = '000000000010'
+
+
+def legacy_xor(content):
+    # ByteMathCal.yihuo before the codec, without printing every byte
+    new_content = ''
+    for i in range(len(content)):
+        if i != 0 and i % 2 == 0:
+            new_content += ' ' + content[i:i + 1]
+        else:
+            new_content += content[i:i + 1]
+    a = 0
+    for value in new_content.split(' '):
+        a ^= int(value, 16)
+    return '%02X' % a
+
+
+def legacy_handle(data, holding_register):
+    msg = bytes.hex(data).upper()
+    server_flag, device_flag = msg[30:42], msg[16:28]
+    modbus_pak_content = msg[42:-6]
+
+    values = []
+    sub_start_index = 0
+    content = modbus_pak_content[8:]
+    for register in holding_register:
+        sub_end_index = sub_start_index + register['registerNum'] * 4
+        param_val = int(content[sub_start_index:sub_end_index], 16)
+        sub_start_index = sub_end_index
+        if register['decimalPlaces'] != 0:
+            param_val = float(param_val) * float('1e-' + str(register['decimalPlaces']))
+        values.append(param_val)
+
+    prefix = '123456' + '001C' + '80' + '01' + '0B' + server_flag + '0B' + device_flag + modbus_pak_content[0:8] \
+        + ByteMathCal.cal_crc16(bytes.fromhex(modbus_pak_content[0:8]))
+    reply = prefix + legacy_xor(prefix)
+    reply = bytes.fromhex(" ".join(re.findall(".{2}", reply)))
+    return values, reply
+
+
+def codec_handle(data, layout):
+    frame = parse_frame(data)
+    values = [value for _, value in layout.decode(frame.payload)]
+    prefix = bytes(frame.payload[0:4])
+    reply = build_frame(0x01, frame.server_flag, frame.device_flag, prefix + crc16(prefix))
+    return values, reply
+
+
+def run(registers_count=60, frames=20000):
+    holding_register = [{"address": 35001 + i, "registerNum": 1, "decimalPlaces": i % 3, "scheme": "无符号"}
+                        for i in range(registers_count)]
+    layout = RegisterLayout(holding_register)
+
+    payloads = []
+    for _ in range(100):
+        registers = bytes(randint(0, 255) for _ in range(registers_count * 2))
+        payloads.append(build_frame(0x01, DEVICE_FLAG, SERVER_FLAG,
+                                    bytes.fromhex('652C') + len(registers).to_bytes(2, 'big') + registers + bytes(2)))
+
+    for payload in payloads:
+        legacy_values, legacy_reply = legacy_handle(payload, holding_register)
+        codec_values, codec_reply = codec_handle(payload, layout)
+        # Hex path drops leading zeros of the CRC, such replies are broken
+        assert legacy_reply == codec_reply or len(legacy_reply) != len(codec_reply)
+        assert all(abs(legacy - codec) < 1e-9 for legacy, codec in zip(legacy_values, codec_values))
+
+    started = perf_counter()
+    for number in range(frames):
+        legacy_handle(payloads[number % 100], holding_register)
+    legacy_time = perf_counter() - started
+
+    started = perf_counter()
+    for number in range(frames):
+        codec_handle(payloads[number % 100], layout)
+    codec_time = perf_counter() - started
+
+    print("%i registers per frame, %i frames" % (registers_count, frames))
+    print("hex strings:  %10.0f frames/s" % (frames / legacy_time))
+    print("binary codec: %10.0f frames/s" % (frames / codec_time))
+    print("speedup:      %10.1fx" % (legacy_time / codec_time))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
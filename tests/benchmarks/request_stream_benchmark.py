@@ -0,0 +1,122 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Memory of the Request connector on a large JSON array response: a local server sends an array of the given size
+in megabytes, the connector converts it with or without "streamResponse". Run each mode in its own process,
+the peak memory of the process is printed.
+
+Usage: python -m tests.benchmarks.request_stream_benchmark [stream|whole] [megabytes]
+"""
+
+import resource
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import perf_counter, sleep
+
+from thingsboard_gateway.connectors.request.request_connector import RequestConnector
+
+DEVICES_COUNT = 100
+ITEMS_PER_CHUNK = 1000
+
+
+def item(number):
+    return '{"name": "Device %i", "temperature": %.1f, "humidity": %i, "serial": "SN-%08i"}' % (
+        number % DEVICES_COUNT, 20 + number % 100 / 10, number % 100, number)
+
+
+class ArrayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        sent = 0
+        number = 0
+        text = '['
+        while sent < self.server.size:
+            text += ', '.join(item(number + offset) for offset in range(ITEMS_PER_CHUNK))
+            number += ITEMS_PER_CHUNK
+            text += ', ' if sent + len(text) < self.server.size else ']'
+            self.write_chunk(text.encode())
+            sent += len(text)
+            text = ''
+        self.write_chunk(b'')
+        self.server.items_count = number
+
+    def write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def log_message(self, *args):
+        pass
+
+
+class GatewayMock:
+    def __init__(self):
+        self.messages = 0
+        self.items = 0
+
+    def send_to_storage(self, connector_name, data):
+        self.messages += 1
+        # Every item has one attribute
+        self.items += len(data['attributes'])
+
+
+def run(mode='stream', megabytes=100):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArrayHandler)
+    server.size = megabytes * 1024 * 1024
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    gateway = GatewayMock()
+    connector = RequestConnector(gateway, {
+        "host": "http://127.0.0.1:%i" % server.server_address[1],
+        "security": {"type": "anonymous"},
+        "scanPeriodJitter": 0,
+        "mapping": [{
+            "url": "array",
+            "timeout": 600,
+            "scanPeriod": 3600,
+            "streamResponse": mode == 'stream',
+            "converter": {
+                "type": "json",
+                "deviceNameJsonExpression": "${name}",
+                "deviceTypeJsonExpression": "default",
+                "attributes": [{"key": "serial", "type": "string", "value": "${serial}"}],
+                "telemetry": [{"key": "temperature", "type": "double", "value": "${temperature}"},
+                              {"key": "humidity", "type": "int", "value": "${humidity}"}]
+            }
+        }]
+    }, 'request')
+    memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = perf_counter()
+    connector.open()
+    while getattr(server, 'items_count', None) is None or gateway.items < server.items_count:
+        sleep(.1)
+    elapsed = perf_counter() - started
+
+    print("mode %s, %i MB response, %i items" % (mode, megabytes, server.items_count))
+    print("messages:     %10i" % gateway.messages)
+    print("time:         %10.1f s" % elapsed)
+    print("peak memory:  %10.0f MB more than before the request" %
+          ((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory_before) / 1024))
+    connector.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    run(sys.argv[1] if len(sys.argv) > 1 else 'stream', *[int(arg) for arg in sys.argv[2:3]])
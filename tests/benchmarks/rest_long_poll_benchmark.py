@@ -0,0 +1,110 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Concurrency test of REST connector endpoints with "responseExpected": the given number of clients post at once
+and wait for the response attribute. ThingsBoard is simulated by replying for every device when all requests are
+in flight, the time until every client got its own response is measured.
+
+Usage: python -m tests.benchmarks.rest_long_poll_benchmark [requests count] [timeout]
+"""
+
+import asyncio
+import sys
+from threading import Event, Thread
+from time import perf_counter, sleep
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+from thingsboard_gateway.connectors.rest.rest_connector import RESTConnector
+
+PORT = 50330
+
+
+class GatewayMock:
+    def __init__(self, expected_count):
+        self.connector = None
+        self.received = 0
+        self.__expected_count = expected_count
+        self.all_received = Event()
+
+    def send_to_storage(self, connector_name, data):
+        self.received += 1
+        if self.received == self.__expected_count:
+            self.all_received.set()
+
+    def reply(self):
+        for number in range(self.__expected_count):
+            self.connector.on_attributes_update({'device': 'Device %i' % number,
+                                                 'data': {'result': 'reply %i' % number}})
+
+
+async def post_all(count, timeout):
+    url = 'http://127.0.0.1:%i/device' % PORT
+    async with ClientSession(connector=TCPConnector(limit=0), timeout=ClientTimeout(total=timeout * 2)) as session:
+        async def post(number):
+            async with session.post(url, json={'name': 'Device %i' % number, 'temp': number}) as response:
+                return response.status, await response.text(), perf_counter()
+
+        return await asyncio.gather(*[post(number) for number in range(count)], return_exceptions=True)
+
+
+def run(count=1000, timeout=30):
+    config = {
+        "name": "Benchmark",
+        "host": "127.0.0.1",
+        "port": PORT,
+        "mapping": [{
+            "endpoint": "/device",
+            "HTTPMethods": ["POST"],
+            "security": {"type": "anonymous"},
+            "converter": {"type": "json", "deviceNameExpression": "${name}", "deviceTypeExpression": "default",
+                          "attributes": [], "timeseries": [{"type": "double", "key": "temp", "value": "${temp}"}]},
+            "response": {"responseExpected": True, "timeout": timeout, "responseAttribute": "result"}
+        }]
+    }
+    gateway = GatewayMock(count)
+    connector = RESTConnector(gateway, config, 'rest')
+    gateway.connector = connector
+    connector.open()
+    while not connector.is_connected():
+        sleep(.1)
+
+    results = []
+    client = Thread(target=lambda: results.extend(asyncio.run(post_all(count, timeout))))
+    started = perf_counter()
+    client.start()
+    in_flight = gateway.all_received.wait(timeout)
+    in_flight_time = perf_counter() - started
+    in_flight_count = gateway.received
+
+    replied = perf_counter()
+    gateway.reply()
+    client.join()
+
+    responses = [result for result in results if not isinstance(result, Exception)]
+    correct = sum(1 for number, (status, text, _) in enumerate(responses)
+                  if status == 200 and text == 'reply %i' % number)
+    print("%i long-poll requests, response timeout %i s" % (count, timeout))
+    print("in flight:    %10i requests after %.2f s" % (in_flight_count, in_flight_time) if in_flight
+          else "in flight:    %10i requests, the rest were not accepted in %i s" % (in_flight_count, timeout))
+    print("correct:      %10i responses" % correct)
+    if responses:
+        print("all replied:  %10.3f s after the responses were published" %
+              (max(finished for _, _, finished in responses) - replied))
+    connector.close()
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,91 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Ingest throughput of the REST connector with the given number of worker processes: client processes post JSON
+over keep-alive connections, the rate of converted messages that reach the storage is measured.
+
+Usage: python -m tests.benchmarks.rest_workers_benchmark [workers count] [seconds] [client processes]
+"""
+
+import sys
+from http.client import HTTPConnection
+from json import dumps
+from multiprocessing import Process
+from time import perf_counter, sleep
+
+from thingsboard_gateway.connectors.rest.rest_connector import RESTConnector
+
+PORT = 50331
+
+
+class GatewayMock:
+    def __init__(self):
+        self.received = 0
+
+    def send_to_storage(self, connector_name, data):
+        self.received += 1
+
+
+def post(seconds):
+    connection = HTTPConnection('127.0.0.1', PORT)
+    body = dumps({'name': 'Device', 'temp': 21.5, 'hum': 40, 'model': 'T1000'})
+    headers = {'Content-Type': 'application/json'}
+    finish = perf_counter() + seconds
+    while perf_counter() < finish:
+        connection.request('POST', '/device', body, headers)
+        connection.getresponse().read()
+    connection.close()
+
+
+def run(workers_count=1, seconds=5, clients_count=4):
+    config = {
+        "name": "Benchmark",
+        "host": "127.0.0.1",
+        "port": PORT,
+        "workersCount": workers_count,
+        "mapping": [{
+            "endpoint": "/device",
+            "HTTPMethods": ["POST"],
+            "security": {"type": "anonymous"},
+            "converter": {"type": "json", "deviceNameExpression": "${name}", "deviceTypeExpression": "default",
+                          "attributes": [{"type": "string", "key": "model", "value": "${model}"}],
+                          "timeseries": [{"type": "double", "key": "temperature", "value": "${temp}"},
+                                         {"type": "double", "key": "humidity", "value": "${hum}"}]}
+        }]
+    }
+    gateway = GatewayMock()
+    connector = RESTConnector(gateway, config, 'rest')
+    connector.open()
+    while not connector.is_connected():
+        sleep(.1)
+
+    clients = [Process(target=post, args=(seconds,)) for _ in range(clients_count)]
+    started = perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    # Batches of the workers that are still on their way
+    sleep(.5)
+    elapsed = perf_counter() - started
+
+    print("%i workers, %i client processes, %i s" % (workers_count, clients_count, seconds))
+    print("received:     %10i messages" % gateway.received)
+    print("throughput:   %10.0f messages/s" % (gateway.received / elapsed))
+    connector.close()
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:4]])
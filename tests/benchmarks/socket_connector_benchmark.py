@@ -0,0 +1,96 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Load test of the socket connector: TCP clients send newline delimited messages at the given rate and
+the time until all of them reach the storage is measured.
+
+Usage: python -m tests.benchmarks.socket_connector_benchmark [messages per second] [seconds] [clients count]
+"""
+
+import socket
+import sys
+from threading import Event, Thread
+from time import perf_counter, sleep
+
+from thingsboard_gateway.connectors.socket.socket_connector import SocketConnector
+
+PORT = 50310
+
+
+class GatewayMock:
+    def __init__(self, expected_count):
+        self.received = 0
+        self.__expected_count = expected_count
+        self.all_received = Event()
+
+    def send_to_storage(self, connector_name, data):
+        self.received += 1
+        if self.received == self.__expected_count:
+            self.all_received.set()
+
+
+def send(client, rate, seconds):
+    message = b'temperature=21.5;humidity=40\n'
+    # Messages are written in 10 ms bursts to hold the rate
+    burst = max(rate // 100, 1)
+    started = perf_counter()
+    for number in range(int(seconds * 100)):
+        client.sendall(message * burst)
+        delay = started + (number + 1) / 100 - perf_counter()
+        if delay > 0:
+            sleep(delay)
+
+
+def run(rate=10000, seconds=5, clients_count=50):
+    clients = []
+    config = {"name": "Benchmark", "type": "TCP", "address": "127.0.0.1", "port": PORT, "bufferSize": 65536,
+              "framing": {"type": "delimiter", "delimiter": "\n"}, "devices": []}
+    for number in range(clients_count):
+        client = socket.socket()
+        client.bind(('127.0.0.1', 0))
+        clients.append(client)
+        config['devices'].append({"address": "127.0.0.1:%i" % client.getsockname()[1],
+                                  "deviceName": "Device %i" % number,
+                                  "telemetry": [{"key": "data", "byteFrom": 0, "byteTo": -1}]})
+
+    client_rate = rate // clients_count
+    expected = client_rate // 100 * 100 * int(seconds) * clients_count if client_rate >= 100 \
+        else int(seconds * 100) * clients_count
+    gateway = GatewayMock(expected)
+    connector = SocketConnector(gateway, config, 'socket')
+    connector.open()
+    sleep(.5)
+
+    for client in clients:
+        client.connect(('127.0.0.1', PORT))
+    senders = [Thread(target=send, args=(client, client_rate, seconds)) for client in clients]
+    started = perf_counter()
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+    gateway.all_received.wait(seconds * 10)
+    elapsed = perf_counter() - started
+
+    print("%i clients, %i messages sent in %.1f s" % (clients_count, expected, seconds))
+    print("received:     %10i messages" % gateway.received)
+    print("throughput:   %10.0f messages/s" % (gateway.received / elapsed))
+    connector.close()
+    for client in clients:
+        client.close()
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:4]])
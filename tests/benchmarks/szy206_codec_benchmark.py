@@ -0,0 +1,166 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+"""
+Compares SZY206 frame handling on hex strings, the way szy206_test.py does it, with the binary codec
+on a recorded-like TCP stream of water level, flow and rainfall reports mixed with link checks.
+
+Usage: python -m tests.benchmarks.szy206_codec_benchmark [frames count] [chunk size]
+"""
+
+import sys
+from datetime import datetime
+from random import Random
+from time import perf_counter, time
+
+from thingsboard_gateway.connectors.syz206.szy206_codec import ACK_FUNCTIONS, build_frame, build_reply, \
+    decode_telemetry, parse_frame
+from thingsboard_gateway.connectors.syz206.szy206_frame_decoder import Szy206FrameDecoder
+from thingsboard_gateway.szy206_test import char_2_string
+
+# Legacy data types: function code -> (hex digits of one value, decimal point position, signed) of every value
+LEGACY_TYPES = {
+    '1': ((6, 5, False),),
+    '2': ((8, 5, True),),
+    '3': ((10, 7, True), (10, 0, True)),
+}
+
+
+def bcd(value, size, negative=False):
+    digits = bytearray.fromhex('%0*d' % (size * 2, value))[::-1]
+    if negative:
+        # Any sign nibble but 0 is negative, the legacy parser only understands digits
+        digits[-1] |= 0x10
+    return bytes(digits)
+
+
+def record(frames_count, seed=0):
+    random = Random(seed)
+    stream = bytearray()
+    for number in range(frames_count):
+        address = bcd(random.randint(0, 99), 5)
+        time_label = bcd(random.randint(0, 59), 1) + bcd(random.randint(0, 59), 1) + bcd(random.randint(0, 23), 1) \
+            + bcd(random.randint(1, 28), 1) + b'\x00'
+        kind = number % 4
+        if kind == 0:
+            data = b''.join(bcd(random.randint(0, 9999999), 4, random.random() < .1) for _ in range(4))
+        elif kind == 1:
+            data = bcd(random.randint(0, 999999999), 5) + bcd(random.randint(0, 999999999), 5)
+        elif kind == 2:
+            data = bcd(random.randint(0, 99999), 3)
+        else:
+            stream += build_frame(0xB0, address, 0x02, b'\xF2')
+            continue
+        # Water level, flow and rainfall function codes
+        stream += build_frame(0xB0 | (2, 3, 1)[kind], address, 0xC0, data + bytes(4) + time_label)
+    return bytes(stream)
+
+
+def legacy_crc(data):
+    value = 0
+    for byte in data:
+        value ^= byte
+        for _ in range(8):
+            value = ((value << 1) ^ 0xE5) & 0xFF if value & 0x80 else (value << 1) & 0xFF
+    return value
+
+
+def legacy_handle(stream):
+    """
+    Splits the stream as a hex string and parses frames like Szy206Parse: the time label goes through strptime,
+    values through char_2_string, the link check and report replies are built as hex strings.
+    """
+    msg = stream.hex().upper()
+    results = []
+    position = 0
+    while position < len(msg):
+        frame_size = int(msg[position + 2:position + 4], 16) * 2 + 10
+        frame = msg[position:position + frame_size]
+        position += frame_size
+
+        control = frame[6:8]
+        station_addr = frame[8:18]
+        afn = frame[18:20]
+        content = frame[20:-4]
+        if legacy_crc(bytes.fromhex(frame[6:-4])) != int(frame[-4:-2], 16):
+            continue
+
+        reply = None
+        if int(afn, 16) in ACK_FUNCTIONS:
+            user_data = '%02X' % (int(control, 16) & 0x3F) + station_addr + afn + (content[:2] if afn == '02' else '')
+            reply = bytes.fromhex('68%02X68' % (len(user_data) // 2) + user_data
+                                  + '%02X16' % legacy_crc(bytes.fromhex(user_data)))
+
+        values = []
+        layout = LEGACY_TYPES.get(control[1])
+        if afn == 'C0' and layout is not None:
+            time = content[-10:-2]
+            now = datetime.now()
+            date_time = datetime.strptime(f"{now.year}/{now.month}/{int(time[6:8])} {int(time[4:6])}:"
+                                          f"{int(time[2:4])}:{int(time[0:2])}", "%Y/%m/%d %H:%M:%S")
+            values.append(date_time.strftime("%Y-%m-%d %H:%M:%S"))
+
+            data_content = content[:-18]
+            point_size = sum(size for size, _, _ in layout)
+            for point in range(0, len(data_content), point_size):
+                offset = point
+                for size, decimal_point, signed in layout:
+                    value = list(data_content[offset:offset + size])
+                    values.append(float(char_2_string(value, decimal_point, signed)))
+                    offset += size
+        results.append((values, reply))
+    return results
+
+
+def codec_handle(chunks):
+    decoder = Szy206FrameDecoder()
+    received_ts = int(time() * 1000)
+    results = []
+    for chunk in chunks:
+        for raw in decoder.feed(chunk):
+            frame = parse_frame(raw)
+            reply = build_reply(frame) if frame.afn in ACK_FUNCTIONS else None
+            results.append((decode_telemetry(frame, received_ts), reply))
+    return results
+
+
+def run(frames_count=20000, chunk_size=1460):
+    stream = record(frames_count)
+    chunks = [stream[position:position + chunk_size] for position in range(0, len(stream), chunk_size)]
+
+    legacy_results = legacy_handle(stream)
+    codec_results = codec_handle(chunks)
+    assert len(legacy_results) == len(codec_results) == frames_count
+    for (legacy_values, legacy_reply), (telemetry, reply) in zip(legacy_results, codec_results):
+        assert legacy_reply == reply
+        if telemetry is not None:
+            codec_values = [value for key, value in telemetry['values'].items() if key != 'status']
+            assert all(abs(legacy - codec) < 1e-6 for legacy, codec in zip(legacy_values[1:], codec_values))
+
+    started = perf_counter()
+    legacy_handle(stream)
+    legacy_time = perf_counter() - started
+
+    started = perf_counter()
+    codec_handle(chunks)
+    codec_time = perf_counter() - started
+
+    print("%i frames, %i bytes in %i byte chunks" % (frames_count, len(stream), chunk_size))
+    print("hex strings:  %10.0f frames/s" % (frames_count / legacy_time))
+    print("binary codec: %10.0f frames/s" % (frames_count / codec_time))
+    print("speedup:      %10.1fx" % (legacy_time / codec_time))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -14,10 +14,12 @@
 #      limitations under the License.
 
 import logging
+import socket
 import unittest
+from threading import Event, Lock
 from unittest.mock import Mock
 from os import path
-from time import sleep
+from time import monotonic, sleep
 import thingsboard_gateway
 from simplejson import load
 
@@ -30,6 +32,66 @@ logging.basicConfig(level=logging.ERROR,
 log = logging.getLogger("root")
 
 
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=10):
+    """Polls condition() until it is true or the timeout passes, returns its last result."""
+    deadline = monotonic() + timeout
+    result = condition()
+    while not result and monotonic() < deadline:
+        sleep(.01)
+        result = condition()
+    return result
+
+
+class GatewayMock:
+    """
+    Gateway double for connectors that are driven over real sockets. Records the data sent to the storage,
+    the registered devices and the RPC replies, all_received is set once expected_count messages are stored.
+    """
+
+    def __init__(self, expected_count=None):
+        self.data = []
+        self.devices = []
+        self.rpc_replies = []
+        self.all_received = Event()
+        self.__expected_count = expected_count
+        self.__received_count = 0
+        self.__lock = Lock()
+
+    def count(self, data):
+        """Number of messages in the data sent to the storage."""
+        return 1
+
+    def send_to_storage(self, connector_name, data):
+        with self.__lock:
+            self.data.append(data)
+            self.__received_count += self.count(data)
+            if self.__received_count == self.__expected_count:
+                self.all_received.set()
+
+    def add_device(self, device_name, content, device_type=None):
+        self.devices.append((device_name, device_type))
+
+    def send_rpc_reply(self, device=None, req_id=None, content=None):
+        self.rpc_replies.append((device, req_id, content))
+
+    def is_rpc_in_progress(self, topic):
+        return False
+
+    def device_names(self):
+        return {data['deviceName'] for data in self.data}
+
+    def telemetry_values(self):
+        """Latest value of every (device name, key) pair of the telemetry with timestamps."""
+        return {(data['deviceName'], key): value for data in self.data for item in data['telemetry']
+                for key, value in item['values'].items()}
+
+
 class ConnectorTestBase(unittest.TestCase):
     DATA_PATH = path.join(path.dirname(path.dirname(path.abspath(__file__))),
                             "data" + path.sep)
@@ -0,0 +1,141 @@
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from time import sleep
+
+from thingsboard_gateway.connectors.http_downlink_executor import HttpDownlinkExecutor
+
+
+class DeviceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            server.requests.append((self.path, body))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            failures = server.failures.get(self.path, 0)
+            server.failures[self.path] = failures - 1
+
+        if self.path == '/slow':
+            sleep(.2)
+        elif self.path == '/timeout':
+            sleep(1)
+        with server.lock:
+            server.in_flight -= 1
+
+        self.send_response(503 if failures > 0 else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_PUT = do_POST
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpDownlinkExecutorTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), DeviceHandler)
+        self.server.lock = Lock()
+        self.server.requests = []
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.failures = {'/unavailable': 2}
+        # The client of /timeout is gone when it is answered
+        self.server.handle_error = lambda request, client_address: None
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.executor = None
+        self.responses = []
+        self.all_responses = Event()
+
+    def tearDown(self):
+        self.executor.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def start_executor(self, expected_count, **config):
+        self.executor = HttpDownlinkExecutor('Test', config).start()
+        self.expected_count = expected_count
+
+    def callback(self, response, error):
+        self.responses.append((response.status_code if response is not None else None, error))
+        if len(self.responses) == self.expected_count:
+            self.all_responses.set()
+
+    def submit(self, path, data='value', method='POST', timeout=5):
+        return self.executor.submit({'method': method, 'url': 'http://127.0.0.1:%i%s' % (self.server.server_address[1],
+                                                                                        path),
+                                     'data': data, 'timeout': timeout}, self.callback)
+
+    def test_requests_per_host_are_limited(self):
+        self.start_executor(12, workers=6, maxConnectionsPerHost=2)
+        for number in range(12):
+            self.submit('/slow', 'value %i' % number)
+
+        self.assertTrue(self.all_responses.wait(5))
+        self.assertEqual(self.responses, [(200, None)] * 12)
+        self.assertEqual(self.server.max_in_flight, 2)
+
+    def test_unavailable_device_is_retried(self):
+        self.start_executor(1, retries=2, retryBackoff=.01)
+        self.submit('/unavailable', method='PUT')
+
+        self.assertTrue(self.all_responses.wait(5))
+        self.assertEqual(self.responses, [(200, None)])
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.executor.statistics['retried'], 2)
+
+    def test_non_idempotent_request_is_not_retried(self):
+        self.start_executor(2, retries=2, retryBackoff=.01)
+        self.submit('/unavailable')
+        self.submit('/timeout', timeout=.2)
+
+        self.assertTrue(self.all_responses.wait(5))
+        self.assertIn((503, None), self.responses)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.executor.statistics['retried'], 0)
+
+    def test_non_idempotent_retry_opt_in(self):
+        self.start_executor(1, retries=2, retryBackoff=.01, retryNonIdempotent=True)
+        self.submit('/unavailable')
+
+        self.assertTrue(self.all_responses.wait(5))
+        self.assertEqual(self.responses, [(200, None)])
+        self.assertEqual(self.executor.statistics['retried'], 2)
+
+    def test_connection_error_after_retries(self):
+        self.start_executor(1, retries=1, retryBackoff=.01)
+        self.executor.submit({'method': 'POST', 'url': 'http://127.0.0.1:1/closed', 'timeout': 1}, self.callback)
+
+        self.assertTrue(self.all_responses.wait(5))
+        self.assertIsNone(self.responses[0][0])
+        self.assertIsNotNone(self.responses[0][1])
+        self.assertEqual(self.executor.statistics['failed'], 1)
+        # The device has not got the request, so it is sent again whatever the method
+        self.assertEqual(self.executor.statistics['retried'], 1)
+
+    def test_identical_requests_are_batched(self):
+        self.start_executor(11, workers=1, batchIdenticalRequests=True)
+        self.submit('/slow', 'first')
+        sleep(.1)
+        for _ in range(10):
+            self.submit('/fast', 'same')
+
+        self.assertTrue(self.all_responses.wait(5))
+        self.assertEqual(self.server.requests, [('/slow', b'first'), ('/fast', b'same')])
+        self.assertEqual(self.executor.statistics['batched'], 9)
+
+    def test_full_queue(self):
+        self.start_executor(0, workers=1, queueSize=1)
+        self.submit('/slow')
+        sleep(.1)
+        self.assertTrue(self.submit('/slow'))
+        self.assertFalse(self.submit('/slow'))
+
+
+if __name__ == '__main__':
+    unittest.main()
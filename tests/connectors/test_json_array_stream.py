@@ -0,0 +1,37 @@
+import unittest
+from json import JSONDecodeError, dumps
+
+from thingsboard_gateway.connectors.request.json_array_stream import iter_json_array
+
+DOCUMENT = [{"name": "first", "values": [1, 2.5, None], "text": "a, ] b"}, 12345, "x", [], {}, True, -0.5e3]
+
+
+def chunked(text, size):
+    return [text[position:position + size] for position in range(0, len(text), size)]
+
+
+class JsonArrayStreamTests(unittest.TestCase):
+    def test_items_are_parsed_for_any_chunk_size(self):
+        text = ' \n' + dumps(DOCUMENT, indent=2) + '\n'
+        for size in range(1, len(text) + 1):
+            self.assertEqual(list(iter_json_array(chunked(text, size))), DOCUMENT, size)
+
+    def test_items_are_yielded_before_the_end(self):
+        items = iter_json_array(iter(['[{"a": 1}, {"b"', ': 2}, ']))
+        self.assertEqual(next(items), {"a": 1})
+        self.assertEqual(next(items), {"b": 2})
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array(['[', ' ]'])), [])
+
+    def test_document_that_is_not_an_array(self):
+        self.assertEqual(list(iter_json_array(['{"a": ', '[1, 2]}'])), [{"a": [1, 2]}])
+
+    def test_broken_documents(self):
+        for text in ('[1, 2', '[{"a": 1}', '[1 2]', '[1], 2', ''):
+            with self.assertRaises(JSONDecodeError, msg=text):
+                list(iter_json_array(chunked(text, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
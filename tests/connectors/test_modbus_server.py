@@ -0,0 +1,100 @@
+import socket
+import unittest
+from copy import deepcopy
+from time import sleep
+
+from thingsboard_gateway.connectors.modbus.server import ArrayDataBlock, ModbusSlaveServer
+
+
+class ArrayDataBlockTests(unittest.TestCase):
+    def test_values_are_stored_in_range(self):
+        block = ArrayDataBlock.from_values({2: [1, 2], 10: [0xFFFF]})
+        self.assertEqual(block.address, 2)
+        self.assertEqual(len(block.values), 9)
+        self.assertTrue(block.validate(2, 9))
+        self.assertFalse(block.validate(1))
+        self.assertFalse(block.validate(10, 2))
+        self.assertEqual(block.getValues(2, 3), [1, 2, 0])
+        self.assertEqual(block.getValues(10), [0xFFFF])
+
+    def test_bits(self):
+        block = ArrayDataBlock.from_values({1: [True, False, True]}, bits=True)
+        block.setValues(2, 1)
+        self.assertEqual(block.getValues(1, 3), [True, True, True])
+
+
+class ModbusSlaveServerTests(unittest.TestCase):
+    CONFIG = {
+        "type": "tcp",
+        "host": "127.0.0.1",
+        "port": 5026,
+        "method": "socket",
+        "deviceName": "Gateway",
+        "byteOrder": "BIG",
+        "wordOrder": "BIG",
+        "values": {
+            "holding_registers": [
+                {
+                    "timeseries": [{"address": 1, "type": "16int", "tag": "temperature", "objectsCount": 1,
+                                    "value": 21}],
+                    "attributeUpdates": [{"address": 2, "type": "32float", "tag": "setPoint", "objectsCount": 2,
+                                          "value": 1.5}],
+                    "rpc": [{"address": 4, "type": "16uint", "tag": "mode", "objectsCount": 1, "value": 1}]
+                }
+            ],
+            "coils_initializer": [
+                {
+                    "attributeUpdates": [{"address": 0, "type": "bits", "tag": "enabled", "objectsCount": 1,
+                                          "value": True}]
+                }
+            ]
+        }
+    }
+
+    def setUp(self):
+        self.server = ModbusSlaveServer(self.CONFIG)
+
+    def test_initial_values(self):
+        self.assertTrue(self.server.has_downlink)
+        self.assertEqual(self.server.read('hr', {"address": 1, "type": "16int", "objectsCount": 1}), 21)
+        self.assertEqual(self.server.read('hr', {"address": 2, "type": "32float", "objectsCount": 2}), 1.5)
+
+    def test_attribute_update(self):
+        self.server.on_attributes_update({"device": "Gateway", "data": {"setPoint": 22.5, "enabled": False}})
+        self.assertEqual(self.server.read('hr', {"address": 2, "type": "32float", "objectsCount": 2}), 22.5)
+        self.assertEqual(self.server.read('co', {"address": 0, "type": "bits", "objectsCount": 1, "bit": 0}), 0)
+
+    def test_rpc(self):
+        result = self.server.server_side_rpc_handler(
+            {"device": "Gateway", "data": {"id": 1, "method": "mode", "params": 3}})
+        self.assertEqual(result, {"success": True})
+        result = self.server.server_side_rpc_handler({"device": "Gateway", "data": {"id": 2, "method": "mode"}})
+        self.assertEqual(result, {"mode": 3})
+        result = self.server.server_side_rpc_handler({"device": "Gateway", "data": {"id": 3, "method": "unknown"}})
+        self.assertEqual(result, {"unknown": "METHOD NOT FOUND!"})
+
+    def test_stop_with_connected_master(self):
+        for server_type, socket_type in (('tcp', socket.SOCK_STREAM), ('udp', socket.SOCK_DGRAM)):
+            with self.subTest(server_type):
+                config = deepcopy(self.CONFIG)
+                config.update({'type': server_type, 'port': 5027})
+                server = ModbusSlaveServer(config)
+                server.start()
+                sleep(.5)
+
+                with socket.socket(socket.AF_INET, socket_type) as master:
+                    master.connect(('127.0.0.1', 5027))
+                    # Read holding register 1 of unit 1
+                    master.send(bytes.fromhex('000100000006010300010001'))
+                    master.settimeout(5)
+                    self.assertEqual(master.recv(64)[-2:], (21).to_bytes(2, 'big'))
+
+                    # Cancelled handlers of connected masters are not errors
+                    with self.assertNoLogs(level='ERROR'):
+                        server.stop()
+                        server.join(5)
+                    self.assertFalse(server.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
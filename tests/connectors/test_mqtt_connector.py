@@ -0,0 +1,92 @@
+import unittest
+from copy import deepcopy
+from types import SimpleNamespace
+
+from thingsboard_gateway.connectors.mqtt.mqtt_connector import MqttConnector
+from tests.connectors.connector_tests_base import GatewayMock, wait_for
+
+MESSAGES_COUNT = 1000
+DEVICES_COUNT = 20
+
+
+class MqttConnectorInboundTests(unittest.TestCase):
+    CONFIG = {
+        "broker": {
+            "name": "Test Broker",
+            "host": "127.0.0.1",
+            "inboundWorkers": 4,
+            "security": {"type": "anonymous"}
+        },
+        "mapping": [
+            {
+                "topicFilter": "sensor/+/data",
+                "converter": {
+                    "type": "json",
+                    "deviceNameTopicExpression": "(?<=sensor/)(.*?)(?=/data)",
+                    "deviceTypeTopicExpression": "sensor",
+                    "timeseries": [{"type": "integer", "key": "counter", "value": "${counter}"}]
+                }
+            }
+        ]
+    }
+
+    def setUp(self):
+        self.gateway = GatewayMock(MESSAGES_COUNT)
+        self.connector = MqttConnector(self.gateway, self.CONFIG, 'mqtt')
+        self.connector._on_connect(self.connector._client, None, None, 0)
+
+    def tearDown(self):
+        self.connector.close()
+
+    def test_messages_of_one_topic_keep_order(self):
+        for number in range(MESSAGES_COUNT):
+            self.connector._on_message(None, None,
+                                       SimpleNamespace(topic='sensor/device%i/data' % (number % DEVICES_COUNT),
+                                                       payload=b'{"counter": %i}' % number))
+
+        # MessagesSent is counted after the data is sent to the storage
+        self.assertTrue(wait_for(lambda: self.connector.statistics['MessagesSent'] == MESSAGES_COUNT))
+        self.assertEqual(len(self.gateway.data), MESSAGES_COUNT)
+
+        counters = {}
+        for data in self.gateway.data:
+            counters.setdefault(data['deviceName'], []).append(int(data['telemetry'][0]['counter']))
+
+        self.assertEqual(len(counters), DEVICES_COUNT)
+        for values in counters.values():
+            self.assertEqual(values, sorted(values))
+
+        statistics = self.connector.statistics
+        self.assertEqual(statistics['MessagesReceived'], MESSAGES_COUNT)
+        self.assertEqual(statistics['MessagesSent'], MESSAGES_COUNT)
+        self.assertGreater(statistics['ConvertLatencyMs'], 0)
+
+
+class MqttConnectorClientsTests(unittest.TestCase):
+    def create_connector(self, **broker_options):
+        config = deepcopy(MqttConnectorInboundTests.CONFIG)
+        config['broker'].update(broker_options)
+        config['mapping'] = [dict(config['mapping'][0], topicFilter='sensor%i/+/data' % number) for number in range(4)]
+        connector = MqttConnector(GatewayMock(0), config, 'mqtt')
+        self.addCleanup(connector.close)
+
+        subscriptions = {}
+        for client in connector._clients:
+            topics = subscriptions[client] = []
+            client.subscribe = lambda topic, qos, topics=topics: (topics.append(topic) or (0, len(topics)))
+        for client in connector._clients:
+            connector._on_connect(client, None, None, 0)
+        return connector, [subscriptions[client] for client in connector._clients]
+
+    def test_topic_filters_are_split_between_clients(self):
+        connector, subscriptions = self.create_connector(clientsCount=2)
+        self.assertEqual(subscriptions, [['sensor0/+/data', 'sensor2/+/data'], ['sensor1/+/data', 'sensor3/+/data']])
+
+    def test_shared_subscriptions(self):
+        connector, subscriptions = self.create_connector(clientsCount=3, sharedSubscriptionGroup='gateway')
+        expected = ['$share/gateway/sensor%i/+/data' % number for number in range(4)]
+        self.assertEqual(subscriptions, [expected] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from thingsboard_gateway.connectors.mqtt.topic_trie import TopicTrie
+
+
+class TopicTrieTests(unittest.TestCase):
+    def setUp(self):
+        self.trie = TopicTrie()
+
+    def test_exact_and_wildcard_filters(self):
+        for topic_filter in ('sensor/data', 'sensor/+', '+/data', 'sensor/#', '#', 'sensor/+/temperature'):
+            self.trie.add(topic_filter, topic_filter)
+
+        self.assertCountEqual(self.trie.match('sensor/data'), ['sensor/data', 'sensor/+', '+/data', 'sensor/#', '#'])
+        self.assertCountEqual(self.trie.match('sensor/1/temperature'), ['sensor/+/temperature', 'sensor/#', '#'])
+        self.assertCountEqual(self.trie.match('sensor'), ['sensor/#', '#'])
+        self.assertCountEqual(self.trie.match('other/topic'), ['#'])
+
+    def test_system_topics_are_not_matched_by_first_level_wildcards(self):
+        self.trie.add('#', 'all')
+        self.trie.add('+/status', 'status')
+        self.trie.add('$SYS/#', 'sys')
+
+        self.assertEqual(self.trie.match('$SYS/status'), ['sys'])
+
+    def test_multiple_handlers_per_filter(self):
+        self.trie.add('sensor/+', 'first')
+        self.trie.add('sensor/+', 'second')
+        self.assertEqual(self.trie.match('sensor/data'), ['first', 'second'])
+        self.assertEqual(len(self.trie), 2)
+
+    def test_remove(self):
+        self.trie.add('sensor/+/data', 'first')
+        self.trie.add('sensor/+/data', 'second')
+        self.trie.remove('sensor/+/data', 'first')
+        self.assertEqual(self.trie.match('sensor/1/data'), ['second'])
+        self.trie.remove('sensor/+/data')
+        self.assertEqual(self.trie.match('sensor/1/data'), [])
+        self.assertEqual(len(self.trie), 0)
+
+    def test_shared_subscription_and_regex_filters(self):
+        self.trie.add('$share/group/sensor/+', 'shared')
+        self.trie.add('sensor/[0-9]+/raw', 'regex')
+
+        self.assertEqual(self.trie.match('sensor/data'), ['shared'])
+        self.assertEqual(self.trie.match('sensor/12/raw'), ['regex'])
+        self.assertEqual(self.trie.match('sensor/ab/raw'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import asyncio
+import unittest
+from threading import Event, Thread
+from time import sleep, time
+
+from asyncua import Server
+
+from thingsboard_gateway.connectors.opcua_asyncio.opcua_connector import OpcUaConnectorAsyncIO
+from tests.connectors.connector_tests_base import GatewayMock, free_port
+
+DEVICES_COUNT = 3
+VARIABLES_COUNT = 5
+
+
+class ServerThread(Thread):
+    def __init__(self, port):
+        super().__init__(daemon=True)
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.started = Event()
+        self.server = None
+        self.variables = {}
+
+    def run(self):
+        self.loop.run_until_complete(self.__start())
+        self.started.set()
+        self.loop.run_forever()
+
+    async def __start(self):
+        self.server = Server()
+        await self.server.init()
+        self.server.set_endpoint('opc.tcp://127.0.0.1:%i/test/' % self.port)
+        namespace = await self.server.register_namespace('http://127.0.0.1')
+        for device_number in range(DEVICES_COUNT):
+            device = await self.server.nodes.objects.add_object(namespace, 'Device%i' % device_number)
+            await device.add_variable(namespace, 'serialNumber', 'SN-%i' % device_number)
+            for variable_number in range(VARIABLES_COUNT):
+                self.variables[device_number, variable_number] = await device.add_variable(
+                    namespace, 'Variable%i' % variable_number, float(device_number * 100 + variable_number))
+                await self.variables[device_number, variable_number].set_writable()
+        await self.server.start()
+
+    def write(self, device_number, variable_number, value):
+        asyncio.run_coroutine_threadsafe(self.variables[device_number, variable_number].write_value(value),
+                                         self.loop).result(5)
+
+    def read(self, device_number, variable_number):
+        return asyncio.run_coroutine_threadsafe(self.variables[device_number, variable_number].read_value(),
+                                                self.loop).result(5)
+
+    def node_id(self, device_number, variable_number):
+        return self.variables[device_number, variable_number].nodeid.to_string()
+
+    def subscriptions_count(self):
+        return len(self.server.iserver.subscription_service.subscriptions)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class OpcUaConnectorAsyncIOTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.port = free_port()
+        cls.server = ServerThread(cls.port)
+        cls.server.start()
+        cls.server.started.wait(30)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.gateway = GatewayMock()
+        self.connector = OpcUaConnectorAsyncIO(self.gateway, {"server": {
+            "name": "Test",
+            "url": "127.0.0.1:%i/test/" % self.port,
+            "scanPeriodInMillis": 60000,
+            "subCheckPeriodInMillis": 50,
+            "maxNodesPerRequest": 4,
+            "identity": {"type": "anonymous"},
+            "mapping": [{
+                "deviceNodePattern": r"Objects.Device\d",
+                "deviceNamePattern": r"Objects.Device\d.serialNumber",
+                "attributes": [],
+                "timeseries": [{"key": "variable%i" % number, "path": "${2:Variable%i}" % number}
+                               for number in range(VARIABLES_COUNT)],
+                "attributes_updates": [{"attributeOnThingsBoard": "target",
+                                        "attributeOnDevice": r"Objects.Device\d.Variable4"}]
+            }]
+        }}, 'opcua_asyncio')
+        self.connector.open()
+
+    def tearDown(self):
+        self.connector.close()
+
+    def wait_for_values(self, expected):
+        started = time()
+        while time() - started < 10:
+            values = self.gateway.telemetry_values()
+            if all(values.get(key) == value for key, value in expected.items()):
+                break
+            sleep(.1)
+        return self.gateway.telemetry_values()
+
+    def test_all_variables_are_read_and_subscribed(self):
+        expected = {('SN-%i' % device_number, 'variable%i' % variable_number): device_number * 100 + variable_number
+                    for device_number in range(DEVICES_COUNT) for variable_number in range(VARIABLES_COUNT)}
+        self.assertEqual(self.wait_for_values(expected), expected)
+        # Each device was paired with its own name
+        self.assertEqual(len({data['deviceName'] for data in self.gateway.data}), DEVICES_COUNT)
+
+        self.server.write(1, 2, 1000.5)
+        self.assertEqual(self.wait_for_values({('SN-1', 'variable2'): 1000.5})[('SN-1', 'variable2')], 1000.5)
+        # One subscription for the devices of the mapping
+        self.assertEqual(self.server.subscriptions_count(), 1)
+
+    def test_notifications_are_sent_in_batches(self):
+        self.wait_for_values({('SN-%i' % device_number, 'variable0'): device_number * 100
+                              for device_number in range(DEVICES_COUNT)})
+        sleep(.5)
+        messages_count = len(self.gateway.data)
+
+        writes_count = 0
+        for value in range(20):
+            for device_number in range(DEVICES_COUNT):
+                for variable_number in range(2):
+                    self.server.write(device_number, variable_number, 500.0 + value)
+                    writes_count += 1
+
+        expected = {('SN-%i' % device_number, 'variable%i' % variable_number): 519.0
+                    for device_number in range(DEVICES_COUNT) for variable_number in range(2)}
+        values = self.wait_for_values(expected)
+        self.assertEqual({key: values[key] for key in expected}, expected)
+        self.assertLess(len(self.gateway.data) - messages_count, writes_count / 2)
+
+    def test_attribute_update_and_rpc(self):
+        self.wait_for_values({('SN-%i' % device_number, 'variable4'): device_number * 100 + 4
+                              for device_number in range(DEVICES_COUNT)})
+
+        # The value is cast to the type of the variable
+        self.connector.on_attributes_update({'device': 'SN-1', 'data': {'target': '42'}})
+        self.assertEqual(self.server.read(1, 4), 42.0)
+        self.assertEqual(self.server.read(0, 4), 4.0)
+
+        node_id = self.server.node_id(2, 3)
+        self.connector.server_side_rpc_handler({'device': 'SN-2', 'data': {'id': 1, 'method': 'set',
+                                                                           'params': node_id + ';value=7.5'}})
+        self.connector.server_side_rpc_handler({'device': 'SN-2', 'data': {'id': 2, 'method': 'get',
+                                                                           'params': node_id}})
+        self.connector.server_side_rpc_handler({'device': 'SN-2', 'data': {'id': 3, 'method': 'unknown'}})
+        self.assertEqual(self.server.read(2, 3), 7.5)
+        self.assertEqual(self.gateway.rpc_replies, [
+            ('SN-2', 1, {'set': {}}),
+            ('SN-2', 2, {'get': {'value': 7.5}}),
+            ('SN-2', 3, {'error': 'unknown - Method not found', 'code': 404})])
+
+
+if __name__ == '__main__':
+    unittest.main()
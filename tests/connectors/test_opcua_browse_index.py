@@ -0,0 +1,95 @@
+import unittest
+from time import sleep, time
+
+from opcua import Server, ua
+
+from thingsboard_gateway.connectors.opcua.opcua_connector import OpcUaConnector
+from tests.connectors.connector_tests_base import GatewayMock, free_port
+
+DEVICES_COUNT = 3
+
+
+class OpcUaBrowseIndexTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.port = free_port()
+        cls.server = Server()
+        cls.server.set_endpoint('opc.tcp://127.0.0.1:%i/test/' % cls.port)
+        cls.server.set_security_policy([ua.SecurityPolicyType.NoSecurity])
+        cls.namespace = cls.server.register_namespace('http://127.0.0.1')
+        for number in range(1, DEVICES_COUNT + 1):
+            cls.add_device(number)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    @classmethod
+    def add_device(cls, number):
+        device = cls.server.nodes.objects.add_object(cls.namespace, 'Device%i' % number)
+        device.add_variable(cls.namespace, 'serialNumber', 'SN-%i' % number)
+        sensor = device.add_object(cls.namespace, 'Sensor')
+        sensor.add_variable(cls.namespace, 'Temperature', 20.0 + number)
+
+    def setUp(self):
+        self.gateway = GatewayMock()
+        self.connector = OpcUaConnector(self.gateway, {"server": {
+            "name": "Test",
+            "url": "127.0.0.1:%i/test/" % self.port,
+            "timeoutInMillis": 5000,
+            "subCheckPeriodInMillis": 100,
+            "identity": {"type": "anonymous"},
+            "mapping": [{
+                "deviceNodePattern": r"Root\\.Objects\\.Device\d",
+                "deviceNamePattern": "Device ${serialNumber}",
+                "attributes": [],
+                "timeseries": [{"key": "temperature", "path": r"${Sensor\.Temperature}"}]
+            }]
+        }}, 'opcua')
+        self.connector.open()
+
+    def tearDown(self):
+        self.connector.close()
+
+    def wait_for_devices(self, count):
+        started = time()
+        while len(self.gateway.device_names()) < count and time() - started < 10:
+            sleep(.1)
+        return self.gateway.device_names()
+
+    def test_rescan_uses_index(self):
+        self.assertEqual(self.wait_for_devices(DEVICES_COUNT),
+                         {'Device SN-%i' % number for number in range(1, DEVICES_COUNT + 1)})
+        browse_requests = self.connector.browse_index.browse_requests
+        # Objects node, then every device and its sensor
+        self.assertLessEqual(browse_requests, 1 + 2 * DEVICES_COUNT)
+
+        self.connector.scan_nodes_from_config()
+        self.assertEqual(self.connector.browse_index.browse_requests, browse_requests)
+        self.assertEqual(self.connector.get_node_path(self.server.nodes.objects.get_child('%i:Device1' % self.namespace)),
+                         r'Root\.Objects\.Device1')
+
+    def test_model_change_event_refreshes_index(self):
+        self.wait_for_devices(DEVICES_COUNT)
+        sleep(.5)
+        self.add_device(DEVICES_COUNT + 1)
+        try:
+            generator = self.server.get_event_generator(ua.ObjectIds.GeneralModelChangeEventType)
+            change = ua.ModelChangeStructureDataType()
+            change.Affected = self.server.nodes.objects.nodeid
+            change.Verb = 4
+            generator.event.Changes = [change]
+            # The event generator does not encode structure fields by their data type
+            generator.event.data_types['Changes'] = ua.VariantType.ExtensionObject
+            generator.trigger()
+
+            self.assertIn('Device SN-%i' % (DEVICES_COUNT + 1), self.wait_for_devices(DEVICES_COUNT + 1))
+        finally:
+            self.server.delete_nodes([self.server.nodes.objects.get_child('%i:Device%i' % (self.namespace,
+                                                                                          DEVICES_COUNT + 1))],
+                                     recursive=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
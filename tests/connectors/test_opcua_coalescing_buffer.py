@@ -0,0 +1,77 @@
+import unittest
+from time import sleep
+
+from thingsboard_gateway.connectors.opcua.coalescing_buffer import CoalescingBuffer
+
+
+def converted(device_name, attributes=(), telemetry=()):
+    return {'deviceName': device_name, 'deviceType': 'default', 'attributes': list(attributes),
+            'telemetry': list(telemetry)}
+
+
+class CoalescingBufferTests(unittest.TestCase):
+    def test_latest_value_per_key(self):
+        buffer = CoalescingBuffer()
+        for ts in range(1, 4):
+            buffer.append(converted('Device 1', attributes=[{'state': 'state %i' % ts}],
+                                    telemetry=[{'ts': ts, 'values': {'temperature': ts * 10}}]))
+            buffer.append(converted('Device 2', telemetry=[{'ts': ts, 'values': {'humidity': ts}}]))
+        buffer.append(converted('Device 1', telemetry=[{'ts': 2, 'values': {'pressure': 5}}]))
+
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.flush(), [
+            {'deviceName': 'Device 1', 'deviceType': 'default', 'attributes': [{'state': 'state 3'}],
+             'telemetry': [{'ts': 3, 'values': {'temperature': 30}}, {'ts': 2, 'values': {'pressure': 5}}]},
+            {'deviceName': 'Device 2', 'deviceType': 'default', 'attributes': [],
+             'telemetry': [{'ts': 3, 'values': {'humidity': 3}}]}])
+        self.assertEqual(buffer.flush(), [])
+
+    def test_keep_history(self):
+        buffer = CoalescingBuffer(keep_history=True)
+        for ts in range(1, 4):
+            buffer.append(converted('Device', telemetry=[{'ts': ts, 'values': {'temperature': ts * 10}}]))
+            buffer.append(converted('Device', telemetry=[{'ts': ts, 'values': {'humidity': ts}}]))
+
+        self.assertEqual(buffer.flush()[0]['telemetry'], [{'ts': ts, 'values': {'temperature': ts * 10, 'humidity': ts}}
+                                                          for ts in range(1, 4)])
+
+    def test_keep_history_without_timestamp(self):
+        buffer = CoalescingBuffer(keep_history=True)
+        for value in range(1, 4):
+            buffer.append(converted('Device', telemetry=[{'t': value}]))
+
+        telemetry = buffer.flush()[0]['telemetry']
+        self.assertEqual([item['values'] for item in telemetry], [{'t': 1}, {'t': 2}, {'t': 3}])
+        self.assertEqual(sorted(item['ts'] for item in telemetry), [item['ts'] for item in telemetry])
+        self.assertEqual(len({item['ts'] for item in telemetry}), 3)
+
+    def test_telemetry_without_timestamp(self):
+        buffer = CoalescingBuffer()
+        buffer.append(converted('Device', telemetry=[{'temperature': 10}]))
+        buffer.append(converted('Device', telemetry=[{'temperature': 20}, {'humidity': 1}]))
+        self.assertEqual(buffer.flush()[0]['telemetry'], [{'temperature': 20, 'humidity': 1}])
+
+        # It would be dropped by the gateway next to telemetry with timestamps
+        buffer.append(converted('Device', telemetry=[{'temperature': 10}, {'ts': 1, 'values': {'humidity': 1}}]))
+        telemetry = buffer.flush()[0]['telemetry']
+        self.assertEqual(telemetry[0], {'ts': 1, 'values': {'humidity': 1}})
+        self.assertEqual(telemetry[1]['values'], {'temperature': 10})
+
+    def test_window(self):
+        buffer = CoalescingBuffer(window=.2)
+        buffer.append(converted('Device', telemetry=[{'temperature': 10}]))
+        self.assertEqual(buffer.flush(), [])
+        sleep(.2)
+        self.assertEqual(len(buffer.flush()), 1)
+
+        buffer.append(converted('Device', telemetry=[{'temperature': 10}]))
+        self.assertEqual(len(buffer.flush(force=True)), 1)
+
+    def test_failed_conversion_is_skipped(self):
+        buffer = CoalescingBuffer()
+        buffer.append(None)
+        self.assertEqual(buffer.flush(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from random import Random
+
+from pymodbus.utilities import computeCRC
+
+from thingsboard_gateway.connectors.ps.ps_codec import RegisterLayout, build_frame, crc16, get_function, parse_frame
+from thingsboard_gateway.connectors.ps.ps_constant import ProtocolTypeEnum
+from thingsboard_gateway.connectors.ps.ps_frame_decoder import PsFrameDecoder
+from thingsboard_gateway.tb_utility.byte_math_cal import ByteMathCal
+
+DEVICE_FLAG = '0000000000AA'
+SERVER_FLAG = '000000000010'
+
+HOLDING_REGISTER = [
+    {"address": 35001, "registerNum": 1, "decimalPlaces": 0, "scheme": "无符号"},
+    {"address": 35002, "registerNum": 2, "decimalPlaces": 2, "scheme": "无符号"},
+    {"address": 35004, "registerNum": 1, "decimalPlaces": 1, "scheme": "有符号"},
+    {"address": 35006, "registerNum": 2, "decimalPlaces": 0, "scheme": "double"},
+    {"address": 35008, "registerNum": 1, "decimalPlaces": 0, "scheme": "", "unit": "按位解释",
+     "refs": [{"keyVal": "door"}, {"keyVal": "power"}, {"keyVal": "alarm"}]},
+]
+
+
+class PsCodecTests(unittest.TestCase):
+    def test_crc16(self):
+        for data, expected in ((b'', 'ffff'),
+                               (bytes.fromhex('01030000000A'), 'c5cd'),
+                               (b'123456789', '374b')):
+            with self.subTest(data=data.hex()):
+                self.assertEqual(crc16(data).hex(), expected)
+
+        random = Random(0)
+        for _ in range(50):
+            data = bytes(random.getrandbits(8) for _ in range(random.randint(1, 40)))
+            with self.subTest(data=data.hex()):
+                self.assertEqual(crc16(data), computeCRC(data).to_bytes(2, 'big'))
+                # ByteMathCal swaps the halves of the hex string without padding it
+                value = hex(int.from_bytes(crc16(data), 'little'))[2:]
+                self.assertEqual(ByteMathCal.cal_crc16(data), value[2:] + value[:2])
+
+    def test_heartbeat_reply(self):
+        reply = build_frame(0x06, SERVER_FLAG, DEVICE_FLAG, b'\x55')
+        self.assertEqual(reply.hex().upper(), '123456001780060B0000000000100B0000000000AA550E')
+        self.assertEqual(PsFrameDecoder().feed(reply), [reply])
+
+    def test_parse_frame(self):
+        frame = parse_frame(build_frame(0x01, DEVICE_FLAG, SERVER_FLAG, bytes.fromhex('652C0008') + bytes(8)))
+        self.assertEqual(frame.device_flag, DEVICE_FLAG)
+        self.assertEqual(frame.server_flag, SERVER_FLAG)
+        self.assertEqual(frame.pack_type, 0x01)
+        self.assertEqual(get_function(frame), ProtocolTypeEnum.CONTENT)
+        self.assertEqual(get_function(parse_frame(build_frame(0x06, DEVICE_FLAG, SERVER_FLAG, b'\x33'))),
+                         ProtocolTypeEnum.REGISTER)
+
+    def test_register_layout(self):
+        registers = bytes.fromhex('0102'        # 35001 unsigned
+                                  '00012345'    # 35002-35003 unsigned, 2 decimal places
+                                  'FFF6'        # 35004 signed, 1 decimal place
+                                  '0000'        # 35005 not configured
+                                  '00001234'    # 35006-35007 BCD
+                                  '0500')       # 35008 flags in the first byte
+        values = RegisterLayout(HOLDING_REGISTER).decode(memoryview(bytes.fromhex('652C0012') + registers))
+
+        self.assertEqual([value for _, value in values], [258, 745.65, -1.0, 1234.0, 1, 0, 1, (1, 0, 1)])
+        self.assertEqual([config.get('keyVal') for config, _ in values[4:7]], ['door', 'power', 'alarm'])
+
+        telemetry = RegisterLayout(HOLDING_REGISTER).telemetry(memoryview(bytes.fromhex('652C0012') + registers))
+        self.assertEqual(telemetry, {'35001': 258, '35002': 745.65, '35004': -1.0, '35006': 1234.0,
+                                     'door': 1, 'power': 0, 'alarm': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
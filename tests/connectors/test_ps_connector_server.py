@@ -0,0 +1,155 @@
+import socket
+import unittest
+from threading import Event, Lock, current_thread
+from time import sleep
+
+from thingsboard_gateway.connectors.ps.ps_codec import build_frame, crc16
+from thingsboard_gateway.connectors.ps.ps_connector import PsConnector
+from thingsboard_gateway.connectors.ps.ps_frame_decoder import PsFrameDecoder
+from thingsboard_gateway.connectors.ps.ps_global_variable import clients
+from tests.connectors.connector_tests_base import GatewayMock
+
+PORT = 50330
+SERVER_FLAG = '000000000010'
+DEVICE_FLAGS = ['0000000000A%i' % number for number in range(4)]
+CONTENT_PREFIX = bytes.fromhex('652C0002')
+
+
+def heartbeat(device_flag):
+    return build_frame(0x06, device_flag, SERVER_FLAG, b'\x33')
+
+
+def content(device_flag, value):
+    return build_frame(0x01, device_flag, SERVER_FLAG, CONTENT_PREFIX + value.to_bytes(2, 'big'))
+
+
+class PsGatewayMock(GatewayMock):
+    """Counts telemetry entries, records the worker that sent the data and can hold device registration."""
+
+    def __init__(self, expected_count):
+        super().__init__(expected_count)
+        self.workers = []
+        self.__lock = Lock()
+        self.device_added = Event()
+        self.add_device_allowed = Event()
+        self.add_device_allowed.set()
+
+    def count(self, data):
+        return len(data['telemetry'])
+
+    def add_device(self, device_name, content, device_type=None):
+        super().add_device(device_name, content, device_type)
+        self.device_added.set()
+        self.add_device_allowed.wait(5)
+
+    def send_to_storage(self, connector_name, data):
+        # Workers and data stay aligned
+        with self.__lock:
+            self.workers.append(current_thread().name)
+            super().send_to_storage(connector_name, data)
+
+
+class PsConnectorTests(unittest.TestCase):
+    def setUp(self):
+        self.config = {
+            "host": "127.0.0.1",
+            "port": PORT,
+            "workersCount": 1,
+            "deviceType": "RTU",
+            "holdingRegister": [{"address": 35001, "registerNum": 1, "decimalPlaces": 0, "scheme": "无符号"}]
+        }
+        self.connector = None
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        if self.connector is not None:
+            self.connector.close()
+
+    def open(self, expected_count, **config):
+        self.config.update(config)
+        self.gateway = PsGatewayMock(expected_count)
+        self.connector = PsConnector(self.gateway, self.config, 'ps')
+        self.connector.open()
+        sleep(.2)
+
+    def connect(self):
+        client = socket.create_connection(('127.0.0.1', PORT))
+        client.settimeout(5)
+        self.clients.append(client)
+        return client
+
+    @staticmethod
+    def receive(client, count):
+        decoder = PsFrameDecoder()
+        frames = []
+        while len(frames) < count:
+            data = client.recv(1024)
+            if not data:
+                break
+            frames += decoder.feed(data)
+        return frames
+
+    def test_heartbeat_registers_device_and_is_acknowledged(self):
+        self.open(0)
+        client = self.connect()
+        client.sendall(heartbeat(DEVICE_FLAGS[0]))
+
+        self.assertEqual(self.receive(client, 1), [build_frame(0x06, SERVER_FLAG, DEVICE_FLAGS[0], b'\x55')])
+        self.assertEqual(self.gateway.devices, [('PS ' + DEVICE_FLAGS[0], 'RTU')])
+        self.assertIn(str(client.getsockname()), clients)
+
+        # The device is registered once, the connection is forgotten when it is closed
+        client.sendall(heartbeat(DEVICE_FLAGS[0]))
+        self.assertEqual(len(self.receive(client, 1)), 1)
+        self.assertEqual(len(self.gateway.devices), 1)
+        address = str(client.getsockname())
+        client.close()
+        sleep(.2)
+        self.assertNotIn(address, clients)
+
+    def test_content_is_acknowledged_and_sent_as_one_batch(self):
+        self.open(10)
+        client = self.connect()
+        # The worker waits on the device registration while the content frames are queued
+        self.gateway.add_device_allowed.clear()
+        client.sendall(heartbeat(DEVICE_FLAGS[0]))
+        self.assertTrue(self.gateway.device_added.wait(5))
+        client.sendall(b''.join(content(DEVICE_FLAGS[0], value) for value in range(10)))
+        sleep(.2)
+        self.gateway.add_device_allowed.set()
+
+        reply = build_frame(0x01, SERVER_FLAG, DEVICE_FLAGS[0], CONTENT_PREFIX + crc16(CONTENT_PREFIX))
+        self.assertEqual(self.receive(client, 11)[1:], [reply] * 10)
+        self.assertTrue(self.gateway.all_received.wait(5))
+
+        self.assertEqual(len(self.gateway.data), 1)
+        data = self.gateway.data[0]
+        self.assertEqual(data['deviceName'], 'PS ' + DEVICE_FLAGS[0])
+        self.assertEqual(data['deviceType'], 'RTU')
+        self.assertEqual([telemetry['values'] for telemetry in data['telemetry']],
+                         [{'35001': value} for value in range(10)])
+        self.assertEqual(self.connector.statistics, {'MessagesReceived': 11, 'MessagesSent': 10})
+
+    def test_frames_of_one_device_go_to_one_worker(self):
+        self.open(len(DEVICE_FLAGS) * 20, workersCount=4)
+        connections = [self.connect() for _ in DEVICE_FLAGS]
+        for value in range(20):
+            for client, device_flag in zip(connections, DEVICE_FLAGS):
+                client.sendall(content(device_flag, value))
+        self.assertTrue(self.gateway.all_received.wait(10))
+
+        for device_flag in DEVICE_FLAGS:
+            with self.subTest(device=device_flag):
+                batches = [(worker, data) for worker, data in zip(self.gateway.workers, self.gateway.data)
+                           if data['deviceName'] == 'PS ' + device_flag]
+                self.assertEqual(len({worker for worker, _ in batches}), 1)
+                self.assertEqual([telemetry['values']['35001'] for _, data in batches
+                                  for telemetry in data['telemetry']], list(range(20)))
+        self.assertEqual(self.connector.statistics['MessagesReceived'], len(DEVICE_FLAGS) * 20)
+        self.assertEqual(self.connector.statistics['MessagesSent'], len(DEVICE_FLAGS) * 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from functools import reduce
+from operator import xor
+from random import Random
+
+from thingsboard_gateway.connectors.ps.ps_frame_decoder import PsFrameDecoder, xor_checksum
+
+
+def build_frame(body: bytes) -> bytes:
+    frame = bytearray(b'\x12\x34\x56')
+    frame += (len(body) + 6).to_bytes(2, 'big')
+    frame += body
+    frame.append(reduce(xor, frame, 0))
+    return bytes(frame)
+
+
+HEARTBEAT = build_frame(bytes.fromhex('8006') + b'\x0b' + bytes(range(1, 7)) + b'\x0b' + bytes(range(7, 13)) + b'\x33')
+CONTENT = build_frame(bytes.fromhex('8001') + b'\x0b' + bytes(range(1, 7)) + b'\x0b' + bytes(range(7, 13))
+                      + bytes.fromhex('652c0008') + bytes(range(40)) + b'\x00\x00')
+
+
+class PsFrameDecoderTests(unittest.TestCase):
+    def setUp(self):
+        self.decoder = PsFrameDecoder()
+
+    def test_xor_checksum(self):
+        random = Random(0)
+        for size in (0, 1, 2, 3, 7, 22, 64, 1000):
+            data = bytes(random.getrandbits(8) for _ in range(size))
+            self.assertEqual(xor_checksum(data), reduce(xor, data, 0))
+            self.assertEqual(xor_checksum(memoryview(data)), reduce(xor, data, 0))
+
+    def test_merged_frames(self):
+        self.assertEqual(self.decoder.feed(HEARTBEAT + CONTENT + HEARTBEAT), [HEARTBEAT, CONTENT, HEARTBEAT])
+        self.assertEqual(len(self.decoder), 0)
+
+    def test_split_frames(self):
+        stream = HEARTBEAT + CONTENT + HEARTBEAT
+        frames = []
+        for position in range(0, len(stream), 5):
+            frames.extend(self.decoder.feed(stream[position:position + 5]))
+        self.assertEqual(frames, [HEARTBEAT, CONTENT, HEARTBEAT])
+
+    def test_resync_after_garbage_and_broken_frame(self):
+        broken = bytearray(CONTENT)
+        broken[-1] ^= 0xFF
+        self.assertEqual(self.decoder.feed(b'\x00\x12\x34' + bytes(broken) + HEARTBEAT), [HEARTBEAT])
+        self.assertEqual(self.decoder.bad_frames, 1)
+        self.assertGreater(self.decoder.dropped_bytes, 0)
+
+    def test_partial_sync_header_is_kept(self):
+        self.assertEqual(self.decoder.feed(b'\xff\xff' + HEARTBEAT[:2]), [])
+        self.assertEqual(self.decoder.feed(HEARTBEAT[2:]), [HEARTBEAT])
+
+
+if __name__ == '__main__':
+    unittest.main()
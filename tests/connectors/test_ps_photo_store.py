@@ -0,0 +1,88 @@
+import unittest
+from os import listdir, path
+from tempfile import TemporaryDirectory
+from time import sleep
+
+from thingsboard_gateway.connectors.ps.ps_codec import build_frame, parse_frame
+from thingsboard_gateway.connectors.ps.ps_package_process import PhotoProcess
+from thingsboard_gateway.connectors.ps.ps_photo_store import MemoryPhotoStore
+
+DEVICE_FLAG = '0000000000AA'
+SERVER_FLAG = '000000000010'
+
+
+def photo_head(packets_count):
+    payload = bytearray(15)
+    payload[0:2] = b'\x65\xEB'
+    payload[11] = packets_count
+    return build_frame(0x01, DEVICE_FLAG, SERVER_FLAG, bytes(payload))
+
+
+def photo_packet(number, data):
+    return build_frame(0x01, DEVICE_FLAG, SERVER_FLAG, b'\x65\xEB' + bytes(5) + bytes([number, 0]) + data + bytes(2))
+
+
+class MemoryPhotoStoreTests(unittest.TestCase):
+    def test_packets_are_ordered(self):
+        store = MemoryPhotoStore()
+        store.start('device', 3)
+        self.assertFalse(store.add('device', 3, b'c'))
+        self.assertFalse(store.add('device', 1, b'aa'))
+        # Slots of both full size packets are allocated with the first one
+        self.assertEqual(store.size, 5)
+        self.assertTrue(store.add('device', 2, b'bb'))
+        self.assertEqual(b''.join(store.pop('device')), b'aabbc')
+        self.assertEqual(store.size, 0)
+
+    def test_packet_of_other_size_drops_photo(self):
+        store = MemoryPhotoStore()
+        store.start('device', 3)
+        store.add('device', 1, b'aa')
+        self.assertFalse(store.add('device', 2, b'bbb'))
+        self.assertFalse(store.add('device', 4, b'd'))
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.size, 0)
+
+    def test_packet_without_head_is_ignored(self):
+        store = MemoryPhotoStore()
+        self.assertFalse(store.add('device', 1, b'a'))
+        self.assertEqual(len(store), 0)
+
+    def test_memory_cap_drops_oldest_photo(self):
+        store = MemoryPhotoStore(max_memory=10)
+        store.start('first', 2)
+        store.add('first', 1, b'12345678')
+        store.start('second', 2)
+        store.add('second', 1, b'1234')
+        self.assertEqual(store.pop('first'), [])
+        self.assertEqual(b''.join(store.pop('second')), b'1234')
+
+    def test_expired_photo_is_dropped(self):
+        store = MemoryPhotoStore(ttl=0.01)
+        store.start('device', 2)
+        store.add('device', 1, b'a')
+        sleep(.02)
+        self.assertFalse(store.add('device', 2, b'b'))
+        self.assertEqual(len(store), 0)
+
+
+class PhotoProcessTests(unittest.TestCase):
+    def test_photo_is_saved(self):
+        store = MemoryPhotoStore()
+        chunks = [bytes([number]) * 100 for number in range(1, 4)]
+        frames = [photo_head(4)] + [photo_packet(number, chunks[number - 1]) for number in (2, 1, 3)]
+
+        with TemporaryDirectory() as photo_path:
+            for frame in frames:
+                process = PhotoProcess(None, parse_frame(frame), None, store, photo_path)
+                process.convert()
+                process.process()
+
+            files = listdir(photo_path)
+            self.assertEqual(len(files), 1)
+            with open(path.join(photo_path, files[0]), 'rb') as file:
+                self.assertEqual(file.read(), b''.join(chunks))
+
+
+if __name__ == '__main__':
+    unittest.main()
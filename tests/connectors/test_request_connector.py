@@ -0,0 +1,138 @@
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from threading import Lock, Thread
+from time import sleep
+
+from thingsboard_gateway.connectors.request.request_connector import RequestConnector
+from tests.connectors.connector_tests_base import GatewayMock
+
+
+class EndpointsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.in_flight[self.path] = server.in_flight.get(self.path, 0) + 1
+            server.max_in_flight[self.path] = max(server.max_in_flight.get(self.path, 0), server.in_flight[self.path])
+            server.counts[self.path] = server.counts.get(self.path, 0) + 1
+
+        if self.path == '/slow':
+            sleep(.5)
+        if self.path in ('/list', '/stream'):
+            body = dumps([{'name': 'Device %i' % (number % 2), 'value': number} for number in range(50)]).encode()
+        else:
+            body = dumps({'name': self.path.strip('/'), 'value': server.counts[self.path]}).encode()
+
+        with server.lock:
+            server.in_flight[self.path] -= 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def endpoint_config(url, scan_period):
+    return {
+        "url": url,
+        "httpMethod": "GET",
+        "timeout": 5,
+        "scanPeriod": scan_period,
+        "converter": {
+            "type": "json",
+            "deviceNameJsonExpression": "${name}",
+            "deviceTypeJsonExpression": "default",
+            "attributes": [],
+            "telemetry": [{"key": "value", "type": "int", "value": "${value}"}]
+        }
+    }
+
+
+class RequestConnectorTestsBase(unittest.TestCase):
+    MAPPING = []
+    RPC = []
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), EndpointsHandler)
+        self.server.lock = Lock()
+        self.server.connections = set()
+        self.server.in_flight = {}
+        self.server.max_in_flight = {}
+        self.server.counts = {}
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.gateway = GatewayMock()
+        self.connector = RequestConnector(self.gateway, {
+            "host": "http://127.0.0.1:%i" % self.server.server_address[1],
+            "security": {"type": "anonymous"},
+            "maxConnections": 4,
+            "scanPeriodJitter": 0,
+            "mapping": self.MAPPING,
+            "serverSideRpc": self.RPC
+        }, 'request')
+        self.connector.open()
+
+    def tearDown(self):
+        self.connector.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RequestConnectorSchedulerTests(RequestConnectorTestsBase):
+    MAPPING = [endpoint_config("slow", .1), endpoint_config("fast", .1)]
+
+    def test_one_request_in_flight_per_endpoint(self):
+        sleep(2)
+        self.assertEqual(self.server.max_in_flight['/slow'], 1)
+        self.assertLessEqual(self.server.counts['/slow'], 4)
+        # The slow endpoint does not hold back the fast one
+        self.assertGreater(self.server.counts['/fast'], 10)
+        self.assertGreater(self.connector.statistics['MissedScans'], 0)
+
+        devices = {data['deviceName'] for data in self.gateway.data}
+        self.assertEqual(devices, {'slow', 'fast'})
+
+    def test_connections_are_kept_alive(self):
+        sleep(1)
+        self.assertGreater(sum(self.server.counts.values()), 10)
+        self.assertLessEqual(len(self.server.connections), 2)
+
+
+class RequestConnectorArrayResponseTests(RequestConnectorTestsBase):
+    MAPPING = [endpoint_config("list", 60), {**endpoint_config("stream", 60), "streamResponse": True,
+                                              "streamBatchSize": 10}]
+
+    def test_all_items_are_sent(self):
+        sleep(1)
+        self.assertEqual(self.server.counts, {'/list': 1, '/stream': 1})
+        values = sorted(int(item['value']) for data in self.gateway.data for item in data['telemetry'])
+        self.assertEqual(values, sorted(list(range(50)) * 2))
+        for data in self.gateway.data:
+            self.assertEqual({int(item['value']) % 2 for item in data['telemetry']}, {int(data['deviceName'][-1])})
+
+        # The list response is sent as one message per device, the stream in batches of 10 items
+        self.assertEqual(len(self.gateway.data), 2 + 50 // 10 * 2)
+
+
+class RequestConnectorRpcTests(RequestConnectorTestsBase):
+    RPC = [{"deviceNameFilter": ".*", "methodFilter": "read", "httpMethod": "GET",
+            "requestUrlExpression": "${methodName}", "valueExpression": ""}]
+
+    def test_rpc_replies_are_sent_without_blocking(self):
+        for request_id in range(3):
+            self.connector.server_side_rpc_handler({"device": "Device", "data": {"id": request_id, "method": "read"}})
+        self.assertEqual(self.gateway.rpc_replies, [])
+
+        sleep(1)
+        self.assertEqual(sorted(request_id for _, request_id, _ in self.gateway.rpc_replies), [0, 1, 2])
+        self.assertEqual(sorted(content['value'] for _, _, content in self.gateway.rpc_replies), [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
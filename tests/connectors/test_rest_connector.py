@@ -0,0 +1,182 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from heapq import heappop, heappush
+from itertools import count
+from threading import Condition, Thread
+from types import SimpleNamespace
+from time import monotonic, perf_counter, sleep
+
+import requests
+
+from thingsboard_gateway.connectors.rest.rest_connector import RESTConnector
+from tests.connectors.connector_tests_base import GatewayMock
+
+PORT = 50320
+
+
+def endpoint_config(endpoint, response_timeout=5):
+    return {
+        "endpoint": endpoint,
+        "HTTPMethods": ["POST"],
+        "security": {"type": "anonymous"},
+        "converter": {
+            "type": "json",
+            "deviceNameExpression": "${name}",
+            "deviceTypeExpression": "default",
+            "attributes": [],
+            "timeseries": [{"type": "double", "key": "temperature", "value": "${temp}"}]
+        },
+        "response": {
+            "responseExpected": True,
+            "timeout": response_timeout,
+            "responseAttribute": "result"
+        }
+    }
+
+
+class AttributesGatewayMock(GatewayMock):
+    """
+    Replies with the response attribute the way ThingsBoard does, from another thread after a delay. Replies are
+    sent from one thread in the order they are due, replies with the same delay in the order the data came.
+    """
+
+    def __init__(self, delays):
+        super().__init__()
+        self.connector = None
+        self.requests = []
+        self.__delays = delays
+        self.__replies = []
+        self.__replies_order = count()
+        self.__replies_condition = Condition()
+        self.tb_client = SimpleNamespace(client=SimpleNamespace(
+            gw_request_client_attributes=self.request_attributes,
+            gw_request_shared_attributes=self.request_attributes))
+        Thread(target=self.__send_replies, daemon=True).start()
+
+    def send_to_storage(self, connector_name, data):
+        super().send_to_storage(connector_name, data)
+        delay = self.__delays.get(data['deviceName'])
+        if delay is not None:
+            reply = 'reply to ' + data['deviceName']
+            if data['deviceName'] == 'Same':
+                reply += ' %s' % data['telemetry'][0]['temperature']
+            with self.__replies_condition:
+                heappush(self.__replies, (monotonic() + delay, next(self.__replies_order), data['deviceName'], reply))
+                self.__replies_condition.notify()
+
+    def request_attributes(self, device, keys, callback):
+        self.requests.append((device, keys))
+        callback({'id': len(self.requests), 'device': device, 'value': 'shared ' + keys[0]}, None)
+
+    def __send_replies(self):
+        while True:
+            with self.__replies_condition:
+                while not self.__replies or self.__replies[0][0] > monotonic():
+                    self.__replies_condition.wait(self.__replies[0][0] - monotonic() if self.__replies else None)
+                _, _, device, reply = heappop(self.__replies)
+            self.connector.on_attributes_update({'device': device, 'data': {'result': reply}})
+
+
+class RESTConnectorResponseTests(unittest.TestCase):
+    PORT = PORT
+    WORKERS_COUNT = 1
+
+    @classmethod
+    def setUpClass(cls):
+        config = {
+            "name": "REST Connector",
+            "host": "127.0.0.1",
+            "port": cls.PORT,
+            "workersCount": cls.WORKERS_COUNT,
+            "mapping": [endpoint_config("/device"), endpoint_config("/short", response_timeout=1)],
+            "attributeRequests": [{
+                "endpoint": "/attributes",
+                "type": "shared",
+                "HTTPMethods": ["POST"],
+                "security": {"type": "anonymous"},
+                "timeout": 5,
+                "deviceNameExpression": "${name}",
+                "attributeNameExpression": "${key}"
+            }]
+        }
+        cls.gateway = AttributesGatewayMock({'Slow': 1, 'Fast': .1, 'Second': .5, 'Same': .3})
+        cls.connector = RESTConnector(cls.gateway, config, 'rest')
+        cls.gateway.connector = cls.connector
+        cls.connector.open()
+
+        # The connector is connected when the server of every worker listens on the port
+        started = monotonic()
+        while not cls.connector.is_connected():
+            if monotonic() - started > 60:
+                raise TimeoutError('REST connector has not started')
+            sleep(.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connector.close()
+
+    def post(self, endpoint, data):
+        started = perf_counter()
+        response = requests.post('http://127.0.0.1:%i%s' % (self.PORT, endpoint), json=data, timeout=10)
+        return response.status_code, response.text, perf_counter() - started
+
+    def test_pending_response_does_not_block_other_requests(self):
+        with ThreadPoolExecutor(2) as executor:
+            slow = executor.submit(self.post, '/device', {'name': 'Slow', 'temp': 1})
+            sleep(.1)
+            fast = executor.submit(self.post, '/device', {'name': 'Fast', 'temp': 2})
+
+            status, text, elapsed = fast.result()
+            self.assertEqual((status, text), (200, 'reply to Fast'))
+            self.assertLess(elapsed, .8)
+            self.assertEqual(slow.result()[:2], (200, 'reply to Slow'))
+
+    def test_responses_are_delivered_to_their_device(self):
+        with ThreadPoolExecutor(2) as executor:
+            second = executor.submit(self.post, '/device', {'name': 'Second', 'temp': 1})
+            fast = executor.submit(self.post, '/device', {'name': 'Fast', 'temp': 2})
+            self.assertEqual(second.result()[:2], (200, 'reply to Second'))
+            self.assertEqual(fast.result()[:2], (200, 'reply to Fast'))
+
+    def test_responses_of_one_device_are_delivered_in_order(self):
+        # SO_REUSEPORT spreads the connections over the workers, some of the requests wait in each of them
+        with ThreadPoolExecutor(8) as executor:
+            requests = []
+            for number in range(8):
+                requests.append(executor.submit(self.post, '/device', {'name': 'Same', 'temp': number}))
+                # The data of every request is stored before the next one is sent
+                while len([data for data in self.gateway.data if data['deviceName'] == 'Same']) <= number:
+                    sleep(.01)
+            self.assertEqual([request.result()[:2] for request in requests],
+                             [(200, 'reply to Same %i' % number) for number in range(8)])
+
+    def test_response_timeout(self):
+        status, _, elapsed = self.post('/short', {'name': 'Silent', 'temp': 1})
+        self.assertEqual(status, 408)
+        self.assertLess(elapsed, 2)
+
+    def test_attribute_request(self):
+        status, text, _ = self.post('/attributes', {'name': 'Device', 'key': 'firmware'})
+        self.assertEqual(status, 200)
+        self.assertIn('"value": "shared firmware"', text)
+
+
+class RESTConnectorWorkersTests(RESTConnectorResponseTests):
+    PORT = PORT + 1
+    WORKERS_COUNT = 2
+
+    def test_data_is_forwarded_from_workers(self):
+        sent = len(self.gateway.data)
+        with ThreadPoolExecutor(4) as executor:
+            for number in range(40):
+                executor.submit(self.post, '/short', {'name': 'Device %i' % number, 'temp': number})
+
+        # Requests without a reply time out, their data is in the storage anyway
+        received = sorted(data['deviceName'] for data in self.gateway.data[sent:])
+        self.assertEqual(received, sorted('Device %i' % number for number in range(40)))
+        self.assertEqual(self.connector.statistics['MessagesReceived'], len(self.gateway.data) +
+                         len(self.gateway.requests))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+import socket
+import unittest
+from threading import Event, Thread
+from types import SimpleNamespace
+from time import monotonic, sleep
+from unittest.mock import patch
+
+from thingsboard_gateway.connectors.socket.socket_connector import SocketConnector
+from thingsboard_gateway.connectors.socket.socket_framing import DelimiterFramer, LengthPrefixFramer, create_framer
+from tests.connectors.connector_tests_base import GatewayMock
+
+PORT = 50301
+CLIENTS_COUNT = 4
+
+
+class SocketFramingTests(unittest.TestCase):
+    def test_delimiter(self):
+        framer = DelimiterFramer(b'\r\n')
+        self.assertEqual(framer.feed(b'first\r'), [])
+        self.assertEqual(framer.feed(b'\nsecond\r\nthi'), [b'first', b'second'])
+        self.assertEqual(len(framer), 3)
+
+    def test_escaped_delimiter(self):
+        self.assertEqual(create_framer({'type': 'delimiter', 'delimiter': '\\x03'}).feed(b'a\x03b\x03'), [b'a', b'b'])
+
+    def test_length_prefix(self):
+        framer = LengthPrefixFramer(field_size=2)
+        stream = b'\x00\x03abc\x00\x00\x00\x02de'
+        messages = []
+        for byte in range(len(stream)):
+            messages += framer.feed(stream[byte:byte + 1])
+        self.assertEqual(messages, [b'abc', b'', b'de'])
+
+    def test_length_including_field(self):
+        framer = LengthPrefixFramer(field_size=1, includes_field=True, max_frame_size=4)
+        self.assertEqual(framer.feed(b'\x03ab\x09abcdefgh'), [b'ab'])
+        self.assertEqual(len(framer), 0)
+
+
+class SocketConnectorTcpTests(unittest.TestCase):
+    def setUp(self):
+        config = {
+            "name": "TCP Connector",
+            "type": "TCP",
+            "address": "127.0.0.1",
+            "port": PORT,
+            "bufferSize": 1024,
+            "loopsCount": 2,
+            "framing": {"type": "delimiter", "delimiter": "\n"},
+            "devices": []
+        }
+        self.clients = []
+        for number in range(CLIENTS_COUNT):
+            client = socket.socket()
+            client.bind(('127.0.0.1', 0))
+            self.clients.append(client)
+            config['devices'].append({
+                "address": "127.0.0.1:%i" % client.getsockname()[1],
+                "deviceName": "Device %i" % number,
+                "telemetry": [{"key": "value", "byteFrom": 0, "byteTo": -1}]
+            })
+
+        self.gateway = GatewayMock(CLIENTS_COUNT * 2)
+        self.connector = SocketConnector(self.gateway, config, 'socket')
+        self.connector.open()
+        sleep(.2)
+
+    def tearDown(self):
+        self.connector.close()
+        for client in self.clients:
+            client.close()
+
+    def test_connections_are_multiplexed(self):
+        for client in self.clients:
+            client.connect(('127.0.0.1', PORT))
+            client.sendall(b'first\nsec')
+        for client in self.clients:
+            client.sendall(b'ond\n')
+
+        self.assertTrue(self.gateway.all_received.wait(10))
+        received = sorted((data['deviceName'], data['telemetry'][0]['value']) for data in self.gateway.data)
+        self.assertEqual(received, sorted(('Device %i' % number, value)
+                                          for number in range(CLIENTS_COUNT) for value in ('first', 'second')))
+
+        sleep(1.2)
+        self.assertEqual(self.connector.statistics['ConnectionsCount'], CLIENTS_COUNT)
+
+        self.clients[0].close()
+        sleep(1.2)
+        self.assertEqual(self.connector.statistics['ConnectionsCount'], CLIENTS_COUNT - 1)
+
+
+class SocketConnectorDownlinkTests(unittest.TestCase):
+    def setUp(self):
+        self.device = socket.socket()
+        self.device.bind(('127.0.0.1', 0))
+        self.device.listen(5)
+        self.device.settimeout(5)
+        config = {
+            "name": "TCP Connector",
+            "type": "TCP",
+            "address": "127.0.0.1",
+            "port": PORT + 1,
+            "bufferSize": 1024,
+            "outboundIdleTimeout": 1,
+            "devices": [{
+                "address": "127.0.0.1:%i" % self.device.getsockname()[1],
+                "deviceName": "Device",
+                "serverSideRpc": [{"methodRPC": "write", "methodProcessing": "write", "withResponse": False}]
+            }, {
+                "address": "127.0.0.1:9",
+                "deviceName": "Unreachable",
+                "serverSideRpc": [{"methodRPC": "write", "methodProcessing": "write", "withResponse": False}]
+            }]
+        }
+        self.connector = SocketConnector(GatewayMock(0), config, 'socket')
+        self.connector.open()
+        sleep(.2)
+
+    def tearDown(self):
+        self.connector.close()
+        self.device.close()
+
+    def rpc(self, params, device='Device'):
+        self.connector.server_side_rpc_handler({'device': device, 'data': {'id': 1, 'method': 'write',
+                                                                          'params': params}})
+
+    def test_connect_to_one_device_does_not_block_others(self):
+        create_connection = socket.create_connection
+        connect_started, unreachable_released = Event(), Event()
+
+        def connect(address, *args, **kwargs):
+            if address[1] == 9:
+                connect_started.set()
+                unreachable_released.wait(5)
+                raise socket.timeout('timed out')
+            return create_connection(address, *args, **kwargs)
+
+        with patch('socket.create_connection', connect):
+            writer = Thread(target=self.rpc, args=('lost', 'Unreachable'))
+            writer.start()
+            self.assertTrue(connect_started.wait(5))
+            try:
+                started = monotonic()
+                self.rpc('first')
+                self.assertLess(monotonic() - started, 1)
+                connection, _ = self.device.accept()
+                connection.settimeout(1)
+                self.assertEqual(connection.recv(1024), b'first')
+                connection.close()
+            finally:
+                unreachable_released.set()
+                writer.join()
+
+    def test_outbound_connection_is_reused_until_idle(self):
+        for params in ('first', 'second', 'third'):
+            self.rpc(params)
+        connection, _ = self.device.accept()
+        connection.settimeout(5)
+
+        received = b''
+        while len(received) < len('firstsecondthird'):
+            received += connection.recv(1024)
+        self.assertEqual(received, b'firstsecondthird')
+
+        # Closed by the connector after the idle timeout
+        self.assertEqual(connection.recv(1024), b'')
+        connection.close()
+
+        self.rpc('fourth')
+        connection, _ = self.device.accept()
+        connection.settimeout(5)
+        self.assertEqual(connection.recv(1024), b'fourth')
+        connection.close()
+
+
+class SocketConnectorAttributeRequestsTests(unittest.TestCase):
+    def setUp(self):
+        self.client = socket.socket()
+        self.client.bind(('127.0.0.1', 0))
+        self.requests = []
+        self.gateway = GatewayMock(1)
+        self.gateway.tb_client = SimpleNamespace(client=SimpleNamespace(
+            gw_request_client_attributes=lambda device, keys, callback: self.requests.append(('client', keys)),
+            gw_request_shared_attributes=lambda device, keys, callback: self.requests.append(('shared', keys))))
+        config = {
+            "name": "TCP Connector",
+            "type": "TCP",
+            "address": "127.0.0.1",
+            "port": PORT + 2,
+            "bufferSize": 1024,
+            "framing": {"type": "delimiter", "delimiter": "\n"},
+            "devices": [{
+                "address": "127.0.0.1:%i" % self.client.getsockname()[1],
+                "deviceName": "Device",
+                "telemetry": [{"key": "value", "byteFrom": 0, "byteTo": -1}],
+                "attributeRequests": [
+                    {"type": "shared", "requestExpression": "${[0:3]==atr}", "attributeNameExpression": "[3:]"},
+                    {"type": "client", "requestExpression": "${[0]==c}", "attributeNameExpression": "[1:3][4:]"},
+                    {"type": "client", "requestExpression": "ping", "attributeNameExpression": ""}
+                ]
+            }]
+        }
+        self.connector = SocketConnector(self.gateway, config, 'socket')
+        self.connector.open()
+        sleep(.2)
+
+    def tearDown(self):
+        self.connector.close()
+        self.client.close()
+
+    def test_requests_are_matched_on_bytes(self):
+        self.client.connect(('127.0.0.1', PORT + 2))
+        self.client.sendall(b'atrkey1\nc12-34\nping\ntelemetry\n')
+
+        self.assertTrue(self.gateway.all_received.wait(5))
+        self.assertEqual(self.gateway.data[0]['telemetry'], [{'value': 'telemetry'}])
+        self.assertEqual(self.requests, [('shared', ['key1']), ('client', ['12', '34']), ('client', [])])
+
+
+if __name__ == '__main__':
+    unittest.main()
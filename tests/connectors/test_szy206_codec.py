@@ -0,0 +1,106 @@
+import unittest
+from datetime import datetime
+
+from thingsboard_gateway.connectors.syz206.szy206_codec import build_frame, build_reply, crc, \
+    decode_telemetry, parse_frame
+from thingsboard_gateway.connectors.syz206.szy206_frame_decoder import Szy206FrameDecoder
+from thingsboard_gateway.tb_utility.bcd import bcd_le_to_int, bcd_to_int
+
+ADDRESS = bytes.fromhex('1234560100')
+STATUS = bytes.fromhex('01000000')
+RECEIVED = datetime(2023, 5, 20, 12, 0, 0)
+RECEIVED_TS = int(RECEIVED.timestamp() * 1000)
+
+
+def report(control, data, afn=0xC0):
+    return parse_frame(build_frame(control, ADDRESS, afn, data))
+
+
+class Szy206CodecTests(unittest.TestCase):
+    def test_crc(self):
+        def bitwise_crc(data):
+            value = 0
+            for byte in data:
+                value ^= byte
+                for _ in range(8):
+                    value = ((value << 1) ^ 0xE5) & 0xFF if value & 0x80 else (value << 1) & 0xFF
+            return value
+
+        data = bytes(range(40))
+        self.assertEqual(crc(data), bitwise_crc(data))
+
+    def test_bcd(self):
+        self.assertEqual(bcd_le_to_int(bytes.fromhex('563412')), 123456)
+        self.assertEqual(bcd_le_to_int(bytes.fromhex('56341200'), signed=True), 123456)
+        self.assertEqual(bcd_le_to_int(bytes.fromhex('563412F0'), signed=True), -123456)
+        with self.assertRaises(ValueError):
+            bcd_le_to_int(bytes.fromhex('5A'))
+        self.assertEqual(bcd_to_int(bytes.fromhex('123456')), 123456)
+
+    def test_water_level_points_with_time_label(self):
+        # 1234.567 m, -0.250 m, status, 30 s 15 min 8 h 19th day, delay
+        frame = report(0xB2, bytes.fromhex('67452301' '500200F0') + STATUS + bytes.fromhex('3015081900'))
+        self.assertEqual(frame.station, '1234560100')
+
+        telemetry = decode_telemetry(frame, RECEIVED_TS)
+        self.assertEqual(telemetry['values'], {'waterLevel': 1234.567, 'waterLevel2': -0.25, 'status': 1})
+        self.assertEqual(telemetry['ts'], int(datetime(2023, 5, 19, 8, 15, 30).timestamp() * 1000))
+
+    def test_flow_without_time_label(self):
+        frame = report(0xB3, bytes.fromhex('5634120000' '7856341200') + STATUS)
+        self.assertEqual(decode_telemetry(frame, RECEIVED_TS),
+                       {'ts': RECEIVED_TS, 'values': {'flow': 123.456, 'countFlow': 12345678, 'status': 1}})
+
+    def test_time_label_of_previous_month(self):
+        frame = report(0xB1, bytes.fromhex('123400') + STATUS + bytes.fromhex('0000002500'))
+        telemetry = decode_telemetry(frame, RECEIVED_TS)
+        self.assertEqual(telemetry['values']['rainfall'], 341.2)
+        self.assertEqual(telemetry['ts'], int(datetime(2023, 4, 25).timestamp() * 1000))
+
+    def test_water_quality(self):
+        # Water temperature and pH
+        frame = report(0xBA, bytes.fromhex('0300000000' '55020000' '32070000') + STATUS)
+        self.assertEqual(decode_telemetry(frame, RECEIVED_TS)['values'],
+                         {'waterTemperature': 25.5, 'ph': 7.32, 'status': 1})
+
+    def test_wrong_data_size(self):
+        with self.assertRaises(ValueError):
+            decode_telemetry(report(0xB2, bytes.fromhex('674523') + STATUS), RECEIVED_TS)
+
+    def test_link_check_reply(self):
+        frame = parse_frame(build_frame(0xB0, ADDRESS, 0x02, b'\xF2'))
+        self.assertIsNone(decode_telemetry(frame, RECEIVED_TS))
+
+        reply = parse_frame(build_reply(frame))
+        self.assertEqual((reply.control, reply.station, reply.afn, bytes(reply.data)),
+                         (0x30, '1234560100', 0x02, b'\xF2'))
+
+
+class Szy206FrameDecoderTests(unittest.TestCase):
+    def test_split_and_merged_frames(self):
+        first = build_frame(0xB2, ADDRESS, 0xC0, bytes.fromhex('67452301') + STATUS)
+        second = build_frame(0xB0, ADDRESS, 0x02, b'\xF2')
+        stream = b'\x00\x68' + first + second
+
+        decoder = Szy206FrameDecoder()
+        frames = []
+        for position in range(0, len(stream), 5):
+            frames += decoder.feed(stream[position:position + 5])
+
+        self.assertEqual(frames, [first, second])
+        self.assertEqual(decoder.dropped_bytes, 1)
+        self.assertEqual(len(decoder), 0)
+
+    def test_bad_crc_is_dropped(self):
+        frame = bytearray(build_frame(0xB2, ADDRESS, 0xC0, bytes.fromhex('67452301') + STATUS))
+        frame[-2] ^= 0xFF
+        good = build_frame(0xB0, ADDRESS, 0x02, b'\xF0')
+
+        decoder = Szy206FrameDecoder()
+        self.assertEqual(decoder.feed(bytes(frame) + good), [good])
+        self.assertTrue(decoder.bad_frames)
+        self.assertEqual(Szy206FrameDecoder(check_crc=False).feed(bytes(frame)), [bytes(frame)])
+
+
+if __name__ == '__main__':
+    unittest.main()
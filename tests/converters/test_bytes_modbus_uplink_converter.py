@@ -4,6 +4,8 @@ from pymodbus.constants import Endian
 from pymodbus.payload import BinaryPayloadBuilder
 
 from thingsboard_gateway.connectors.modbus.bytes_modbus_uplink_converter import BytesModbusUplinkConverter
+from thingsboard_gateway.connectors.modbus.constants import REGISTER_BLOCKS_SECTION
+from thingsboard_gateway.connectors.modbus.register_block import RegisterBlock
 
 
 class ModbusConverterTests(unittest.TestCase):
@@ -179,6 +181,56 @@ class ModbusConverterTests(unittest.TestCase):
         result = converter.convert(test_modbus_convert_config, test_modbus_body_to_convert)
         self.assertDictEqual(result, test_modbus_result)
 
+    def test_modbus_register_blocks_match_per_tag_decoding(self):
+        tags = [
+            {"tag": "8int", "type": "8int", "address": 0, "objectsCount": 1},
+            {"tag": "16uint", "type": "16uint", "address": 1, "objectsCount": 1},
+            {"tag": "16float", "type": "16float", "address": 2, "objectsCount": 1},
+            {"tag": "32int", "type": "32int", "address": 3, "objectsCount": 2, "divider": 10},
+            {"tag": "32float", "type": "32float", "address": 5, "objectsCount": 2},
+            {"tag": "long", "type": "long", "address": 7, "objectsCount": 4, "multiplier": 2},
+            {"tag": "64float", "type": "64float", "address": 11, "objectsCount": 4},
+            {"tag": "uint_after_gap", "type": "uint", "address": 17, "objectsCount": 2},
+        ]
+        registers = [0x1234, 0xFEDC, 0x3C00, 0xFFFF, 0xFB2E, 0x41B2, 0xB852, 0x0102, 0x0304, 0x0506, 0x0708,
+                     0xC05E, 0xDCCC, 0xCCCC, 0xCCCD, 0xAAAA, 0xBBBB, 0xDEAD, 0xBEEF]
+
+        class DummyResponse:
+            def __init__(self, registers):
+                self.registers = registers[:]
+
+        for byte_order in ("BIG", "LITTLE"):
+            for word_order in ("BIG", "LITTLE"):
+                device_config = {"deviceName": "Modbus Test", "unitId": 1, "byteOrder": byte_order,
+                                 "wordOrder": word_order,
+                                 "timeseries": [{**tag, "functionCode": 4} for tag in tags]}
+
+                per_tag_data = {"timeseries": {
+                    tag["tag"]: {"data_sent": tag,
+                                 "input_data": DummyResponse(registers[tag["address"]:tag["address"] + tag["objectsCount"]])}
+                    for tag in device_config["timeseries"]}}
+                per_tag_result = BytesModbusUplinkConverter(device_config).convert(device_config, per_tag_data)
+
+                blocks = RegisterBlock.build_blocks(device_config, max_gap=2)
+                self.assertEqual(len(blocks), 1)
+                self.assertEqual((blocks[0].address, blocks[0].count), (0, len(registers)))
+                block_data = {REGISTER_BLOCKS_SECTION: [(blocks[0], DummyResponse(registers))]}
+                block_result = BytesModbusUplinkConverter(device_config).convert(device_config, block_data)
+
+                self.assertEqual(block_result, per_tag_result)
+
+    def test_modbus_register_blocks_split(self):
+        device_config = {"timeseries": [
+            {"tag": "a", "type": "16int", "functionCode": 3, "address": 0, "objectsCount": 1},
+            {"tag": "b", "type": "16int", "functionCode": 3, "address": 1, "objectsCount": 1},
+            {"tag": "c", "type": "16int", "functionCode": 3, "address": 5, "objectsCount": 1},
+            {"tag": "d", "type": "16int", "functionCode": 4, "address": 0, "objectsCount": 1},
+            {"tag": "e", "type": "string", "functionCode": 3, "address": 2, "objectsCount": 2},
+        ]}
+        blocks = RegisterBlock.build_blocks(device_config)
+        self.assertEqual(sorted((block.function_code, block.address, block.count) for block in blocks),
+                         [(3, 0, 2), (3, 5, 1), (4, 0, 1)])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,192 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+import socket
+from abc import abstractmethod
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import time
+
+from thingsboard_gateway.connectors.connector import Connector, log
+from thingsboard_gateway.connectors.selector_loop import SelectorLoop
+
+MAX_CONN = 65535
+RECEIVE_BUFFER_SIZE = 65536
+FRAME_WAIT_TIMEOUT = 1
+MAX_FRAMES_PER_BATCH = 100
+
+
+class FrameServerConnector(Connector):
+    """
+    TCP server of devices that send frames of a binary protocol. The selector loop only reads, frames and writes,
+    frames are handled by workers. Frames of one device always go to the same worker to keep their order, frames that
+    are already queued are sent as one telemetry batch per device. Queues are bounded: when workers fall behind,
+    the loop waits and TCP flow control slows the devices down.
+    Subclasses supply the framer and the frame handling.
+    """
+
+    DEFAULT_ADDRESS = ('0.0.0.0', 0)
+    # Bytes of a raw frame that identify the device, frames are partitioned between workers by them
+    DEVICE_KEY_SLICE = slice(0, 0)
+    DEVICE_NAME_VARIABLE = '${deviceKey}'
+    DEFAULT_DEVICE_NAME_FORMAT = '${deviceKey}'
+
+    def __init__(self, gateway, config, connector_type, name):
+        super().__init__()
+        self.__stopped = None
+        self.__gateway = gateway
+        self._connector_type = connector_type
+        self.config = config
+        self.name = name
+        self.statistics = {'MessagesReceived': 0, 'MessagesSent': 0}
+        self.__devices = {}
+        self.__devices_lock = Lock()
+        # Workers update the statistics concurrently
+        self.__statistics_lock = Lock()
+        self.__device_name_format = config.get('deviceNameFormat', self.DEFAULT_DEVICE_NAME_FORMAT)
+        self.__device_type = config.get('deviceType', 'default')
+        self.__address = (config.get('host', self.DEFAULT_ADDRESS[0]), config.get('port', self.DEFAULT_ADDRESS[1]))
+        self.__server = None
+        self.__loop = SelectorLoop('%s Loop' % name, RECEIVE_BUFFER_SIZE, self.__on_frames, self.on_connection_closed)
+        self.__workers_queues = [Queue(maxsize=config.get('workerQueueSize', 1000))
+                                 for _ in range(max(int(config.get('workersCount', 4)), 1))]
+        self.__workers = [Thread(name='%s Worker %i' % (name, number), target=self.__process_frames,
+                                 args=(frames_queue,), daemon=True)
+                          for number, frames_queue in enumerate(self.__workers_queues)]
+
+    @abstractmethod
+    def create_framer(self):
+        """Splits the stream of a new connection into frames: feed(data) returns the whole frames received."""
+
+    @abstractmethod
+    def process_frame(self, connection, frame, ts, telemetry_batch):
+        """
+        Handles a frame on a worker thread. Replies are sent with connection.send(), telemetry is appended to
+        telemetry_batch[device key], the batch is sent once the queued frames are handled.
+        """
+
+    def on_connection_closed(self, connection):
+        pass
+
+    def open(self):
+        self.__stopped = False
+        try:
+            self.__server = socket.socket()
+            self.__server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.__server.bind(self.__address)
+            self.__server.listen(MAX_CONN)
+            self.__loop.add_listener(self.__server, self.__accept)
+            for worker in self.__workers:
+                worker.start()
+            self.__loop.start()
+            log.info('%s is listening on %s:%s', self.get_name(), *self.__address)
+        except Exception as e:
+            log.exception(e)
+            self.close()
+
+    def close(self):
+        self.__stopped = True
+        self.__loop.stop()
+        if self.__loop.is_alive():
+            self.__loop.join(timeout=1)
+        if self.__server is not None:
+            self.__server.close()
+        log.info('%s has been stopped.', self.get_name())
+
+    def get_name(self):
+        return self.name
+
+    def is_connected(self):
+        return self.__stopped is False
+
+    def on_attributes_update(self, content):
+        pass
+
+    def server_side_rpc_handler(self, content):
+        pass
+
+    def get_device_name(self, device_key):
+        device_name = self.__devices.get(device_key)
+        if device_name is None:
+            with self.__devices_lock:
+                device_name = self.__devices.get(device_key)
+                if device_name is None:
+                    device_name = self.__device_name_format.replace(self.DEVICE_NAME_VARIABLE, device_key)
+                    self.__gateway.add_device(device_name, {"connector": self}, device_type=self.__device_type)
+                    self.__devices[device_key] = device_name
+        return device_name
+
+    def __accept(self, server, mask):
+        try:
+            sock, address = server.accept()
+        except (BlockingIOError, ConnectionAbortedError):
+            return
+
+        log.info('%s connection from %s', self.get_name(), address)
+        self.__loop.add_connection(sock, address, self.create_framer())
+
+    def __on_frames(self, connection, frames):
+        ts = int(time() * 1000)
+        for frame in frames:
+            frames_queue = self.__workers_queues[hash(frame[self.DEVICE_KEY_SLICE]) % len(self.__workers_queues)]
+            item = (connection, frame, ts)
+            while not self.__stopped:
+                try:
+                    frames_queue.put(item, timeout=FRAME_WAIT_TIMEOUT)
+                    break
+                except Full:
+                    log.debug('%s workers queue is full, waiting', self.get_name())
+
+    def __process_frames(self, frames_queue):
+        while not self.__stopped:
+            try:
+                item = frames_queue.get(timeout=FRAME_WAIT_TIMEOUT)
+            except Empty:
+                continue
+
+            items = [item]
+            while len(items) < MAX_FRAMES_PER_BATCH:
+                try:
+                    items.append(frames_queue.get_nowait())
+                except Empty:
+                    break
+
+            with self.__statistics_lock:
+                self.statistics['MessagesReceived'] += len(items)
+
+            telemetry_batch = {}
+            for connection, frame, ts in items:
+                try:
+                    self.process_frame(connection, frame, ts, telemetry_batch)
+                except ConnectionResetError as e:
+                    # The device has disconnected while its frame was waiting in the queue
+                    log.debug(e)
+                except Exception as e:
+                    log.error('%s cannot handle frame %s: %s', self.get_name(), frame.hex().upper(), e)
+
+            for device_key, telemetry in telemetry_batch.items():
+                self.__send_telemetry(device_key, telemetry)
+
+    def __send_telemetry(self, device_key, telemetry):
+        try:
+            self.__gateway.send_to_storage(self.get_name(), {
+                "deviceName": self.get_device_name(device_key),
+                "deviceType": self.__device_type,
+                "attributes": [],
+                "telemetry": telemetry
+            })
+            with self.__statistics_lock:
+                self.statistics['MessagesSent'] += len(telemetry)
+        except Exception as e:
+            log.exception(e)
@@ -0,0 +1,185 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from queue import Full, Queue
+from threading import BoundedSemaphore, Lock, Thread
+from time import sleep
+from urllib.parse import urlsplit
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, ConnectTimeout, Timeout
+from simplejson import dumps
+from urllib3.exceptions import NewConnectionError
+
+from thingsboard_gateway.connectors.connector import log
+
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 4
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = .5
+MAX_POOLED_HOSTS = 100
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'))
+
+
+def is_not_sent(error):
+    """True if the request failed before the connection to the host was made, so the host has not got it."""
+    if isinstance(error, ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class HttpDownlinkExecutor:
+    """
+    Sends downlink HTTP requests of a connector (RPC and attribute updates) from a bounded queue on a pool of threads
+    that share one keep-alive session. At most maxConnectionsPerHost requests run against one host at once.
+    Requests that failed to connect, timed out or got a 5xx status are retried with exponential backoff. Requests
+    with a method that is not idempotent (POST, PATCH) may have reached the device already in these cases, so they are
+    only retried when the connection could not be made, unless retryNonIdempotent is set.
+    With batchIdenticalRequests a request that is identical to one already waiting in the queue is not queued again,
+    the response of the first one is passed to the callbacks of both.
+    """
+
+    def __init__(self, name, config=None):
+        config = config or {}
+        self.name = name
+        self.__max_per_host = max(int(config.get('maxConnectionsPerHost', DEFAULT_MAX_CONNECTIONS_PER_HOST)), 1)
+        self.__retries = config.get('retries', DEFAULT_RETRIES)
+        self.__retry_backoff = config.get('retryBackoff', DEFAULT_RETRY_BACKOFF)
+        self.__retry_non_idempotent = config.get('retryNonIdempotent', False)
+        self.__batch_identical = config.get('batchIdenticalRequests', False)
+        self.__queue = Queue(config.get('queueSize', DEFAULT_QUEUE_SIZE))
+        self.__session = Session()
+        adapter = HTTPAdapter(pool_connections=MAX_POOLED_HOSTS, pool_maxsize=self.__max_per_host)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+        self.__hosts_semaphores = {}
+        self.__waiting = {}
+        self.__lock = Lock()
+        self.stopped = False
+        self.statistics = {'sent': 0, 'failed': 0, 'retried': 0, 'batched': 0}
+        # Workers update the statistics concurrently
+        self.__statistics_lock = Lock()
+        self.__workers = [Thread(target=self.__process, name='%s downlink %i' % (name, number), daemon=True)
+                          for number in range(max(int(config.get('workers', DEFAULT_WORKERS)), 1))]
+
+    def __len__(self):
+        return self.__queue.qsize()
+
+    def start(self):
+        for worker in self.__workers:
+            worker.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        for _ in self.__workers:
+            try:
+                self.__queue.put_nowait(None)
+            except Full:
+                break
+        self.__session.close()
+
+    def submit(self, params, callback=None) -> bool:
+        """
+        Queues a request, params are the arguments of requests.request. callback(response, error) is called from
+        a worker thread when the request is done. Returns False if the queue is full.
+        """
+        key = self.__request_key(params) if self.__batch_identical else None
+        callbacks = [callback] if callback is not None else []
+        if key is not None:
+            with self.__lock:
+                waiting_callbacks = self.__waiting.get(key)
+                if waiting_callbacks is not None:
+                    waiting_callbacks.extend(callbacks)
+                    self.statistics['batched'] += 1
+                    return True
+                self.__waiting[key] = callbacks
+
+        try:
+            self.__queue.put_nowait((key, params, callbacks))
+            return True
+        except Full:
+            log.error('%s downlink queue is full, request to %s is dropped', self.name, params.get('url'))
+            if key is not None:
+                with self.__lock:
+                    self.__waiting.pop(key, None)
+            return False
+
+    def __process(self):
+        while not self.stopped:
+            item = self.__queue.get()
+            if item is None:
+                break
+
+            key, params, callbacks = item
+            if key is not None:
+                # Identical requests queued from now on are sent again, their data can be newer than this response
+                with self.__lock:
+                    self.__waiting.pop(key, None)
+
+            response, error = None, None
+            try:
+                response = self.__send(params)
+                self.__count_statistic('sent')
+            except Exception as e:
+                error = e
+                self.__count_statistic('failed')
+                log.error('%s downlink request to %s failed: %s', self.name, params.get('url'), e)
+
+            for callback in callbacks:
+                try:
+                    callback(response, error)
+                except Exception as e:
+                    log.exception(e)
+
+    def __send(self, params):
+        semaphore = self.__get_host_semaphore(params['url'])
+        retry_sent = self.__retry_non_idempotent or params.get('method', 'GET').upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                with semaphore:
+                    response = self.__session.request(**params)
+                if response.status_code < 500 or attempt >= self.__retries or not retry_sent:
+                    return response
+            except (RequestsConnectionError, Timeout) as e:
+                if attempt >= self.__retries or self.stopped or not (retry_sent or is_not_sent(e)):
+                    raise
+
+            # The host semaphore is not held while waiting, other requests to the host go on
+            sleep(self.__retry_backoff * 2 ** attempt)
+            attempt += 1
+            self.__count_statistic('retried')
+
+    def __count_statistic(self, parameter):
+        with self.__statistics_lock:
+            self.statistics[parameter] += 1
+
+    def __get_host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        semaphore = self.__hosts_semaphores.get(host)
+        if semaphore is None:
+            with self.__lock:
+                semaphore = self.__hosts_semaphores.setdefault(host, BoundedSemaphore(self.__max_per_host))
+        return semaphore
+
+    @staticmethod
+    def __request_key(params):
+        auth = params.get('auth')
+        return dumps([params.get('method', 'GET').upper(), params['url'], params.get('data'), params.get('json'),
+                      params.get('headers'), getattr(auth, 'username', None), getattr(auth, 'password', None)],
+                     sort_keys=True, default=str)
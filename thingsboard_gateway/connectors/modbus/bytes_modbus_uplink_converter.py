@@ -17,9 +17,28 @@ from pymodbus.exceptions import ModbusIOException
 from pymodbus.payload import BinaryPayloadDecoder
 from pymodbus.pdu import ExceptionResponse
 
+from thingsboard_gateway.connectors.modbus.constants import REGISTER_BLOCKS_SECTION
 from thingsboard_gateway.connectors.modbus.modbus_converter import ModbusConverter, log
 from thingsboard_gateway.gateway.statistics_service import StatisticsService
 
+DECODER_FUNCTIONS = {
+    'string': BinaryPayloadDecoder.decode_string,
+    'bytes': BinaryPayloadDecoder.decode_string,
+    'bit': BinaryPayloadDecoder.decode_bits,
+    'bits': BinaryPayloadDecoder.decode_bits,
+    '8int': BinaryPayloadDecoder.decode_8bit_int,
+    '8uint': BinaryPayloadDecoder.decode_8bit_uint,
+    '16int': BinaryPayloadDecoder.decode_16bit_int,
+    '16uint': BinaryPayloadDecoder.decode_16bit_uint,
+    '16float': BinaryPayloadDecoder.decode_16bit_float,
+    '32int': BinaryPayloadDecoder.decode_32bit_int,
+    '32uint': BinaryPayloadDecoder.decode_32bit_uint,
+    '32float': BinaryPayloadDecoder.decode_32bit_float,
+    '64int': BinaryPayloadDecoder.decode_64bit_int,
+    '64uint': BinaryPayloadDecoder.decode_64bit_uint,
+    '64float': BinaryPayloadDecoder.decode_64bit_float,
+}
+
 
 class BytesModbusUplinkConverter(ModbusConverter):
     def __init__(self, config):
@@ -36,6 +55,10 @@ class BytesModbusUplinkConverter(ModbusConverter):
         self.__result["telemetry"] = []
         self.__result["attributes"] = []
         for config_data in data:
+            if config_data == REGISTER_BLOCKS_SECTION:
+                self.__decode_register_blocks(data[config_data])
+                continue
+
             for tag in data[config_data]:
                 try:
                     configuration = data[config_data][tag]["data_sent"]
@@ -93,60 +116,56 @@ class BytesModbusUplinkConverter(ModbusConverter):
         log.debug(self.__result)
         return self.__result
 
+    def __decode_register_blocks(self, blocks):
+        for block, response in blocks:
+            try:
+                if isinstance(response, (ModbusIOException, ExceptionResponse)) or response is None:
+                    log.exception(response)
+                    continue
+
+                log.debug("Block: %i-%i registers: %s", block.address, block.address + block.count,
+                          str(response.registers))
+                for section, key, value in block.decode(response.registers):
+                    self.__result[self.__datatypes[section]].append({key: value})
+            except Exception as e:
+                log.exception(e)
+
     @staticmethod
     def decode_from_registers(decoder, configuration):
         type_ = configuration["type"]
         objects_count = configuration.get("objectsCount", configuration.get("registersCount", configuration.get("registerCount", 1)))
         lower_type = type_.lower()
 
-        decoder_functions = {
-            'string': decoder.decode_string,
-            'bytes': decoder.decode_string,
-            'bit': decoder.decode_bits,
-            'bits': decoder.decode_bits,
-            '8int': decoder.decode_8bit_int,
-            '8uint': decoder.decode_8bit_uint,
-            '16int': decoder.decode_16bit_int,
-            '16uint': decoder.decode_16bit_uint,
-            '16float': decoder.decode_16bit_float,
-            '32int': decoder.decode_32bit_int,
-            '32uint': decoder.decode_32bit_uint,
-            '32float': decoder.decode_32bit_float,
-            '64int': decoder.decode_64bit_int,
-            '64uint': decoder.decode_64bit_uint,
-            '64float': decoder.decode_64bit_float,
-            }
-
         decoded = None
 
         if lower_type in ['bit','bits']:
-            decoded_lastbyte= decoder_functions[type_]()
-            decoded= decoder_functions[type_]()
-            decoded+=decoded_lastbyte
+            decoded_lastbyte = DECODER_FUNCTIONS[lower_type](decoder)
+            decoded = DECODER_FUNCTIONS[lower_type](decoder)
+            decoded += decoded_lastbyte
 
         elif lower_type == "string":
-            decoded = decoder_functions[type_](objects_count * 2)
+            decoded = DECODER_FUNCTIONS[lower_type](decoder, objects_count * 2)
 
         elif lower_type == "bytes":
-            decoded = decoder_functions[type_](size=objects_count * 2)
+            decoded = DECODER_FUNCTIONS[lower_type](decoder, size=objects_count * 2)
 
-        elif decoder_functions.get(lower_type) is not None:
-            decoded = decoder_functions[lower_type]()
+        elif DECODER_FUNCTIONS.get(lower_type) is not None:
+            decoded = DECODER_FUNCTIONS[lower_type](decoder)
 
         elif lower_type in ['int', 'long', 'integer']:
             type_ = str(objects_count * 16) + "int"
-            assert decoder_functions.get(type_) is not None
-            decoded = decoder_functions[type_]()
+            assert DECODER_FUNCTIONS.get(type_) is not None
+            decoded = DECODER_FUNCTIONS[type_](decoder)
 
         elif lower_type in ["double", "float"]:
             type_ = str(objects_count * 16) + "float"
-            assert decoder_functions.get(type_) is not None
-            decoded = decoder_functions[type_]()
+            assert DECODER_FUNCTIONS.get(type_) is not None
+            decoded = DECODER_FUNCTIONS[type_](decoder)
 
         elif lower_type == 'uint':
             type_ = str(objects_count * 16) + "uint"
-            assert decoder_functions.get(type_) is not None
-            decoded = decoder_functions[type_]()
+            assert DECODER_FUNCTIONS.get(type_) is not None
+            decoded = DECODER_FUNCTIONS[type_](decoder)
 
         else:
             log.error("Unknown type: %s", type_)
@@ -63,5 +63,10 @@ RETRIES_PARAMETER = "retries"
 RETRY_ON_EMPTY_PARAMETER = "retryOnEmpty"
 RETRY_ON_INVALID_PARAMETER = "retryOnInvalid"
 
+BULK_READ_PARAMETER = "bulkRead"
+MAX_REGISTERS_PER_BLOCK_PARAMETER = "maxRegistersPerBlock"
+MAX_REGISTER_GAP_PARAMETER = "maxRegisterGap"
+REGISTER_BLOCKS_SECTION = "registerBlocks"
+
 PAYLOAD_PARAMETER = "payload"
 TAG_PARAMETER = "tag"
@@ -29,13 +29,6 @@ except ImportError:
     TBUtility.install_package('pyserial')
     from pymodbus.constants import Defaults
 
-try:
-    from twisted.internet import reactor
-except ImportError:
-    TBUtility.install_package('twisted')
-    from twisted.internet import reactor
-
-from twisted.internet import reactor
 from pymodbus.bit_write_message import WriteSingleCoilResponse, WriteMultipleCoilsResponse
 from pymodbus.register_write_message import WriteMultipleRegistersResponse, WriteSingleRegisterResponse
 from pymodbus.register_read_message import ReadRegistersResponseBase
@@ -43,17 +36,12 @@ from pymodbus.bit_read_message import ReadBitsResponseBase
 from pymodbus.client.sync import ModbusTcpClient, ModbusUdpClient, ModbusSerialClient
 from pymodbus.client.sync import ModbusRtuFramer, ModbusSocketFramer, ModbusAsciiFramer
 from pymodbus.exceptions import ConnectionException
-from pymodbus.server.asynchronous import StartTcpServer, StartUdpServer, StartSerialServer, StopServer
-from pymodbus.device import ModbusDeviceIdentification
-from pymodbus.version import version
-from pymodbus.datastore import ModbusSlaveContext, ModbusServerContext
-from pymodbus.datastore import ModbusSparseDataBlock
 
 from thingsboard_gateway.connectors.connector import Connector, log
 from thingsboard_gateway.connectors.modbus.constants import *
 from thingsboard_gateway.connectors.modbus.slave import Slave
+from thingsboard_gateway.connectors.modbus.server import ModbusSlaveServer
 from thingsboard_gateway.connectors.modbus.backward_compability_adapter import BackwardCompatibilityAdapter
-from thingsboard_gateway.connectors.modbus.bytes_modbus_downlink_converter import BytesModbusDownlinkConverter
 
 CONVERTED_DATA_SECTIONS = [ATTRIBUTES_PARAMETER, TELEMETRY_PARAMETER]
 FRAMER_TYPE = {
@@ -61,21 +49,6 @@ FRAMER_TYPE = {
     'socket': ModbusSocketFramer,
     'ascii': ModbusAsciiFramer
 }
-SLAVE_TYPE = {
-    'tcp': StartTcpServer,
-    'udp': StartUdpServer,
-    'serial': StartSerialServer
-}
-FUNCTION_TYPE = {
-    'coils_initializer': 'co',
-    'holding_registers': 'hr',
-    'input_registers': 'ir',
-    'discrete_inputs': 'di'
-}
-FUNCTION_CODE_WRITE = {
-    'holding_registers': (6, 16),
-    'coils_initializer': (5, 15)
-}
 FUNCTION_CODE_READ = {
     'holding_registers': 3,
     'coils_initializer': 1,
@@ -110,13 +83,16 @@ class ModbusConnector(Connector, Thread):
         self.__max_msg_number_for_worker = config.get('maxMessageNumberPerWorker', 10)
         self.__max_number_of_workers = config.get('maxNumberOfWorkers', 100)
 
+        self.__server = None
         if self.__config.get('slave'):
-            self.__slave_thread = Thread(target=self.__configure_and_run_slave, args=(self.__config['slave'],),
-                                         daemon=True, name='Gateway as a slave')
-            self.__slave_thread.start()
+            self.__server = ModbusSlaveServer(self.__config['slave'], callback=self._save_data)
+            self.__server.start()
 
             if config['slave'].get('sendDataToThingsBoard', False):
                 self.__modify_main_config()
+            elif self.__server.has_downlink and self.__server.device_name not in self.__gateway.get_devices():
+                self.__gateway.add_device(self.__server.device_name, {CONNECTOR_PARAMETER: self},
+                                          device_type=self.__config['slave'].get(DEVICE_TYPE_PARAMETER))
 
         self.__slaves = []
         self.__load_slaves()
@@ -139,43 +115,6 @@ class ModbusConnector(Connector, Thread):
 
             sleep(.001)
 
-    @staticmethod
-    def __configure_and_run_slave(config):
-        identity = None
-        if config.get('identity'):
-            identity = ModbusDeviceIdentification()
-            identity.VendorName = config['identity'].get('vendorName', '')
-            identity.ProductCode = config['identity'].get('productCode', '')
-            identity.VendorUrl = config['identity'].get('vendorUrl', '')
-            identity.ProductName = config['identity'].get('productName', '')
-            identity.ModelName = config['identity'].get('ModelName', '')
-            identity.MajorMinorRevision = version.short()
-
-        blocks = {}
-        for (key, value) in config.get('values').items():
-            values = {}
-            converter = BytesModbusDownlinkConverter({})
-            for item in value:
-                for section in ('attributes', 'timeseries', 'attributeUpdates', 'rpc'):
-                    for val in item.get(section, []):
-                        function_code = FUNCTION_CODE_WRITE[key][0] if val['objectsCount'] <= 1 else \
-                            FUNCTION_CODE_WRITE[key][1]
-                        converted_value = converter.convert(
-                            {**val,
-                             'device': config.get('deviceName', 'Gateway'), 'functionCode': function_code,
-                             'byteOrder': config['byteOrder'], 'wordOrder': config['wordOrder']},
-                            {'data': {'params': val['value']}})
-                        values[val['address'] + 1] = converted_value
-
-            blocks[FUNCTION_TYPE[key]] = ModbusSparseDataBlock(values)
-
-        context = ModbusServerContext(slaves=ModbusSlaveContext(**blocks), single=True)
-        SLAVE_TYPE[config['type']](context, identity=identity,
-                                   address=(config.get('host'), config.get('port')) if (
-                                           config['type'] == 'tcp' or 'udp') else None,
-                                   port=config.get('port') if config['type'] == 'serial' else None,
-                                   framer=FRAMER_TYPE[config['method']])
-
     def __modify_main_config(self):
         config = self.__config['slave']
 
@@ -273,8 +212,8 @@ class ModbusConnector(Connector, Thread):
     def close(self):
         self.__stopped = True
         self.__stop_connections_to_masters()
-        if reactor.running:
-            StopServer()
+        if self.__server is not None:
+            self.__server.stop()
         log.info('%s has been stopped.', self.get_name())
 
     def get_name(self):
@@ -301,6 +240,9 @@ class ModbusConnector(Connector, Thread):
                             # Reading data from device
                             for interested_data in range(len(current_device_config[config_section])):
                                 current_data = current_device_config[config_section][interested_data]
+                                if (config_section, current_data[TAG_PARAMETER]) in device.bulk_read_tags:
+                                    continue
+
                                 current_data[DEVICE_NAME_PARAMETER] = device
                                 input_data = self.__function_to_device(device, current_data)
                                 device_responses[config_section][current_data[TAG_PARAMETER]] = {
@@ -310,7 +252,13 @@ class ModbusConnector(Connector, Thread):
                             log.debug("Checking %s for device %s", config_section, device)
                             log.debug('Device response: ', device_responses)
 
-                    if device_responses.get('timeseries') or device_responses.get('attributes'):
+                    if device.register_blocks and device.config['master'].is_socket_open():
+                        device_responses[REGISTER_BLOCKS_SECTION] = [
+                            (block, self.__function_to_device(device, block.read_config))
+                            for block in device.register_blocks]
+
+                    if device_responses.get('timeseries') or device_responses.get('attributes') or \
+                            device_responses.get(REGISTER_BLOCKS_SECTION):
                         self._convert_msg_queue.put((self.__convert_data, (device, current_device_config, {
                             **current_device_config,
                             BYTE_ORDER_PARAMETER: current_device_config.get(BYTE_ORDER_PARAMETER,
@@ -480,6 +428,10 @@ class ModbusConnector(Connector, Thread):
 
     def on_attributes_update(self, content):
         try:
+            if self.__server is not None and content[DEVICE_SECTION_PARAMETER] == self.__server.device_name:
+                self.__server.on_attributes_update(content)
+                return
+
             device = tuple(filter(lambda slave: slave.name == content[DEVICE_SECTION_PARAMETER], self.__slaves))[0]
 
             for attribute_updates_command_config in device.config['attributeUpdates']:
@@ -505,6 +457,13 @@ class ModbusConnector(Connector, Thread):
                 log.debug("Modbus connector received rpc request for %s with server_rpc_request: %s",
                           server_rpc_request[DEVICE_SECTION_PARAMETER],
                           server_rpc_request)
+                if self.__server is not None and \
+                        server_rpc_request[DEVICE_SECTION_PARAMETER] == self.__server.device_name:
+                    self.__gateway.send_rpc_reply(server_rpc_request[DEVICE_SECTION_PARAMETER],
+                                                  server_rpc_request[DATA_PARAMETER][RPC_ID_PARAMETER],
+                                                  self.__server.server_side_rpc_handler(server_rpc_request))
+                    return
+
                 device = tuple(
                     filter(
                         lambda slave: slave.name == server_rpc_request[DEVICE_SECTION_PARAMETER], self.__slaves
@@ -0,0 +1,178 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from math import ceil
+from operator import itemgetter
+from struct import Struct
+
+from thingsboard_gateway.connectors.modbus.constants import *
+
+BLOCK_FUNCTION_CODES = (3, 4)
+MAX_REGISTERS_PER_READ = 125
+
+# struct format character and size in bytes for every type that can be decoded in bulk
+BLOCK_TYPES = {
+    '8int': ('b', 1),
+    '8uint': ('B', 1),
+    '16int': ('h', 2),
+    '16uint': ('H', 2),
+    '16float': ('e', 2),
+    '32int': ('i', 4),
+    '32uint': ('I', 4),
+    '32float': ('f', 4),
+    '64int': ('q', 8),
+    '64uint': ('Q', 8),
+    '64float': ('d', 8),
+}
+SIZED_TYPES = {
+    'int': 'int',
+    'long': 'int',
+    'integer': 'int',
+    'uint': 'uint',
+    'float': 'float',
+    'double': 'float',
+}
+
+
+def get_objects_count(config):
+    return config.get(OBJECTS_COUNT_PARAMETER, config.get("registersCount", config.get("registerCount", 1)))
+
+
+def resolve_block_type(config):
+    """Returns the fixed size type name for the tag or None if the tag can't be decoded in bulk."""
+    lower_type = config.get(TYPE_PARAMETER, '').lower()
+    if lower_type in SIZED_TYPES:
+        lower_type = str(get_objects_count(config) * 16) + SIZED_TYPES[lower_type]
+    return lower_type if lower_type in BLOCK_TYPES else None
+
+
+class RegisterBlock:
+    """
+    Contiguous range of holding/input registers that is read by one request and decoded by one struct call.
+
+    Byte and word order are resolved at configuration time into a byte permutation of the raw payload,
+    so every tag of the block is unpacked from the reordered payload with a single big-endian struct format.
+    Decoding results are the same as BinaryPayloadDecoder would give for every tag separately.
+    """
+
+    def __init__(self, function_code, tags, byte_order='LITTLE', word_order='LITTLE'):
+        self.function_code = function_code
+        self.address = min(tag[ADDRESS_PARAMETER] for _, tag in tags)
+        self.count = max(tag[ADDRESS_PARAMETER] + get_objects_count(tag) for _, tag in tags) - self.address
+        self.tags = tags
+
+        self.__registers_struct = Struct('>%iH' % self.count)
+
+        picks = []
+        struct_format = '>'
+        self.__post_processing = []
+        for section, tag in tags:
+            type_format, size = BLOCK_TYPES[resolve_block_type(tag)]
+            offset = (tag[ADDRESS_PARAMETER] - self.address) * 2
+            picks.extend(self.__get_byte_permutation(offset, size,
+                                                     (tag.get(BYTE_ORDER_PARAMETER) or byte_order).upper(),
+                                                     (tag.get(WORD_ORDER_PARAMETER) or word_order).upper()))
+            struct_format += type_format
+            self.__post_processing.append((section, tag[TAG_PARAMETER], tag.get('divider'), tag.get('multiplier')))
+
+        self.__values_struct = Struct(struct_format)
+        if picks == list(range(self.count * 2)):
+            self.__reorder = None
+        elif len(picks) == 1:
+            self.__reorder = lambda payload: payload[picks[0]:picks[0] + 1]
+        else:
+            getter = itemgetter(*picks)
+            self.__reorder = lambda payload: bytes(getter(payload))
+
+    @property
+    def read_config(self):
+        return {FUNCTION_CODE_PARAMETER: self.function_code,
+                ADDRESS_PARAMETER: self.address,
+                OBJECTS_COUNT_PARAMETER: self.count,
+                TAG_PARAMETER: 'block_%i_%i' % (self.address, self.count)}
+
+    @staticmethod
+    def __get_byte_permutation(offset, size, byte_order, word_order):
+        if size == 1:
+            return [offset]
+
+        words = range(size // 2)
+        if word_order == 'LITTLE':
+            words = reversed(words)
+
+        permutation = []
+        for word in words:
+            high = offset + word * 2
+            permutation.extend((high + 1, high) if byte_order == 'LITTLE' else (high, high + 1))
+        return permutation
+
+    def decode(self, registers):
+        """Returns a list of (section, key, value) tuples for all tags of the block."""
+        payload = self.__registers_struct.pack(*registers[:self.count])
+        if self.__reorder is not None:
+            payload = self.__reorder(payload)
+
+        result = []
+        for (section, key, divider, multiplier), value in zip(self.__post_processing,
+                                                              self.__values_struct.unpack(payload)):
+            if divider:
+                value = float(value) / float(divider)
+            if multiplier:
+                value = value * multiplier
+            result.append((section, key, value))
+        return result
+
+    @staticmethod
+    def build_blocks(config, sections=('timeseries', 'attributes'), max_count=MAX_REGISTERS_PER_READ, max_gap=0):
+        """
+        Groups register tags of the device configuration into blocks.
+        Tags that can't be decoded in bulk (strings, bits, coils, discrete inputs) aren't included.
+        """
+
+        byte_order = config.get(BYTE_ORDER_PARAMETER) or 'LITTLE'
+        word_order = config.get(WORD_ORDER_PARAMETER) or 'LITTLE'
+        max_count = min(max_count, MAX_REGISTERS_PER_READ)
+
+        tags_by_function = {}
+        for section in sections:
+            for tag in config.get(section, []):
+                if tag.get(FUNCTION_CODE_PARAMETER) not in BLOCK_FUNCTION_CODES or resolve_block_type(tag) is None:
+                    continue
+                # tag must span enough registers to hold the decoded type
+                if get_objects_count(tag) < ceil(BLOCK_TYPES[resolve_block_type(tag)][1] / 2):
+                    continue
+                tags_by_function.setdefault(tag[FUNCTION_CODE_PARAMETER], []).append((section, tag))
+
+        blocks = []
+        for function_code, tags in tags_by_function.items():
+            tags.sort(key=lambda item: item[1][ADDRESS_PARAMETER])
+
+            current_tags = []
+            start = end = 0
+            for section, tag in tags:
+                tag_end = tag[ADDRESS_PARAMETER] + get_objects_count(tag)
+                if current_tags and (tag[ADDRESS_PARAMETER] > end + max_gap or max(end, tag_end) - start > max_count):
+                    blocks.append(RegisterBlock(function_code, current_tags, byte_order, word_order))
+                    current_tags = []
+
+                if not current_tags:
+                    start, end = tag[ADDRESS_PARAMETER], tag_end
+
+                current_tags.append((section, tag))
+                end = max(end, tag_end)
+
+            if current_tags:
+                blocks.append(RegisterBlock(function_code, current_tags, byte_order, word_order))
+
+        return blocks
@@ -0,0 +1,385 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+import asyncio
+from array import array
+from threading import Thread, Lock
+from time import monotonic
+
+from pymodbus.constants import Endian
+from pymodbus.datastore import ModbusSlaveContext, ModbusServerContext
+from pymodbus.datastore.store import BaseModbusDataBlock
+from pymodbus.device import ModbusDeviceIdentification
+from pymodbus.payload import BinaryPayloadDecoder
+from pymodbus.transaction import ModbusRtuFramer, ModbusSocketFramer, ModbusAsciiFramer
+from pymodbus.version import version
+
+from thingsboard_gateway.tb_utility.tb_utility import TBUtility
+
+try:
+    from pymodbus.server.async_io import ModbusTcpServer
+except ImportError:
+    TBUtility.install_package('pyserial-asyncio')
+
+from pymodbus.server.async_io import ModbusTcpServer, ModbusUdpServer, ModbusSerialServer, \
+    ModbusConnectedRequestHandler, ModbusDisconnectedRequestHandler, ModbusSingleRequestHandler
+
+from thingsboard_gateway.connectors.connector import log
+from thingsboard_gateway.connectors.modbus.constants import *
+from thingsboard_gateway.connectors.modbus.bytes_modbus_downlink_converter import BytesModbusDownlinkConverter
+from thingsboard_gateway.connectors.modbus.bytes_modbus_uplink_converter import BytesModbusUplinkConverter
+
+FRAMER_TYPE = {
+    'rtu': ModbusRtuFramer,
+    'socket': ModbusSocketFramer,
+    'ascii': ModbusAsciiFramer
+}
+FUNCTION_TYPE = {
+    'coils_initializer': 'co',
+    'holding_registers': 'hr',
+    'input_registers': 'ir',
+    'discrete_inputs': 'di'
+}
+BIT_FUNCTION_TYPES = ('co', 'di')
+FUNCTION_CODE_WRITE = {
+    'co': (5, 15),
+    'di': (5, 15),
+    'hr': (6, 16),
+    'ir': (6, 16)
+}
+DATA_SECTIONS = ('attributes', 'timeseries', 'attributeUpdates', 'rpc')
+MAX_ADDRESS = 65536
+DEFAULT_STATISTICS_REPORT_PERIOD_MS = 60000
+
+
+class ArrayDataBlock(BaseModbusDataBlock):
+    """
+    Modbus datastore backed by a compact array instead of a list or dict of Python objects.
+    Values can be updated from any thread while the server reads them in the event loop.
+    """
+
+    def __init__(self, address, count, bits=False):
+        self.address = address
+        self.default_value = False if bits else 0
+        self.__bits = bits
+        self.__typecode = 'B' if bits else 'H'
+        self.values = array(self.__typecode, bytes(count * array(self.__typecode).itemsize))
+        self.__lock = Lock()
+
+    @classmethod
+    def from_values(cls, values, bits=False):
+        """Creates the block from the {address: [values]} dictionary, unset addresses in the range are zeros."""
+        if not values:
+            return cls(1, MAX_ADDRESS, bits)
+
+        start = min(values)
+        end = max(address + len(items) for address, items in values.items())
+        block = cls(start, end - start, bits)
+        for address, items in values.items():
+            block.setValues(address, items)
+        return block
+
+    def reset(self):
+        with self.__lock:
+            self.values = array(self.__typecode, bytes(len(self.values) * self.values.itemsize))
+
+    def validate(self, address, count=1):
+        return self.address <= address and address + count <= self.address + len(self.values)
+
+    def getValues(self, address, count=1):
+        start = address - self.address
+        with self.__lock:
+            values = self.values[start:start + count].tolist()
+        return [bool(value) for value in values] if self.__bits else values
+
+    def setValues(self, address, values):
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+
+        start = address - self.address
+        if self.__bits:
+            converted = array(self.__typecode, (1 if value else 0 for value in values))
+        else:
+            converted = array(self.__typecode, (int(value) & 0xFFFF for value in values))
+        with self.__lock:
+            self.values[start:start + len(converted)] = converted
+
+
+class RequestStatistics:
+    def __init__(self):
+        self.requests = 0
+        self.total_latency = 0.
+        self.max_latency = 0.
+
+    def add(self, latency):
+        self.requests += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+
+class StatisticsMixin:
+    def execute(self, request, *addr):
+        started = monotonic()
+        super().execute(request, *addr)
+        self.server.request_statistics.add(monotonic() - started)
+
+
+class CancellationMixin:
+    def _log_exception(self):
+        # pymodbus logs cancellation of a handler as an error, it happens on every disconnect and on shutdown
+        log.debug('Modbus request handler has been canceled')
+
+
+class ConnectedRequestHandler(CancellationMixin, StatisticsMixin, ModbusConnectedRequestHandler):
+    pass
+
+
+class DisconnectedRequestHandler(CancellationMixin, StatisticsMixin, ModbusDisconnectedRequestHandler):
+    pass
+
+
+class SingleRequestHandler(CancellationMixin, StatisticsMixin, ModbusSingleRequestHandler):
+    pass
+
+
+class UdpServer(ModbusUdpServer):
+    def __init__(self, *args, **kwargs):
+        try:
+            super().__init__(*args, **kwargs)
+        except TypeError:
+            # Python 3.11 removed reuse_address of create_datagram_endpoint and pymodbus 2.5.3 still passes it. The
+            # endpoint is the last thing the server sets up, so only that is done here.
+            self.server_factory = self.loop.create_datagram_endpoint(lambda: self.handler(self),
+                                                                     local_addr=self.address,
+                                                                     allow_broadcast=True)
+
+
+class ModbusSlaveServer(Thread):
+    """
+    Runs the gateway as a Modbus server on its own asyncio event loop, so many masters are served from one thread
+    without the global twisted reactor. Register values can be updated from ThingsBoard shared attributes and RPC.
+    """
+
+    def __init__(self, config, callback=None):
+        super().__init__()
+        self.daemon = True
+        self.name = 'Gateway as a slave'
+        self.device_name = config.get(DEVICE_NAME_PARAMETER, 'Gateway')
+
+        self.__config = config
+        self.__callback = callback
+        self.__byte_order = config.get(BYTE_ORDER_PARAMETER, 'LITTLE')
+        self.__word_order = config.get(WORD_ORDER_PARAMETER, 'LITTLE')
+        self.__downlink_converter = BytesModbusDownlinkConverter({})
+        self.__statistics_report_period = config.get('statisticsReportPeriodMs',
+                                                     DEFAULT_STATISTICS_REPORT_PERIOD_MS) / 1000
+
+        self.__attribute_updates = {}
+        self.__rpc = {}
+        self.__blocks = self.__build_blocks(config.get('values', {}))
+        self.__context = ModbusServerContext(slaves=ModbusSlaveContext(**self.__blocks), single=True)
+
+        self.__loop = None
+        self.__server = None
+        self.__stopped = False
+
+    @property
+    def has_downlink(self):
+        return bool(self.__attribute_updates or self.__rpc)
+
+    def __build_blocks(self, values_config):
+        values_by_type = {function_type: {} for function_type in FUNCTION_TYPE.values()}
+        for (key, value) in values_config.items():
+            function_type = FUNCTION_TYPE[key]
+            for item in value:
+                for section in DATA_SECTIONS:
+                    for val in item.get(section, []):
+                        if section == 'attributeUpdates':
+                            self.__attribute_updates.setdefault(val[TAG_PARAMETER], []).append((function_type, val))
+                        elif section == 'rpc':
+                            self.__rpc.setdefault(val[TAG_PARAMETER], []).append((function_type, val))
+
+                        if val.get('value') is not None:
+                            values_by_type[function_type][val[ADDRESS_PARAMETER] + 1] = self.__convert(
+                                function_type, val, val['value'])
+
+        return {function_type: ArrayDataBlock.from_values(values, bits=function_type in BIT_FUNCTION_TYPES)
+                for function_type, values in values_by_type.items()}
+
+    def __convert(self, function_type, config, value):
+        if function_type in BIT_FUNCTION_TYPES:
+            values = value if isinstance(value, list) else [value]
+            return [str(item).lower() in ('1', 'true', 'on') for item in values]
+
+        objects_count = config.get(OBJECTS_COUNT_PARAMETER, 1)
+        function_code = FUNCTION_CODE_WRITE[function_type][0 if objects_count <= 1 else 1]
+        converted_value = self.__downlink_converter.convert(
+            {**config,
+             'device': self.device_name, FUNCTION_CODE_PARAMETER: function_code,
+             BYTE_ORDER_PARAMETER: self.__byte_order, WORD_ORDER_PARAMETER: self.__word_order},
+            {DATA_PARAMETER: {RPC_PARAMS_PARAMETER: value}})
+        return converted_value if isinstance(converted_value, list) else [converted_value]
+
+    def write(self, function_type, config, value):
+        self.__blocks[function_type].setValues(config[ADDRESS_PARAMETER] + 1,
+                                               self.__convert(function_type, config, value))
+
+    def read(self, function_type, config):
+        objects_count = config.get(OBJECTS_COUNT_PARAMETER, 1)
+        values = self.__blocks[function_type].getValues(config[ADDRESS_PARAMETER] + 1, objects_count)
+        byte_order = Endian.Little if self.__byte_order.upper() == 'LITTLE' else Endian.Big
+        word_order = Endian.Little if self.__word_order.upper() == 'LITTLE' else Endian.Big
+        if function_type in BIT_FUNCTION_TYPES:
+            decoder = BinaryPayloadDecoder.fromCoils(values, byteorder=byte_order)
+        else:
+            decoder = BinaryPayloadDecoder.fromRegisters(values, byteorder=byte_order, wordorder=word_order)
+        return BytesModbusUplinkConverter.decode_from_registers(decoder, config)
+
+    def on_attributes_update(self, content):
+        for key, value in content[DATA_PARAMETER].items():
+            for function_type, config in self.__attribute_updates.get(key, []):
+                try:
+                    self.write(function_type, config, value)
+                    log.debug('Modbus server value %s updated to %r', key, value)
+                except Exception as e:
+                    log.exception(e)
+
+    def server_side_rpc_handler(self, content):
+        method = content[DATA_PARAMETER][RPC_METHOD_PARAMETER]
+        params = content[DATA_PARAMETER].get(RPC_PARAMS_PARAMETER)
+        configs = self.__rpc.get(method)
+
+        if not configs:
+            log.error("Received rpc request, but method %s not found in config for %s.", method, self.device_name)
+            result = {method: "METHOD NOT FOUND!"}
+        else:
+            try:
+                if params is not None:
+                    for function_type, config in configs:
+                        self.write(function_type, config, params)
+                    result = {"success": True}
+                else:
+                    function_type, config = configs[0]
+                    result = {method: self.read(function_type, config)}
+            except Exception as e:
+                log.exception(e)
+                result = {method: str(e)}
+
+        return result
+
+    def run(self):
+        self.__loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.__loop)
+
+        try:
+            self.__server = self.__create_server()
+            self.__server.request_statistics = RequestStatistics()
+            self.__loop.call_later(self.__statistics_report_period or DEFAULT_STATISTICS_REPORT_PERIOD_MS / 1000,
+                                   self.__report_statistics, monotonic())
+
+            if isinstance(self.__server, ModbusSerialServer):
+                self.__loop.run_until_complete(self.__server.start())
+            self.__loop.run_until_complete(self.__server.serve_forever())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if not self.__stopped:
+                log.exception(e)
+        finally:
+            tasks = asyncio.all_tasks(self.__loop)
+            for task in tasks:
+                task.cancel()
+            self.__loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.__loop.close()
+
+    def __create_server(self):
+        config = self.__config
+        identity = None
+        if config.get('identity'):
+            identity = ModbusDeviceIdentification()
+            identity.VendorName = config['identity'].get('vendorName', '')
+            identity.ProductCode = config['identity'].get('productCode', '')
+            identity.VendorUrl = config['identity'].get('vendorUrl', '')
+            identity.ProductName = config['identity'].get('productName', '')
+            identity.ModelName = config['identity'].get('ModelName', '')
+            identity.MajorMinorRevision = version.short()
+
+        framer = FRAMER_TYPE[config.get(METHOD_PARAMETER, 'socket')]
+        if config[TYPE_PARAMETER] == 'tcp':
+            return ModbusTcpServer(self.__context, framer, identity, (config.get(HOST_PARAMETER), config.get(PORT_PARAMETER)),
+                                   handler=ConnectedRequestHandler, allow_reuse_address=True,
+                                   backlog=config.get('backlog', 1024), loop=self.__loop)
+        elif config[TYPE_PARAMETER] == 'udp':
+            # asyncio rejects reuse_address=True for datagram endpoints since Python 3.8.1
+            return UdpServer(self.__context, framer, identity, (config.get(HOST_PARAMETER), config.get(PORT_PARAMETER)),
+                             handler=DisconnectedRequestHandler, loop=self.__loop)
+        elif config[TYPE_PARAMETER] == 'serial':
+            return ModbusSerialServer(self.__context, framer, identity, port=config.get(PORT_PARAMETER),
+                                      baudrate=config.get(BAUDRATE_PARAMETER, 19200),
+                                      stopbits=config.get(STOPBITS_PARAMETER, 1),
+                                      bytesize=config.get(BYTESIZE_PARAMETER, 8),
+                                      parity=config.get(PARITY_PARAMETER, 'N'),
+                                      timeout=config.get(TIMEOUT_PARAMETER, 1),
+                                      handler=SingleRequestHandler, auto_reconnect=True)
+
+        raise Exception("Invalid Modbus transport type.")
+
+    def __report_statistics(self, period_start):
+        now = monotonic()
+        statistics = self.__server.request_statistics
+        self.__server.request_statistics = RequestStatistics()
+
+        telemetry = {
+            'modbusServerRequestsPerSecond': round(statistics.requests / max(now - period_start, 1e-6), 2),
+            'modbusServerAvgLatencyMs': round(statistics.total_latency / statistics.requests * 1000, 3)
+            if statistics.requests else 0,
+            'modbusServerMaxLatencyMs': round(statistics.max_latency * 1000, 3),
+            'modbusServerConnections': len(getattr(self.__server, 'active_connections', {}))
+        }
+        log.debug('Modbus server statistics: %s', telemetry)
+
+        if self.__callback is not None and self.__statistics_report_period:
+            self.__callback({DEVICE_NAME_PARAMETER: self.device_name,
+                             DEVICE_TYPE_PARAMETER: self.__config.get(DEVICE_TYPE_PARAMETER, 'default'),
+                             TELEMETRY_PARAMETER: [telemetry],
+                             ATTRIBUTES_PARAMETER: []})
+
+        if not self.__stopped:
+            self.__loop.call_later(self.__statistics_report_period or DEFAULT_STATISTICS_REPORT_PERIOD_MS / 1000,
+                                   self.__report_statistics, now)
+
+    def stop(self):
+        self.__stopped = True
+        if self.__loop is not None and self.__server is not None and not self.__loop.is_closed():
+            self.__loop.call_soon_threadsafe(self.__close_server)
+
+    def __close_server(self):
+        try:
+            if isinstance(self.__server, ModbusSerialServer):
+                if self.__server.transport is not None:
+                    self.__server.transport.close()
+                self.__loop.stop()
+            else:
+                # pymodbus handlers ignore cancellation while they are running, so connections are closed explicitly
+                handlers = list(getattr(self.__server, 'active_connections', {}).values())
+                if getattr(self.__server, 'endpoint', None) is not None:
+                    handlers.append(self.__server.endpoint)
+                for handler in handlers:
+                    handler.running = False
+                    if getattr(handler, 'transport', None) is not None:
+                        handler.transport.close()
+                self.__server.server_close()
+        except Exception as e:
+            log.exception(e)
@@ -21,6 +21,7 @@ from thingsboard_gateway.connectors.modbus.constants import *
 from thingsboard_gateway.connectors.connector import log
 from thingsboard_gateway.connectors.modbus.bytes_modbus_uplink_converter import BytesModbusUplinkConverter
 from thingsboard_gateway.connectors.modbus.bytes_modbus_downlink_converter import BytesModbusDownlinkConverter
+from thingsboard_gateway.connectors.modbus.register_block import RegisterBlock, MAX_REGISTERS_PER_READ
 from thingsboard_gateway.tb_utility.tb_loader import TBModuleLoader
 
 
@@ -64,6 +65,11 @@ class Slave(Thread):
             'last_telemetry': {}
         }
 
+        self.register_blocks = []
+        self.bulk_read_tags = set()
+        if kwargs.get(BULK_READ_PARAMETER, False):
+            self.__build_register_blocks(kwargs)
+
         self.__load_converters(kwargs['connector'], kwargs['gateway'])
 
         self.callback = kwargs['callback']
@@ -90,6 +96,16 @@ class Slave(Thread):
     def get_name(self):
         return self.name
 
+    def __build_register_blocks(self, config):
+        self.register_blocks = RegisterBlock.build_blocks(
+            self.config,
+            max_count=config.get(MAX_REGISTERS_PER_BLOCK_PARAMETER, MAX_REGISTERS_PER_READ),
+            max_gap=config.get(MAX_REGISTER_GAP_PARAMETER, 0))
+        self.bulk_read_tags = {(section, tag[TAG_PARAMETER])
+                               for block in self.register_blocks for section, tag in block.tags}
+        log.debug('%i tags of %s will be read in %i register blocks', len(self.bulk_read_tags), self.name,
+                  len(self.register_blocks))
+
     def __load_converters(self, connector, gateway):
         try:
             if self.config.get(UPLINK_PREFIX + CONVERTER_PARAMETER) is not None:
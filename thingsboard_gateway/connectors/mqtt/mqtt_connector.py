@@ -15,20 +15,32 @@
 import random
 import ssl
 import string
-from queue import Queue
-from re import fullmatch, match, search
-from threading import Thread
-from time import sleep, time
+from queue import Empty, SimpleQueue
+from re import match, search
+from threading import Lock, Thread
+from time import monotonic, sleep, time
 
 import simplejson
-from paho.mqtt.client import Client
+from paho.mqtt.client import Client, MQTTv31, MQTTv311, MQTTv5
 
 from thingsboard_gateway.connectors.connector import Connector, log
 from thingsboard_gateway.connectors.mqtt.mqtt_decorators import CustomCollectStatistics
+from thingsboard_gateway.connectors.mqtt.topic_trie import SHARED_SUBSCRIPTION_PREFIX, TopicTrie
 from thingsboard_gateway.tb_utility.tb_loader import TBModuleLoader
 from thingsboard_gateway.tb_utility.tb_utility import TBUtility
 from thingsboard_gateway.gateway.statistics_service import StatisticsService
 
+MQTT_VERSIONS = {3: MQTTv31, 4: MQTTv311, 5: MQTTv5}
+MESSAGE_WAIT_TIMEOUT = 1
+# Weight of the newest sample in the moving average of the stage latencies
+LATENCY_SMOOTHING = 0.05
+
+QUEUE_DEPTH_PARAMETER = 'InboundQueueDepth'
+QUEUE_LATENCY_PARAMETER = 'QueueLatencyMs'
+PROCESSING_LATENCY_PARAMETER = 'ProcessingLatencyMs'
+CONVERT_LATENCY_PARAMETER = 'ConvertLatencyMs'
+STORAGE_LATENCY_PARAMETER = 'StorageLatencyMs'
+
 
 class MqttConnector(Connector, Thread):
     def __init__(self, gateway, config, connector_type):
@@ -40,6 +52,8 @@ class MqttConnector(Connector, Thread):
 
         self.__log = log
         self.statistics = {'MessagesReceived': 0, 'MessagesSent': 0}
+        # Inbound workers update the statistics concurrently
+        self.__statistics_lock = Lock()
         self.__subscribes_sent = {}
 
         # Extract main sections from configuration ---------------------------------------------------------------------
@@ -79,21 +93,51 @@ class MqttConnector(Connector, Thread):
         # Attributes updates requests, i.e., asking ThingsBoard to send updates about an attribute
         self.load_handlers('attributeUpdates', mandatory_keys['attributeUpdates'], self.__attribute_updates)
 
-        # Setup topic substitution lists for each class of handlers ----------------------------------------------------
-        self.__mapping_sub_topics = {}
-        self.__connect_requests_sub_topics = {}
-        self.__disconnect_requests_sub_topics = {}
-        self.__attribute_requests_sub_topics = {}
+        # Setup topic filter tries for each class of handlers -----------------------------------------------------------
+        self.__mapping_sub_topics = TopicTrie()
+        self.__connect_requests_sub_topics = TopicTrie()
+        self.__disconnect_requests_sub_topics = TopicTrie()
+        self.__attribute_requests_sub_topics = TopicTrie()
 
         # Set up external MQTT broker connection -----------------------------------------------------------------------
         client_id = self.__broker.get("clientId", ''.join(random.choice(string.ascii_lowercase) for _ in range(23)))
-        self._client = Client(client_id)
         self.setName(config.get("name", self.__broker.get(
             "name",
             'Mqtt Broker ' + ''.join(random.choice(string.ascii_lowercase) for _ in range(5)))))
 
+        # Additional clients read the mapping topics in parallel: every client subscribes to all mapping topic filters
+        # as shared subscriptions of "sharedSubscriptionGroup", or to its own part of the filters without a group.
+        # The first client also handles requests, RPC responses and publishing.
+        self.__shared_subscription_group = self.__broker.get('sharedSubscriptionGroup')
+        clients_count = max(int(self.__broker.get('clientsCount', 1)), 1)
+        self._client = self.__create_client(client_id)
+        self._clients = [self._client] + [self.__create_client('%s_%i' % (client_id, number))
+                                          for number in range(1, clients_count)]
+
+        # Set up lifecycle flags ---------------------------------------------------------------------------------------
+        self._connected = False
+        self.__stopped = False
+        self.daemon = True
+
+        # Incoming messages are partitioned by topic between workers, every worker converts and saves its messages
+        self.statistics.update({QUEUE_DEPTH_PARAMETER: 0,
+                                QUEUE_LATENCY_PARAMETER: 0.0,
+                                PROCESSING_LATENCY_PARAMETER: 0.0,
+                                CONVERT_LATENCY_PARAMETER: 0.0,
+                                STORAGE_LATENCY_PARAMETER: 0.0})
+        workers_count = max(int(self.__broker.get('inboundWorkers', config.get('inboundWorkers', 1))), 1)
+        self._on_message_queues = [SimpleQueue() for _ in range(workers_count)]
+        self._on_message_threads = [Thread(name='On Message %i' % number, target=self._process_on_message,
+                                           args=(messages_queue,), daemon=True)
+                                    for number, messages_queue in enumerate(self._on_message_queues)]
+        for thread in self._on_message_threads:
+            thread.start()
+
+    def __create_client(self, client_id):
+        client = Client(client_id, protocol=MQTT_VERSIONS.get(self.__broker.get('version', 4), MQTTv311))
+
         if "username" in self.__broker["security"]:
-            self._client.username_pw_set(self.__broker["security"]["username"],
+            client.username_pw_set(self.__broker["security"]["username"],
                                          self.__broker["security"]["password"])
 
         if "caCert" in self.__broker["security"] \
@@ -103,10 +147,10 @@ class MqttConnector(Connector, Thread):
             cert = self.__broker["security"].get("cert")
 
             if ca_cert is None:
-                self._client.tls_set_context(ssl.SSLContext(ssl.PROTOCOL_TLSv1_2))
+                client.tls_set_context(ssl.SSLContext(ssl.PROTOCOL_TLSv1_2))
             else:
                 try:
-                    self._client.tls_set(ca_certs=ca_cert,
+                    client.tls_set(ca_certs=ca_cert,
                                          certfile=cert,
                                          keyfile=private_key,
                                          cert_reqs=ssl.CERT_REQUIRED,
@@ -118,30 +162,17 @@ class MqttConnector(Connector, Thread):
                                      self.get_name())
                     self.__log.exception(e)
                 if self.__broker["security"].get("insecure", False):
-                    self._client.tls_insecure_set(True)
+                    client.tls_insecure_set(True)
                 else:
-                    self._client.tls_insecure_set(False)
+                    client.tls_insecure_set(False)
 
         # Set up external MQTT broker callbacks ------------------------------------------------------------------------
-        self._client.on_connect = self._on_connect
-        self._client.on_message = self._on_message
-        self._client.on_subscribe = self._on_subscribe
-        self._client.on_disconnect = self._on_disconnect
-        # self._client.on_log = self._on_log
-
-        # Set up lifecycle flags ---------------------------------------------------------------------------------------
-        self._connected = False
-        self.__stopped = False
-        self.daemon = True
-
-        self.__msg_queue = Queue()
-        self.__workers_thread_pool = []# 工作线程池
-        self.__max_msg_number_for_worker = config.get('maxMessageNumberPerWorker', 10) # 工作线程池最大消息处理线程数
-        self.__max_number_of_workers = config.get('maxNumberOfWorkers', 100)# 工作线程池最大线程数
-
-        self._on_message_queue = Queue()
-        self._on_message_thread = Thread(name='On Message', target=self._process_on_message, daemon=True)
-        self._on_message_thread.start()
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        client.on_subscribe = self._on_subscribe
+        client.on_disconnect = self._on_disconnect
+        # client.on_log = self._on_log
+        return client
 
     def load_handlers(self, handler_flavor, mandatory_keys, accepted_handlers_list):
         if handler_flavor not in self.config:
@@ -186,6 +217,7 @@ class MqttConnector(Connector, Thread):
     def run(self):
         try:
             self.__connect()
+            self.__connect_additional_clients()
         except Exception as e:
             self.__log.exception(e)
             try:
@@ -198,9 +230,17 @@ class MqttConnector(Connector, Thread):
                 break
             elif not self._connected:
                 self.__connect()
-            self.__threads_manager()
             sleep(.2)
 
+    def __connect_additional_clients(self):
+        # Additional clients are reconnected by their network loops
+        for client in self._clients[1:]:
+            try:
+                client.connect_async(self.__broker['host'], self.__broker.get('port', 1883))
+                client.loop_start()
+            except Exception as e:
+                self.__log.exception(e)
+
     def __connect(self):
         while not self._connected and not self.__stopped:
             try:
@@ -215,21 +255,23 @@ class MqttConnector(Connector, Thread):
 
     def close(self):
         self.__stopped = True
-        try:
-            self._client.disconnect()
-        except Exception as e:
-            log.exception(e)
-        self._client.loop_stop()
+        for client in self._clients:
+            try:
+                client.disconnect()
+            except Exception as e:
+                log.exception(e)
+            client.loop_stop()
         self.__log.info('%s has been stopped.', self.get_name())
 
     def get_name(self):
         return self.name
 
     # 订阅
-    def __subscribe(self, topic, qos):
-        message = self._client.subscribe(topic, qos)
+    def __subscribe(self, topic, qos, client=None):
+        client = client or self._client
+        message = client.subscribe(topic, qos)
         try:
-            self.__subscribes_sent[message[1]] = topic
+            self.__subscribes_sent[(client, message[1])] = topic
         except Exception as e:
             self.__log.exception(e)
 
@@ -242,8 +284,14 @@ class MqttConnector(Connector, Thread):
             4: "bad username or password",
             5: "not authorised",
         }
-
-        if result_code == 0:
+        # MQTT 5 clients get reason code objects
+        result_code = getattr(result_code, 'value', result_code)
+
+        if result_code == 0 and client is not self._client:
+            self.__log.info('%s additional client %i connected - successfully.', self.get_name(),
+                            self._clients.index(client))
+            self.__subscribe_mapping(client)
+        elif result_code == 0:
             self._connected = True
             self.__log.info('%s connected to %s:%s - successfully.',
                             self.get_name(),
@@ -256,7 +304,10 @@ class MqttConnector(Connector, Thread):
                              str(flags),
                              extra_params)
 
-            self.__mapping_sub_topics = {}
+            self.__mapping_sub_topics.clear()
+            self.__connect_requests_sub_topics.clear()
+            self.__disconnect_requests_sub_topics.clear()
+            self.__attribute_requests_sub_topics.clear()
 
             # Setup data upload requests handling ----------------------------------------------------------------------
             for mapping in self.__mapping:
@@ -278,45 +329,32 @@ class MqttConnector(Connector, Thread):
                         self.__log.error("Cannot find converter for %s topic", mapping["topicFilter"])
                         continue
 
-                    # Setup regexp topic acceptance list ---------------------------------------------------------------
-                    regex_topic = TBUtility.topic_to_regex(mapping["topicFilter"])
-
-                    # There may be more than one converter per topic, so I'm using vectors
-                    if not self.__mapping_sub_topics.get(regex_topic):
-                        self.__mapping_sub_topics[regex_topic] = []
-
-                    self.__mapping_sub_topics[regex_topic].append(converter)
-
-                    # Subscribe to appropriate topic -------------------------------------------------------------------
-                    self.__subscribe(mapping["topicFilter"], mapping.get("subscriptionQos", 1))
-
-                    self.__log.info('Connector "%s" subscribe to %s',
-                                    self.get_name(),
-                                    TBUtility.regex_to_topic(regex_topic))
+                    # Setup topic acceptance trie, there may be more than one converter per topic -------------------
+                    self.__mapping_sub_topics.add(mapping["topicFilter"], converter)
 
                 except Exception as e:
                     self.__log.exception(e)
 
+            # Subscribe to appropriate topics --------------------------------------------------------------------------
+            self.__subscribe_mapping(client)
+
             # Setup connection requests handling -----------------------------------------------------------------------
             for request in [entry for entry in self.__connect_requests if entry is not None]:
                 # requests are guaranteed to have topicFilter field. See __init__
                 self.__subscribe(request["topicFilter"], request.get("subscriptionQos", 1))
-                topic_filter = TBUtility.topic_to_regex(request.get("topicFilter"))
-                self.__connect_requests_sub_topics[topic_filter] = request
+                self.__connect_requests_sub_topics.add(request["topicFilter"], request)
 
             # Setup disconnection requests handling --------------------------------------------------------------------
             for request in [entry for entry in self.__disconnect_requests if entry is not None]:
                 # requests are guaranteed to have topicFilter field. See __init__
                 self.__subscribe(request["topicFilter"], request.get("subscriptionQos", 1))
-                topic_filter = TBUtility.topic_to_regex(request.get("topicFilter"))
-                self.__disconnect_requests_sub_topics[topic_filter] = request
+                self.__disconnect_requests_sub_topics.add(request["topicFilter"], request)
 
             # Setup attributes requests handling -----------------------------------------------------------------------
             for request in [entry for entry in self.__attribute_requests if entry is not None]:
                 # requests are guaranteed to have topicFilter field. See __init__
                 self.__subscribe(request["topicFilter"], request.get("subscriptionQos", 1))
-                topic_filter = TBUtility.topic_to_regex(request.get("topicFilter"))
-                self.__attribute_requests_sub_topics[topic_filter] = request
+                self.__attribute_requests_sub_topics.add(request["topicFilter"], request)
         else:
             if result_code in result_codes:
                 self.__log.error("%s connection FAIL with error %s %s!", self.get_name(), result_code,
@@ -324,280 +362,283 @@ class MqttConnector(Connector, Thread):
             else:
                 self.__log.error("%s connection FAIL with unknown error!", self.get_name())
 
-    def _on_disconnect(self, *args):
-        self._connected = False
+    def __subscribe_mapping(self, client):
+        client_index = self._clients.index(client)
+        for number, mapping in enumerate(self.__mapping):
+            topic_filter = mapping["topicFilter"]
+            if not topic_filter.startswith(SHARED_SUBSCRIPTION_PREFIX):
+                if self.__shared_subscription_group:
+                    topic_filter = SHARED_SUBSCRIPTION_PREFIX + self.__shared_subscription_group + '/' + topic_filter
+                elif number % len(self._clients) != client_index:
+                    # Topic filter belongs to another client
+                    continue
+
+            self.__subscribe(topic_filter, mapping.get("subscriptionQos", 1), client)
+            self.__log.info('Connector "%s" subscribe to %s', self.get_name(), topic_filter)
+
+    def _on_disconnect(self, client, *args):
+        if client is self._client:
+            self._connected = False
         self.__log.debug('"%s" was disconnected. %s', self.get_name(), str(args))
 
     def _on_log(self, *args):
         self.__log.debug(args)
 
-    def _on_subscribe(self, _, __, mid, granted_qos, *args):
+    def _on_subscribe(self, client, _, mid, granted_qos, *args):
         log.info(args)
+        # Success or not, remove this topic from the list of pending subscription requests
+        topic = self.__subscribes_sent.pop((client, mid), None)
         try:
             if granted_qos[0] == 128:
                 self.__log.error('"%s" subscription failed to topic %s subscription message id = %i',
                                  self.get_name(),
-                                 self.__subscribes_sent.get(mid), mid)
+                                 topic, mid)
             else:
                 self.__log.info('"%s" subscription success to topic %s, subscription message id = %i',
                                 self.get_name(),
-                                self.__subscribes_sent.get(mid), mid)
+                                topic, mid)
         except Exception as e:
             self.__log.exception(e)
 
-        # Success or not, remove this topic from the list of pending subscription requests
-        if self.__subscribes_sent.get(mid) is not None:
-            del self.__subscribes_sent[mid]
-
-    # 将消息放置到队列等待转换
-    # -> bool 是函数返回值的建议布尔值类型，当然可以返回其他类型，但是这样做违反规范
+    # 转换消息并保存到存储介质里
     def put_data_to_convert(self, converter, message, content) -> bool:
-        if not self.__msg_queue.full():
-            self.__msg_queue.put((converter.convert, message.topic, content), True, 100)
-            return True
-        return False
+        started = monotonic()
+        converted_data = converter.convert(message.topic, content)
+        self.__record_latency(CONVERT_LATENCY_PARAMETER, started)
+        log.debug(converted_data)
+
+        started = monotonic()
+        self._save_converted_msg(message.topic, converted_data)
+        self.__record_latency(STORAGE_LATENCY_PARAMETER, started)
+        return True
 
     def _save_converted_msg(self, topic, data):
         self.__gateway.send_to_storage(self.name, data)
-        self.statistics['MessagesSent'] += 1
+        with self.__statistics_lock:
+            self.statistics['MessagesSent'] += 1
         self.__log.debug("Successfully converted message from topic %s", topic)
 
-    def __threads_manager(self):
-        if len(self.__workers_thread_pool) == 0:
-            # 执行连接器转换工作，从队列中取出消息保存到存储介质里
-            worker = MqttConnector.ConverterWorker("Main", self.__msg_queue, self._save_converted_msg)
-            # 放置到线程池中
-            self.__workers_thread_pool.append(worker)
-            worker.start()
-
-        # 处理伸缩线程池里面的线程数
-        number_of_needed_threads = round(self.__msg_queue.qsize() / self.__max_msg_number_for_worker, 0)
-        threads_count = len(self.__workers_thread_pool)
-        if number_of_needed_threads > threads_count < self.__max_number_of_workers:
-            thread = MqttConnector.ConverterWorker(
-                "Worker " + ''.join(random.choice(string.ascii_lowercase) for _ in range(5)), self.__msg_queue,
-                self._save_converted_msg)
-            self.__workers_thread_pool.append(thread)
-            thread.start()
-        elif number_of_needed_threads < threads_count and threads_count > 1:
-            worker: MqttConnector.ConverterWorker = self.__workers_thread_pool[-1]
-            if not worker.in_progress:
-                worker.stopped = True
-                self.__workers_thread_pool.remove(worker)
-
     def _on_message(self, client, userdata, message):
-        self._on_message_queue.put((client, userdata, message))
+        # Messages of one topic always go to the same worker, so their order is kept
+        queue = self._on_message_queues[hash(message.topic) % len(self._on_message_queues)]
+        queue.put((client, userdata, message, monotonic()))
 
-    def _process_on_message(self):
+    def _process_on_message(self, messages_queue):
         while not self.__stopped:
-            if not self._on_message_queue.empty():
-                client, userdata, message = self._on_message_queue.get()
-
-                self.statistics['MessagesReceived'] += 1
-                content = TBUtility.decode(message)
-
-                # Check if message topic exists in mappings "i.e., I'm posting telemetry/attributes" -------------------
-                # fullmatch完全匹配
-                topic_handlers = [regex for regex in self.__mapping_sub_topics if fullmatch(regex, message.topic)]
-
-                if topic_handlers:
-                    # Note: every topic may be associated to one or more converter.
-                    # This means that a single MQTT message
-                    # may produce more than one message towards ThingsBoard. This also means that I cannot return after
-                    # the first successful conversion: I got to use all the available ones.
-                    # I will use a flag to understand whether at least one converter succeeded
-                    request_handled = False
-
-                    for topic in topic_handlers:
-                        available_converters = self.__mapping_sub_topics[topic]
-                        for converter in available_converters:
-                            try:
-                                if isinstance(content, list):
-                                    for item in content:
-                                        request_handled = self.put_data_to_convert(converter, message, item)
-                                        if not request_handled:
-                                            self.__log.error(
-                                                'Cannot find converter for the topic:"%s"! Client: %s, User data: %s',
-                                                message.topic,
-                                                str(client),
-                                                str(userdata))
-                                else:
-                                    request_handled = self.put_data_to_convert(converter, message, content)
-
-                            except Exception as e:
-                                log.exception(e)
-
-                    if not request_handled:
-                        self.__log.error('Cannot find converter for the topic:"%s"! Client: %s, User data: %s',
-                                         message.topic,
-                                         str(client),
-                                         str(userdata))
-
-                    # Note: if I'm in this branch, this was for sure a telemetry/attribute push message
-                    # => Execution must end here both in case of failure and success
-                    continue
+            try:
+                client, userdata, message, received_time = messages_queue.get(timeout=MESSAGE_WAIT_TIMEOUT)
+            except Empty:
+                continue
+
+            self.__record_latency(QUEUE_LATENCY_PARAMETER, received_time)
+            self.statistics[QUEUE_DEPTH_PARAMETER] = sum(queue.qsize() for queue in self._on_message_queues)
+
+            started = monotonic()
+            try:
+                self.__process_message(client, userdata, message)
+            except Exception as e:
+                self.__log.exception(e)
+            self.__record_latency(PROCESSING_LATENCY_PARAMETER, started)
+
+    def __record_latency(self, parameter, started):
+        # Exponential moving average, cheap enough to be updated for every message
+        latency = (monotonic() - started) * 1000
+        with self.__statistics_lock:
+            self.statistics[parameter] += (latency - self.statistics[parameter]) * LATENCY_SMOOTHING
+
+    def __process_message(self, client, userdata, message):
+        with self.__statistics_lock:
+            self.statistics['MessagesReceived'] += 1
+        content = TBUtility.decode(message)
+
+        # Check if message topic exists in mappings "i.e., I'm posting telemetry/attributes" -------------------
+        available_converters = self.__mapping_sub_topics.match(message.topic)
+
+        if available_converters:
+            # Note: every topic may be associated to one or more converter.
+            # This means that a single MQTT message
+            # may produce more than one message towards ThingsBoard. This also means that I cannot return after
+            # the first successful conversion: I got to use all the available ones.
+            # I will use a flag to understand whether at least one converter succeeded
+            request_handled = False
+
+            for converter in available_converters:
+                try:
+                    if isinstance(content, list):
+                        for item in content:
+                            request_handled = self.put_data_to_convert(converter, message, item)
+                            if not request_handled:
+                                self.__log.error(
+                                    'Cannot find converter for the topic:"%s"! Client: %s, User data: %s',
+                                    message.topic,
+                                    str(client),
+                                    str(userdata))
+                    else:
+                        request_handled = self.put_data_to_convert(converter, message, content)
+
+                except Exception as e:
+                    log.exception(e)
+
+            if not request_handled:
+                self.__log.error('Cannot find converter for the topic:"%s"! Client: %s, User data: %s',
+                                 message.topic,
+                                 str(client),
+                                 str(userdata))
+
+            # Note: if I'm in this branch, this was for sure a telemetry/attribute push message
+            # => Execution must end here both in case of failure and success
+            return
 
-                # Check if message topic exists in connection handlers "i.e., I'm connecting a device" -----------------
-                topic_handlers = [regex for regex in self.__connect_requests_sub_topics if
-                                  fullmatch(regex, message.topic)]
-
-                if topic_handlers:
-                    for topic in topic_handlers:
-                        handler = self.__connect_requests_sub_topics[topic]
-
-                        found_device_name = None
-                        found_device_type = 'default'
-
-                        # Get device name, either from topic or from content
-                        if handler.get("deviceNameTopicExpression"):
-                            device_name_match = search(handler["deviceNameTopicExpression"], message.topic)
-                            if device_name_match is not None:
-                                found_device_name = device_name_match.group(0)
-                        elif handler.get("deviceNameJsonExpression"):
-                            found_device_name = TBUtility.get_value(handler["deviceNameJsonExpression"], content)
-
-                        # Get device type (if any), either from topic or from content
-                        if handler.get("deviceTypeTopicExpression"):
-                            device_type_match = search(handler["deviceTypeTopicExpression"], message.topic)
-                            found_device_type = device_type_match.group(0) if device_type_match is not None else \
-                            handler[
-                                "deviceTypeTopicExpression"]
-                        elif handler.get("deviceTypeJsonExpression"):
-                            found_device_type = TBUtility.get_value(handler["deviceTypeJsonExpression"], content)
-
-                        if found_device_name is None:
-                            self.__log.error("Device name missing from connection request")
-                            continue
-
-                        # Note: device must be added even if it is already known locally: else ThingsBoard
-                        # will not send RPCs and attribute updates
-                        self.__log.info("Connecting device %s of type %s", found_device_name, found_device_type)
-                        self.__gateway.add_device(found_device_name, {"connector": self}, device_type=found_device_type)
-
-                    # Note: if I'm in this branch, this was for sure a connection message
-                    # => Execution must end here both in case of failure and success
+        # Check if message topic exists in connection handlers "i.e., I'm connecting a device" -----------------
+        topic_handlers = self.__connect_requests_sub_topics.match(message.topic)
+
+        if topic_handlers:
+            for handler in topic_handlers:
+                found_device_name = None
+                found_device_type = 'default'
+
+                # Get device name, either from topic or from content
+                if handler.get("deviceNameTopicExpression"):
+                    device_name_match = search(handler["deviceNameTopicExpression"], message.topic)
+                    if device_name_match is not None:
+                        found_device_name = device_name_match.group(0)
+                elif handler.get("deviceNameJsonExpression"):
+                    found_device_name = TBUtility.get_value(handler["deviceNameJsonExpression"], content)
+
+                # Get device type (if any), either from topic or from content
+                if handler.get("deviceTypeTopicExpression"):
+                    device_type_match = search(handler["deviceTypeTopicExpression"], message.topic)
+                    found_device_type = device_type_match.group(0) if device_type_match is not None else \
+                    handler[
+                        "deviceTypeTopicExpression"]
+                elif handler.get("deviceTypeJsonExpression"):
+                    found_device_type = TBUtility.get_value(handler["deviceTypeJsonExpression"], content)
+
+                if found_device_name is None:
+                    self.__log.error("Device name missing from connection request")
                     continue
 
-                # Check if message topic exists in disconnection handlers "i.e., I'm disconnecting a device" -----------
-                topic_handlers = [regex for regex in self.__disconnect_requests_sub_topics if
-                                  fullmatch(regex, message.topic)]
-                if topic_handlers:
-                    for topic in topic_handlers:
-                        handler = self.__disconnect_requests_sub_topics[topic]
-
-                        found_device_name = None
-                        found_device_type = 'default'
-
-                        # Get device name, either from topic or from content
-                        if handler.get("deviceNameTopicExpression"):
-                            device_name_match = search(handler["deviceNameTopicExpression"], message.topic)
-                            if device_name_match is not None:
-                                found_device_name = device_name_match.group(0)
-                        elif handler.get("deviceNameJsonExpression"):
-                            found_device_name = TBUtility.get_value(handler["deviceNameJsonExpression"], content)
-
-                        # Get device type (if any), either from topic or from content
-                        if handler.get("deviceTypeTopicExpression"):
-                            device_type_match = search(handler["deviceTypeTopicExpression"], message.topic)
-                            if device_type_match is not None:
-                                found_device_type = device_type_match.group(0)
-                        elif handler.get("deviceTypeJsonExpression"):
-                            found_device_type = TBUtility.get_value(handler["deviceTypeJsonExpression"], content)
-
-                        if found_device_name is None:
-                            self.__log.error("Device name missing from disconnection request")
-                            continue
-
-                        if found_device_name in self.__gateway.get_devices():
-                            self.__log.info("Disconnecting device %s of type %s", found_device_name, found_device_type)
-                            self.__gateway.del_device(found_device_name)
-                        else:
-                            self.__log.info("Device %s was not connected", found_device_name)
+                # Note: device must be added even if it is already known locally: else ThingsBoard
+                # will not send RPCs and attribute updates
+                self.__log.info("Connecting device %s of type %s", found_device_name, found_device_type)
+                self.__gateway.add_device(found_device_name, {"connector": self}, device_type=found_device_type)
 
-                        break
+            # Note: if I'm in this branch, this was for sure a connection message
+            # => Execution must end here both in case of failure and success
+            return
 
-                    # Note: if I'm in this branch, this was for sure a disconnection message
-                    # => Execution must end here both in case of failure and success
+        # Check if message topic exists in disconnection handlers "i.e., I'm disconnecting a device" -----------
+        topic_handlers = self.__disconnect_requests_sub_topics.match(message.topic)
+        if topic_handlers:
+            for handler in topic_handlers:
+                found_device_name = None
+                found_device_type = 'default'
+
+                # Get device name, either from topic or from content
+                if handler.get("deviceNameTopicExpression"):
+                    device_name_match = search(handler["deviceNameTopicExpression"], message.topic)
+                    if device_name_match is not None:
+                        found_device_name = device_name_match.group(0)
+                elif handler.get("deviceNameJsonExpression"):
+                    found_device_name = TBUtility.get_value(handler["deviceNameJsonExpression"], content)
+
+                # Get device type (if any), either from topic or from content
+                if handler.get("deviceTypeTopicExpression"):
+                    device_type_match = search(handler["deviceTypeTopicExpression"], message.topic)
+                    if device_type_match is not None:
+                        found_device_type = device_type_match.group(0)
+                elif handler.get("deviceTypeJsonExpression"):
+                    found_device_type = TBUtility.get_value(handler["deviceTypeJsonExpression"], content)
+
+                if found_device_name is None:
+                    self.__log.error("Device name missing from disconnection request")
                     continue
 
-                # Check if message topic exists in attribute request handlers "i.e., I'm asking for a shared attribute"
-                topic_handlers = [regex for regex in self.__attribute_requests_sub_topics if
-                                  fullmatch(regex, message.topic)]
-                if topic_handlers:
-                    try:
-                        for topic in topic_handlers:
-                            handler = self.__attribute_requests_sub_topics[topic]
-
-                            found_device_name = None
-                            found_attribute_names = None
-
-                            # Get device name, either from topic or from content
-                            if handler.get("deviceNameTopicExpression"):
-                                device_name_match = search(handler["deviceNameTopicExpression"], message.topic)
-                                if device_name_match is not None:
-                                    found_device_name = device_name_match.group(0)
-                            elif handler.get("deviceNameJsonExpression"):
-                                found_device_name = TBUtility.get_value(handler["deviceNameJsonExpression"], content)
-
-                            # Get attribute name, either from topic or from content
-                            if handler.get("attributeNameTopicExpression"):
-                                attribute_name_match = search(handler["attributeNameTopicExpression"], message.topic)
-                                if attribute_name_match is not None:
-                                    found_attribute_names = attribute_name_match.group(0)
-                            elif handler.get("attributeNameJsonExpression"):
-                                """  filter函数 filter(function, iterable)
-                                    function -- 判断函数
-                                    iterable -- 可迭代对象(比如列表)
-                                    是将iterable的每一个元素放到function里判断，false则过滤掉
-                                  """
-                                found_attribute_names = list(filter(lambda x: x is not None,
-                                                                    TBUtility.get_values(
-                                                                        handler["attributeNameJsonExpression"],
-                                                                        content)))
-
-                            if found_device_name is None:
-                                self.__log.error("Device name missing from attribute request")
-                                continue
-
-                            if found_attribute_names is None:
-                                self.__log.error("Attribute name missing from attribute request")
-                                continue
-
-                            self.__log.info("Will retrieve attribute %s of %s", found_attribute_names,
-                                            found_device_name)
-                            self.__gateway.tb_client.client.gw_request_shared_attributes(
-                                found_device_name,
-                                found_attribute_names,
-                                # *args是可变参数
-                                lambda data, *args: self.notify_attribute(
-                                    data,
-                                    found_attribute_names,
-                                    handler.get("topicExpression"),
-                                    handler.get("valueExpression"),
-                                    handler.get('retain', False)))
+                if found_device_name in self.__gateway.get_devices():
+                    self.__log.info("Disconnecting device %s of type %s", found_device_name, found_device_type)
+                    self.__gateway.del_device(found_device_name)
+                else:
+                    self.__log.info("Device %s was not connected", found_device_name)
 
-                            break
+                break
 
-                    except Exception as e:
-                        log.exception(e)
+            # Note: if I'm in this branch, this was for sure a disconnection message
+            # => Execution must end here both in case of failure and success
+            return
 
-                    # Note: if I'm in this branch, this was for sure an attribute request message
-                    # => Execution must end here both in case of failure and success
-                    continue
+        # Check if message topic exists in attribute request handlers "i.e., I'm asking for a shared attribute"
+        topic_handlers = self.__attribute_requests_sub_topics.match(message.topic)
+        if topic_handlers:
+            try:
+                for handler in topic_handlers:
+                    found_device_name = None
+                    found_attribute_names = None
+
+                    # Get device name, either from topic or from content
+                    if handler.get("deviceNameTopicExpression"):
+                        device_name_match = search(handler["deviceNameTopicExpression"], message.topic)
+                        if device_name_match is not None:
+                            found_device_name = device_name_match.group(0)
+                    elif handler.get("deviceNameJsonExpression"):
+                        found_device_name = TBUtility.get_value(handler["deviceNameJsonExpression"], content)
+
+                    # Get attribute name, either from topic or from content
+                    if handler.get("attributeNameTopicExpression"):
+                        attribute_name_match = search(handler["attributeNameTopicExpression"], message.topic)
+                        if attribute_name_match is not None:
+                            found_attribute_names = attribute_name_match.group(0)
+                    elif handler.get("attributeNameJsonExpression"):
+                        """  filter函数 filter(function, iterable)
+                            function -- 判断函数
+                            iterable -- 可迭代对象(比如列表)
+                            是将iterable的每一个元素放到function里判断，false则过滤掉
+                          """
+                        found_attribute_names = list(filter(lambda x: x is not None,
+                                                            TBUtility.get_values(
+                                                                handler["attributeNameJsonExpression"],
+                                                                content)))
+
+                    if found_device_name is None:
+                        self.__log.error("Device name missing from attribute request")
+                        continue
 
-                # Check if message topic exists in RPC handlers --------------------------------------------------------
-                # The gateway is expecting for this message => no wildcards here, the topic must be evaluated as is
+                    if found_attribute_names is None:
+                        self.__log.error("Attribute name missing from attribute request")
+                        continue
 
-                if self.__gateway.is_rpc_in_progress(message.topic):
-                    log.info("RPC response arrived. Forwarding it to thingsboard.")
-                    self.__gateway.rpc_with_reply_processing(message.topic, content)
-                    continue
+                    self.__log.info("Will retrieve attribute %s of %s", found_attribute_names,
+                                    found_device_name)
+                    self.__gateway.tb_client.client.gw_request_shared_attributes(
+                        found_device_name,
+                        found_attribute_names,
+                        # *args是可变参数
+                        lambda data, *args: self.notify_attribute(
+                            data,
+                            found_attribute_names,
+                            handler.get("topicExpression"),
+                            handler.get("valueExpression"),
+                            handler.get('retain', False)))
+
+                    break
 
-                self.__log.debug("Received message to topic \"%s\" with unknown interpreter data: \n\n\"%s\"",
-                                 message.topic,
-                                 content)
+            except Exception as e:
+                log.exception(e)
 
-            sleep(.2)
+            # Note: if I'm in this branch, this was for sure an attribute request message
+            # => Execution must end here both in case of failure and success
+            return
+
+        # Check if message topic exists in RPC handlers --------------------------------------------------------
+        # The gateway is expecting for this message => no wildcards here, the topic must be evaluated as is
+
+        if self.__gateway.is_rpc_in_progress(message.topic):
+            log.info("RPC response arrived. Forwarding it to thingsboard.")
+            self.__gateway.rpc_with_reply_processing(message.topic, content)
+            return
+
+        self.__log.debug("Received message to topic \"%s\" with unknown interpreter data: \n\n\"%s\"",
+                         message.topic,
+                         content)
 
     def notify_attribute(self, incoming_data, attribute_name, topic_expression, value_expression, retain):
         if incoming_data.get("device") is None or incoming_data.get("value", incoming_data.get('values')) is None:
@@ -748,27 +789,3 @@ class MqttConnector(Connector, Thread):
     def rpc_cancel_processing(self, topic):
         log.info("RPC canceled or terminated. Unsubscribing from %s", topic)
         self._client.unsubscribe(topic)
-
-    # 转换工作线程
-    class ConverterWorker(Thread):
-        def __init__(self, name, incoming_queue, send_result):
-            super().__init__()
-            self.stopped = False
-            self.setName(name)
-            self.setDaemon(True)
-            self.__msg_queue = incoming_queue# 转换消息队列
-            self.in_progress = False
-            self.__send_result = send_result
-
-        def run(self):
-            while not self.stopped:
-                if not self.__msg_queue.empty():
-                    self.in_progress = True
-                    # 从队列取出元组进行解包，再执行convert_function
-                    convert_function, config, incoming_data = self.__msg_queue.get(True, 100)
-                    converted_data = convert_function(config, incoming_data)
-                    log.debug(converted_data)
-                    self.__send_result(config, converted_data)
-                    self.in_progress = False
-                else:
-                    sleep(.2)
@@ -0,0 +1,142 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from re import compile as compile_regex
+
+from thingsboard_gateway.tb_utility.tb_utility import TBUtility
+
+SINGLE_LEVEL_WILDCARD = '+'
+MULTI_LEVEL_WILDCARD = '#'
+SHARED_SUBSCRIPTION_PREFIX = '$share/'
+# Characters that can't be part of a plain MQTT topic filter, but were accepted in "topicFilter"
+# because filters used to be matched as regular expressions
+REGEX_CHARACTERS = set('*?[](){}|\\^')
+
+
+def strip_shared_subscription(topic_filter):
+    """Returns the filter without the "$share/<group>/" prefix, messages are published to the plain topic."""
+    if topic_filter.startswith(SHARED_SUBSCRIPTION_PREFIX):
+        return topic_filter.split('/', 2)[2]
+    return topic_filter
+
+
+class TopicTrie:
+    """
+    Matches topics against MQTT topic filters with "+" and "#" wildcards.
+    Lookup cost depends on the number of topic levels instead of the number of registered filters.
+    """
+
+    class Node:
+        __slots__ = ('children', 'handlers')
+
+        def __init__(self):
+            self.children = {}
+            self.handlers = []
+
+    def __init__(self):
+        self.__root = TopicTrie.Node()
+        self.__regex_handlers = []
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def clear(self):
+        self.__root = TopicTrie.Node()
+        self.__regex_handlers = []
+        self.__count = 0
+
+    def add(self, topic_filter, handler):
+        topic_filter = strip_shared_subscription(topic_filter)
+        if REGEX_CHARACTERS.intersection(topic_filter):
+            self.__regex_handlers.append((compile_regex(TBUtility.topic_to_regex(topic_filter)), handler))
+        else:
+            node = self.__root
+            for level in topic_filter.split('/'):
+                node = node.children.setdefault(level, TopicTrie.Node())
+            node.handlers.append(handler)
+        self.__count += 1
+
+    def remove(self, topic_filter, handler=None):
+        topic_filter = strip_shared_subscription(topic_filter)
+        if REGEX_CHARACTERS.intersection(topic_filter):
+            regex = TBUtility.topic_to_regex(topic_filter)
+            kept = [item for item in self.__regex_handlers
+                    if item[0].pattern != regex or (handler is not None and item[1] is not handler)]
+            self.__count -= len(self.__regex_handlers) - len(kept)
+            self.__regex_handlers = kept
+            return
+
+        path = [self.__root]
+        levels = topic_filter.split('/')
+        for level in levels:
+            node = path[-1].children.get(level)
+            if node is None:
+                return
+            path.append(node)
+
+        node = path[-1]
+        removed = len(node.handlers)
+        node.handlers = [] if handler is None else [item for item in node.handlers if item is not handler]
+        self.__count -= removed - len(node.handlers)
+
+        # Prune empty branches
+        for level, parent, child in zip(reversed(levels), reversed(path[:-1]), reversed(path[1:])):
+            if child.handlers or child.children:
+                break
+            del parent.children[level]
+
+    def match(self, topic):
+        """Returns the handlers of all filters that match the topic, a handler is returned once per matching filter."""
+        result = []
+        nodes = [self.__root]
+        levels = topic.split('/')
+        # Wildcards at the first level don't match topics that start with "$"
+        system_topic = topic.startswith('$')
+
+        for index, level in enumerate(levels):
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if not children:
+                    continue
+
+                if not (index == 0 and system_topic):
+                    multi_level = children.get(MULTI_LEVEL_WILDCARD)
+                    if multi_level is not None:
+                        result.extend(multi_level.handlers)
+                    single_level = children.get(SINGLE_LEVEL_WILDCARD)
+                    if single_level is not None:
+                        next_nodes.append(single_level)
+
+                child = children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+
+            nodes = next_nodes
+            if not nodes:
+                break
+
+        for node in nodes:
+            result.extend(node.handlers)
+            # "sensor/#" also matches the parent level "sensor"
+            multi_level = node.children.get(MULTI_LEVEL_WILDCARD)
+            if multi_level is not None:
+                result.extend(multi_level.handlers)
+
+        for regex, handler in self.__regex_handlers:
+            if regex.fullmatch(topic):
+                result.append(handler)
+
+        return result
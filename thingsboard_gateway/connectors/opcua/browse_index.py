@@ -0,0 +1,160 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from threading import Lock
+from time import monotonic
+
+from opcua import Node, ua
+
+PATH_SEPARATOR = '\\.'
+DEFAULT_TTL = 600
+DEFAULT_BATCH_SIZE = 1000
+MAX_PATH_LENGTH = 200000
+
+# Verbs of ModelChangeStructureDataType
+NODE_ADDED = 1
+NODE_DELETED = 2
+
+
+class BrowseIndex:
+    """
+    In-memory index of the server address space: browse path, node class and hierarchical children of every node
+    that has been browsed. Children of many nodes are browsed with one Browse request, so searching a level of the
+    tree costs one round trip. Children lists expire after ttl seconds and are dropped for the nodes affected by
+    a model change, both are browsed again on the next search.
+    """
+
+    def __init__(self, client, ttl=DEFAULT_TTL, batch_size=DEFAULT_BATCH_SIZE):
+        self.client = client
+        self.__ttl = ttl
+        self.__batch_size = max(int(batch_size), 1)
+        self.__paths = {}
+        self.__node_classes = {}
+        self.__parents = {}
+        self.__children = {}
+        self.__lock = Lock()
+        self.browse_requests = 0
+
+    def __len__(self):
+        return len(self.__paths)
+
+    def clear(self):
+        with self.__lock:
+            self.__paths.clear()
+            self.__node_classes.clear()
+            self.__parents.clear()
+            self.__children.clear()
+
+    def get_path(self, node: Node):
+        """Browse names from the root node to the node joined with '\\.'."""
+        path = self.__paths.get(node.nodeid)
+        if path is None:
+            path = PATH_SEPARATOR.join(path_node.get_browse_name().Name
+                                       for path_node in node.get_path(MAX_PATH_LENGTH))
+            with self.__lock:
+                path = self.__paths.setdefault(node.nodeid, path)
+        return path
+
+    def get_children(self, nodes):
+        """Returns children of every node as a list of (node, path, node class), browsing the expired ones."""
+        now = monotonic()
+        with self.__lock:
+            expired = [node for node in nodes
+                       if node.nodeid not in self.__children or now - self.__children[node.nodeid][0] > self.__ttl]
+        for offset in range(0, len(expired), self.__batch_size):
+            self.__browse(expired[offset:offset + self.__batch_size], now)
+
+        result = {}
+        # Model changes are applied from the subscription thread, children deleted meanwhile are skipped
+        with self.__lock:
+            for node in nodes:
+                _, children_ids = self.__children.get(node.nodeid, (None, ()))
+                children = result[node] = []
+                for child_id in children_ids:
+                    path = self.__paths.get(child_id)
+                    node_class = self.__node_classes.get(child_id)
+                    if path is not None and node_class is not None:
+                        children.append((Node(self.client.uaclient, child_id), path, node_class))
+        return result
+
+    def apply_model_changes(self, changes):
+        """
+        Drops the children of the nodes affected by ModelChangeStructureDataType changes and of their parents.
+        None means the server has not told what changed, the whole index is dropped.
+        """
+        if changes is None:
+            self.clear()
+            return
+
+        with self.__lock:
+            for change in changes:
+                node_id = change.Affected
+                if node_id not in self.__paths and change.Verb & NODE_ADDED:
+                    # The parent of a new node is unknown
+                    self.__children.clear()
+                    return
+                self.__children.pop(node_id, None)
+                parent_id = self.__parents.get(node_id)
+                if parent_id is not None:
+                    self.__children.pop(parent_id, None)
+                if change.Verb & NODE_DELETED:
+                    self.__paths.pop(node_id, None)
+                    self.__node_classes.pop(node_id, None)
+                    self.__parents.pop(node_id, None)
+
+    def __browse(self, nodes, browse_time):
+        parents_paths = [self.get_path(node) for node in nodes]
+        params = ua.BrowseParameters()
+        params.View.Timestamp = ua.get_win_epoch()
+        params.RequestedMaxReferencesPerNode = 0
+        for node in nodes:
+            description = ua.BrowseDescription()
+            description.NodeId = node.nodeid
+            description.BrowseDirection = ua.BrowseDirection.Forward
+            description.ReferenceTypeId = ua.NodeId(ua.ObjectIds.HierarchicalReferences)
+            description.IncludeSubtypes = True
+            description.NodeClassMask = ua.NodeClass.Unspecified
+            description.ResultMask = ua.BrowseResultMask.All
+            params.NodesToBrowse.append(description)
+
+        results = self.client.uaclient.browse(params)
+        self.browse_requests += 1
+        references = [result.References for result in results]
+        continuation_points = {number: result.ContinuationPoint for number, result in enumerate(results)
+                               if result.ContinuationPoint}
+        while continuation_points:
+            next_params = ua.BrowseNextParameters()
+            next_params.ContinuationPoints = list(continuation_points.values())
+            next_params.ReleaseContinuationPoints = False
+            next_results = self.client.uaclient.browse_next(next_params)
+            self.browse_requests += 1
+            for number, result in zip(list(continuation_points), next_results):
+                references[number].extend(result.References)
+                if result.ContinuationPoint:
+                    continuation_points[number] = result.ContinuationPoint
+                else:
+                    del continuation_points[number]
+
+        with self.__lock:
+            for node, parent_path, node_references in zip(nodes, parents_paths, references):
+                children_ids = []
+                for reference in node_references:
+                    child_id = reference.NodeId
+                    # A node that can be reached from several parents keeps its first path
+                    if child_id not in self.__paths:
+                        self.__paths[child_id] = parent_path + PATH_SEPARATOR + reference.BrowseName.Name
+                        self.__parents[child_id] = node.nodeid
+                    self.__node_classes[child_id] = reference.NodeClass
+                    children_ids.append(child_id)
+                self.__children[node.nodeid] = (browse_time, children_ids)
@@ -0,0 +1,96 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from threading import Lock
+from time import monotonic, time
+
+
+class CoalescingBuffer:
+    """
+    Collects converted data of the devices between flushes. Attributes and telemetry keep the latest value of every
+    key, with keep_history telemetry keeps every sample instead: samples without a timestamp are stamped when they
+    are appended. flush returns one message per device when window seconds have passed since the previous flush.
+    """
+
+    def __init__(self, window=0, keep_history=False):
+        self.__window = window
+        self.__keep_history = keep_history
+        self.__devices = {}
+        self.__lock = Lock()
+        self.__last_flush = monotonic()
+
+    def __len__(self):
+        return len(self.__devices)
+
+    def append(self, converted_data):
+        if not converted_data:
+            return
+
+        with self.__lock:
+            device = self.__devices.get(converted_data['deviceName'])
+            if device is None:
+                device = self.__devices[converted_data['deviceName']] = {
+                    'deviceType': converted_data.get('deviceType'),
+                    'attributes': {},
+                    'telemetry': {},
+                    # (ts, values) with keep_history, otherwise key -> (ts, value)
+                    'samples': [] if self.__keep_history else {},
+                    'last_stamp': 0
+                }
+
+            for attribute in converted_data.get('attributes', ()):
+                device['attributes'].update(attribute)
+            for item in converted_data.get('telemetry', ()):
+                if item.get('ts') is None and self.__keep_history:
+                    # Stamps of one device are at least a millisecond apart, samples with the same ts would merge
+                    device['last_stamp'] = max(int(time() * 1000), device['last_stamp'] + 1)
+                    device['samples'].append((device['last_stamp'], item))
+                elif item.get('ts') is None:
+                    device['telemetry'].update(item)
+                elif self.__keep_history:
+                    device['samples'].append((item['ts'], item['values']))
+                else:
+                    for key, value in item['values'].items():
+                        device['samples'][key] = (item['ts'], value)
+
+    def flush(self, force=False):
+        if not self.__devices or (not force and monotonic() - self.__last_flush < self.__window):
+            return []
+
+        with self.__lock:
+            devices, self.__devices = self.__devices, {}
+        self.__last_flush = monotonic()
+        return [self.__to_message(device_name, device) for device_name, device in devices.items()]
+
+    def __to_message(self, device_name, device):
+        samples = {}
+        if self.__keep_history:
+            for ts, values in device['samples']:
+                samples.setdefault(ts, {}).update(values)
+        else:
+            for key, (ts, value) in device['samples'].items():
+                samples.setdefault(ts, {})[key] = value
+
+        telemetry = [{'ts': ts, 'values': values} for ts, values in samples.items()]
+        if device['telemetry']:
+            # The gateway drops telemetry without a timestamp from a message that has timestamps
+            if telemetry:
+                telemetry.append({'ts': int(time() * 1000), 'values': device['telemetry']})
+            else:
+                telemetry.append(device['telemetry'])
+
+        return {'deviceName': device_name,
+                'deviceType': device['deviceType'],
+                'attributes': [device['attributes']] if device['attributes'] else [],
+                'telemetry': telemetry}
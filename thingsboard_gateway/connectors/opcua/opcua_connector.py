@@ -16,10 +16,10 @@ import re
 import time
 from concurrent.futures import CancelledError, TimeoutError as FuturesTimeoutError
 from copy import deepcopy
+from functools import lru_cache
 from random import choice
 from string import ascii_lowercase
 from threading import Thread
-from cachetools import cached, TTLCache
 
 import regex
 from simplejson import dumps
@@ -42,8 +42,19 @@ except ImportError:
     from opcua.crypto import uacrypto
 
 from thingsboard_gateway.connectors.connector import Connector, log
+from thingsboard_gateway.connectors.opcua.browse_index import BrowseIndex
+from thingsboard_gateway.connectors.opcua.coalescing_buffer import CoalescingBuffer
 from thingsboard_gateway.connectors.opcua.opcua_uplink_converter import OpcUaUplinkConverter
 
+NODE_ID_PATTERN = regex.compile(r"ns=\d*;[isgb]=.*", regex.IGNORECASE)
+ROOT_PATH_PATTERN = re.compile(r"^root")
+MODEL_CHANGE_EVENT_TYPES = [ua.ObjectIds.BaseModelChangeEventType, ua.ObjectIds.GeneralModelChangeEventType]
+
+
+@lru_cache(maxsize=1024)
+def compile_path_pattern(path):
+    return regex.compile(path)
+
 
 class OpcUaConnector(Thread, Connector):
     def __init__(self, gateway, config, connector_type):
@@ -57,6 +68,8 @@ class OpcUaConnector(Thread, Connector):
         self.__available_object_resources = {}
         self.__show_map = self.__server_conf.get("showMap", False)
         self.__previous_scan_time = 0
+        self.__scan_requested = False
+        self.__browse_index = None
         for mapping in self.__server_conf["mapping"]:
             if mapping.get("deviceNodePattern") is not None:
                 self.__interest_nodes.append({mapping["deviceNodePattern"]: mapping})
@@ -73,7 +86,8 @@ class OpcUaConnector(Thread, Connector):
 
         self.setName(self.__server_conf.get("name", 'OPC-UA ' + ''.join(choice(ascii_lowercase) for _ in range(5))) + " Connector")
         self.__sub_handler = SubHandler(self)
-        self.data_to_send = []
+        self.data_to_send = CoalescingBuffer(window=self.__server_conf.get("coalescingWindowInMillis", 0) / 1000,
+                                             keep_history=self.__server_conf.get("keepHistory", True))
         self.__stopped = False
         self.daemon = True
 
@@ -109,6 +123,9 @@ class OpcUaConnector(Thread, Connector):
         self._subscribed = {}
         self.__sub = None
         self.__connected = False
+        self.__browse_index = BrowseIndex(self.client,
+                                          ttl=self.__server_conf.get("browseCacheTTLInMillis", 600000) / 1000,
+                                          batch_size=self.__server_conf.get("browseBatchSize", 1000))
 
     def __connect(self):
         self.__create_client()
@@ -128,6 +145,7 @@ class OpcUaConnector(Thread, Connector):
 
                 if not self.__server_conf.get("disableSubscriptions", False):
                     self.__sub = self.client.create_subscription(self.__server_conf.get("subCheckPeriodInMillis", 500), self.__sub_handler)
+                    self.__subscribe_model_changes()
 
                 self.__connected = True
                 log.info("OPC-UA connector %s connected to server %s", self.get_name(), self.__server_conf.get("url"))
@@ -154,13 +172,15 @@ class OpcUaConnector(Thread, Connector):
                             "scanPeriodInMillis", 60000):
                         self.scan_nodes_from_config()
                         self.__previous_scan_time = time.time() * 1000
+                    elif self.__scan_requested:
+                        self.__scan_requested = False
+                        self.scan_nodes_from_config()
                     # giusguerrini, 2020-09-24: Fix: flush event set and send all data to platform,
                     # so data_to_send doesn't grow indefinitely in case of more than one value change
                     # per cycle, and platform doesn't lose events.
-                    # NOTE: possible performance improvement: use a map to store only one event per
-                    # variable to reduce frequency of messages to platform.
-                    while self.data_to_send:
-                        self.__gateway.send_to_storage(self.get_name(), self.data_to_send.pop())
+                    # Changes of a variable within the coalescing window are sent as one message per device.
+                    for data in self.data_to_send.flush():
+                        self.__gateway.send_to_storage(self.get_name(), data)
                 if self.__stopped:
                     self.close()
                     break
@@ -176,6 +196,12 @@ class OpcUaConnector(Thread, Connector):
 
                 time.sleep(10)
 
+    def __subscribe_model_changes(self):
+        try:
+            self.__sub.subscribe_events(evtypes=MODEL_CHANGE_EVENT_TYPES)
+        except Exception as e:
+            log.debug("Model change events are not available, browse cache is refreshed by TTL only: %s", e)
+
     def __set_auth_settings_by_cert(self):
         try:
             ca_cert = self.__server_conf["identity"].get("caCert")
@@ -227,11 +253,21 @@ class OpcUaConnector(Thread, Connector):
             except:
                 pass
         self.__connected = False
+        for data in self.data_to_send.flush(force=True):
+            self.__gateway.send_to_storage(self.get_name(), data)
         log.info('%s has been stopped.', self.get_name())
 
     def get_name(self):
         return self.name
 
+    @property
+    def browse_index(self):
+        return self.__browse_index
+
+    def request_scan(self):
+        # The server must not be called from the subscription handler, nodes are scanned in the connector thread
+        self.__scan_requested = True
+
     @StatisticsService.CollectAllReceivedBytesStatistics(start_stat_type='allReceivedBytesFromTB')
     def on_attributes_update(self, content):
         log.debug(content)
@@ -409,6 +445,7 @@ class OpcUaConnector(Thread, Connector):
                         else:
                             converter = device_info["uplink_converter"]
 
+                        new_node = information_node not in self.subscribed
                         self.subscribed[information_node] = {"converter": converter,
                                                              "path": information_path,
                                                              "config_path": config_path}
@@ -436,7 +473,7 @@ class OpcUaConnector(Thread, Connector):
                         self.statistics['MessagesSent'] = self.statistics['MessagesSent'] + 1
                         log.debug("Data to ThingsBoard: %s", converted_data)
 
-                        if not self.__server_conf.get("disableSubscriptions", False):
+                        if not self.__server_conf.get("disableSubscriptions", False) and new_node:
                             sub_nodes.append(information_node)
                     else:
                         log.error("Node for %s \"%s\" with path %s - NOT FOUND!", information_type, information_key, information_path)
@@ -560,15 +597,14 @@ class OpcUaConnector(Thread, Connector):
                 log.error("Device node not found with expression: %s", TBUtility.get_value(device["deviceNodePattern"], get_tag=True))
         return result
 
-    @cached(cache=TTLCache(maxsize=1000, ttl=10 * 60))
     def get_node_path(self, node: Node):
-        return '\\.'.join(node.get_browse_name().Name for node in node.get_path(200000))
+        return self.__browse_index.get_path(node)
 
     def __search_node(self, current_node, fullpath, search_method=False, result=None):
         if result is None:
             result = []
         try:
-            if regex.match(r"ns=\d*;[isgb]=.*", fullpath, regex.IGNORECASE):
+            if NODE_ID_PATTERN.match(fullpath):
                 if self.__show_map:
                     log.debug("Looking for node with config")
                 node = self.client.get_node(fullpath)
@@ -578,58 +614,41 @@ class OpcUaConnector(Thread, Connector):
                     log.debug("Found in %s", node)
                     result.append(node)
             else:
-                fullpath_pattern = regex.compile(fullpath)
+                fullpath_pattern = compile_path_pattern(fullpath)
                 full1 = fullpath.replace('\\\\.', '.')
-                # current_node_path = '\\.'.join(char.split(":")[1] for char in current_node.get_path(200000, True))
-                current_node_path = self.get_node_path(current_node)
-                # we are allways the parent
-                child_node_parent_class = current_node.get_node_class()
-                new_parent = current_node
-                for child_node in current_node.get_children():
-                    new_node_class = child_node.get_node_class()
-                    # this will not change you can do it outside th loop
-                    # basis Description of node.get_parent() function, sometime child_node.get_parent() return None
-                    # new_parent = child_node.get_parent()
-                    # if (new_parent is None):
-                    #    child_node_parent_class = current_node.get_node_class()
-                    # else:
-                    #    child_node_parent_class = child_node.get_parent().get_node_class()
-                    # current_node_path = '\\.'.join(char.split(":")[1] for char in current_node.get_path(200000, True))
-                    # new_node_path = '\\\\.'.join(char.split(":")[1] for char in child_node.get_path(200000, True))
-                    new_node_path = self.get_node_path(child_node)
-                    if child_node_parent_class == ua.NodeClass.View and new_parent is not None:
-                        parent_path = self.get_node_path(new_parent)
-                        # parent_path = '\\.'.join(char.split(":")[1] for char in new_parent.get_path(200000, True))
-                        fullpath = fullpath.replace(current_node_path, parent_path)
-                    nnp1 = new_node_path.replace('\\\\.', '.')
-                    nnp2 = new_node_path.replace('\\\\', '\\')
-                    if self.__show_map:
-                        log.debug("SHOW MAP: Current node path: %s", new_node_path)
-                    regex_fullmatch = regex.fullmatch(fullpath_pattern, nnp1) or \
-                                      nnp2 == full1 or \
-                                      nnp2 == fullpath or \
-                                      nnp1 == full1
-                    if regex_fullmatch:
-                        if self.__show_map:
-                            log.debug("SHOW MAP: Current node path: %s - NODE FOUND", nnp2)
-                        result.append(child_node)
-                    else:
-                        regex_search = fullpath_pattern.fullmatch(nnp1, partial=True) or \
-                                       nnp2 in full1 or \
-                                       nnp1 in full1
-                        if regex_search:
+                # The tree is searched level by level, children of all nodes of a level are browsed at once
+                level = [current_node]
+                while level:
+                    next_level = []
+                    for children in self.__browse_index.get_children(level).values():
+                        for child_node, new_node_path, new_node_class in children:
+                            nnp1 = new_node_path.replace('\\\\.', '.')
+                            nnp2 = new_node_path.replace('\\\\', '\\')
                             if self.__show_map:
-                                log.debug("SHOW MAP: Current node path: %s - NODE FOUND", new_node_path)
-                            if new_node_class == ua.NodeClass.Object:
+                                log.debug("SHOW MAP: Current node path: %s", new_node_path)
+                            regex_fullmatch = fullpath_pattern.fullmatch(nnp1) or \
+                                              nnp2 == full1 or \
+                                              nnp2 == fullpath or \
+                                              nnp1 == full1
+                            if regex_fullmatch:
                                 if self.__show_map:
-                                    log.debug("SHOW MAP: Search in %s", new_node_path)
-                                self.__search_node(child_node, fullpath, result=result)
-                            # elif new_node_class == ua.NodeClass.Variable:
-                            #     log.debug("Found in %s", new_node_path)
-                            #     result.append(child_node)
-                            elif new_node_class == ua.NodeClass.Method and search_method:
-                                log.debug("Found in %s", new_node_path)
+                                    log.debug("SHOW MAP: Current node path: %s - NODE FOUND", nnp2)
                                 result.append(child_node)
+                            else:
+                                regex_search = fullpath_pattern.fullmatch(nnp1, partial=True) or \
+                                               nnp2 in full1 or \
+                                               nnp1 in full1
+                                if regex_search:
+                                    if self.__show_map:
+                                        log.debug("SHOW MAP: Current node path: %s - NODE FOUND", new_node_path)
+                                    if new_node_class == ua.NodeClass.Object:
+                                        if self.__show_map:
+                                            log.debug("SHOW MAP: Search in %s", new_node_path)
+                                        next_level.append(child_node)
+                                    elif new_node_class == ua.NodeClass.Method and search_method:
+                                        log.debug("Found in %s", new_node_path)
+                                        result.append(child_node)
+                    level = next_level
         except CancelledError:
             log.error("Request during search has been canceled by the OPC-UA server.")
         except BrokenPipeError:
@@ -640,9 +659,9 @@ class OpcUaConnector(Thread, Connector):
             log.exception(e)
 
     def _check_path(self, config_path, node):
-        if regex.match(r"ns=\d*;[isgb]=.*", config_path, regex.IGNORECASE):
+        if NODE_ID_PATTERN.match(config_path):
             return config_path
-        if re.search(r"^root", config_path.lower()) is None:
+        if ROOT_PATH_PATTERN.search(config_path.lower()) is None:
             node_path = self.get_node_path(node)
             # node_path = '\\\\.'.join(char.split(":")[1] for char in node.get_path(200000, True))
             if config_path[-3:] != '\\.':
@@ -674,12 +693,15 @@ class SubHandler(object):
             self.connector.statistics['MessagesSent'] = self.connector.statistics['MessagesSent'] + 1
             log.debug("[SUBSCRIPTION] Data to ThingsBoard: %s", converted_data)
         except KeyError:
-            self.connector.scan_nodes_from_config()
+            self.connector.request_scan()
         except Exception as e:
             log.exception(e)
 
     def event_notification(self, event):
         try:
             log.debug("Python: New event %s", event)
+            # Only model change events are subscribed to, BaseModelChangeEventType has no Changes
+            self.connector.browse_index.apply_model_changes(getattr(event, 'Changes', None))
+            self.connector.request_scan()
         except Exception as e:
             log.exception(e)
@@ -38,7 +38,7 @@ class Device:
                         child = re.search(r"(ns=\d*;[isgb]=.*\d)", node_config['path'])
                         self.values[section].append({'path': child.groups()[0], 'key': node_config['key']})
                     elif re.search(r"\${([A-Za-z.:\d]*)}", node_config['path']):
-                        child = re.search(r"(ns=\d*;[isgb]=.*\d)", node_config['path'])
+                        child = re.search(r"\${([A-Za-z.:\d]*)}", node_config['path'])
                         self.values[section].append(
                             {'path': self.path + child.groups()[0].split('.'), 'key': node_config['key']})
 
@@ -14,11 +14,12 @@
 
 import asyncio
 import re
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from random import choice
 from string import ascii_lowercase
 from threading import Thread
-from time import sleep, time
-from queue import Queue
+from time import time
+from queue import Empty, Queue
 
 from thingsboard_gateway.connectors.connector import Connector, log
 from thingsboard_gateway.connectors.opcua_asyncio.device import Device
@@ -32,10 +33,14 @@ except ImportError:
     TBUtility.install_package("asyncua")
     import asyncua
 
+from asyncua import ua
 from asyncua.crypto.security_policies import SecurityPolicyBasic256Sha256, SecurityPolicyBasic256, \
     SecurityPolicyBasic128Rsa15
 
 DEFAULT_UPLINK_CONVERTER = 'OpcUaUplinkConverter'
+DEFAULT_MAX_NODES_PER_REQUEST = 1000
+DEFAULT_SUB_CHECK_PERIOD = 500
+MAX_NOTIFICATIONS_PER_BATCH = 10000
 
 SECURITY_POLICIES = {
     "Basic128Rsa15": SecurityPolicyBasic128Rsa15,
@@ -43,6 +48,23 @@ SECURITY_POLICIES = {
     "Basic256Sha256": SecurityPolicyBasic256Sha256,
 }
 
+INTEGER_VARIANT_TYPES = (ua.VariantType.SByte, ua.VariantType.Byte, ua.VariantType.Int16, ua.VariantType.UInt16,
+                         ua.VariantType.Int32, ua.VariantType.UInt32, ua.VariantType.Int64, ua.VariantType.UInt64)
+FLOAT_VARIANT_TYPES = (ua.VariantType.Float, ua.VariantType.Double)
+
+
+def cast_value(value, variant_type):
+    """Values from ThingsBoard (RPC params are strings) are cast to the type of the variable they are written to."""
+    if variant_type in INTEGER_VARIANT_TYPES:
+        return int(value)
+    if variant_type in FLOAT_VARIANT_TYPES:
+        return float(value)
+    if variant_type == ua.VariantType.Boolean and isinstance(value, str):
+        return value.lower() in ('true', '1')
+    if variant_type == ua.VariantType.String:
+        return str(value)
+    return value
+
 
 class OpcUaConnectorAsyncIO(Connector, Thread):
     DATA_TO_SEND = Queue(-1)
@@ -74,8 +96,18 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
         self.daemon = True
 
         self.__validated_nodes = []
-        self.__subscriptions = []
+        self.__subscriptions = {}
+        # NodeId of a subscribed node -> [(device, section, key)]
+        self.__subscribed_nodes = {}
         self.__last_poll = 0
+        self.__max_nodes_per_request = self.__server_conf.get('maxNodesPerRequest', DEFAULT_MAX_NODES_PER_REQUEST)
+        self.__downlink_timeout = self.__server_conf.get('timeoutInMillis', 4000) / 1000
+
+        # Resolved nodes of the downlink: path -> Node, (device name, attribute) -> [Node], NodeId -> VariantType
+        self.__downlink_nodes = {}
+        self.__attribute_update_nodes = {}
+        self.__variant_types = {}
+        self.__writes = None
 
     def open(self):
         self.__stopped = False
@@ -83,24 +115,33 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
         log.info("Starting OPC-UA Connector (Async IO)")
 
     def close(self):
-        task = self.__loop.create_task(self.__close_subscriptions())
-
-        while not task.done():
-            sleep(.2)
+        if self.__connected:
+            try:
+                self.__run_coroutine(self.__close_subscriptions())
+            except Exception as e:
+                self.__log.exception(e)
 
         self.__stopped = True
         self.__connected = False
         self.__log.info('%s has been stopped.', self.get_name())
 
     async def __close_subscriptions(self):
-        for subscription in self.__subscriptions:
-            sub, handle = subscription
-            await sub.unsubscribe(handle)
+        # Monitored items are deleted with their subscription
+        for sub in self.__subscriptions.values():
             await sub.delete()
 
     def get_name(self):
         return self.name
 
+    def __run_coroutine(self, coroutine):
+        """Runs the coroutine on the connector loop from another thread and waits for its result."""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.__loop)
+        try:
+            return future.result(self.__downlink_timeout)
+        except FuturesTimeoutError:
+            future.cancel()
+            raise
+
     def is_connected(self):
         return self.__connected
 
@@ -125,6 +166,8 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
             self.__set_auth_settings_by_username()
 
         async with self.__client:
+            self.__writes = asyncio.Queue()
+            writer = asyncio.ensure_future(self.__process_writes())
             self.__connected = True
 
             await self.__validate_nodes()
@@ -136,6 +179,8 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
 
                 await asyncio.sleep(.2)
 
+            writer.cancel()
+
         self.__connected = False
 
     async def __set_auth_settings_by_cert(self):
@@ -185,9 +230,9 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
             if level == 0:
                 current_parent_node = self.__client.nodes.root
 
-            children = await current_parent_node.get_children()
-            for node in children:
-                child_node = await node.read_browse_name()
+            # Browse names come with the references, no request per child
+            for description in await current_parent_node.get_children_descriptions():
+                child_node = description.BrowseName
 
                 if re.match(node_list[level], child_node.Name):
                     try:
@@ -195,8 +240,8 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
                     except IndexError:
                         nodes.append(f'{child_node.NamespaceIndex}:{child_node.Name}')
 
-                    await self.find_nodes(node_pattern, current_parent_node=node, level=level + 1, nodes=nodes,
-                                          final=final)
+                    await self.find_nodes(node_pattern, current_parent_node=self.__client.get_node(description.NodeId),
+                                          level=level + 1, nodes=nodes, final=final)
         else:
             final.append(nodes[:])
 
@@ -213,13 +258,15 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
                 try:
                     var = await self.__client.nodes.root.get_child(node)
                     value = await var.read_value()
-                    device_names.append(value)
+                    device_names.append((node, value))
                 except Exception as e:
                     self.__log.exception(e)
                     continue
 
-            for device_name in device_names:
-                for node in nodes:
+            for node in nodes:
+                # A device gets the name from its own name node if there is one, otherwise every name is used
+                own_names = [name for name_node, name in device_names if name_node[:len(node)] == node]
+                for device_name in own_names or [name for _, name in device_names]:
                     converter = self.__load_converter(device)
                     device_config = {**device, 'device_name': device_name}
                     self.__validated_nodes.append(
@@ -230,81 +277,200 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
 
     def __convert_sub_data(self):
         while not self.__stopped:
-            if not OpcUaConnectorAsyncIO.SUB_DATA_TO_CONVERT.empty():
-                sub_node, data = OpcUaConnectorAsyncIO.SUB_DATA_TO_CONVERT.get()
-
-                for device in self.__validated_nodes:
-                    for section in ('attributes', 'timeseries'):
-                        for node in device.values.get(section, []):
-                            if node.get('id') == sub_node.__str__():
-                                device.converter_for_sub.convert(config={'section': section, 'key': node['key']},
-                                                                 val=data.monitored_item.Value)
-                                converter_data = device.converter_for_sub.get_data()
-
-                                if converter_data:
-                                    OpcUaConnectorAsyncIO.DATA_TO_SEND.put(*converter_data)
-                                    device.converter_for_sub.clear_data()
-            sleep(.2)
+            try:
+                notifications = [OpcUaConnectorAsyncIO.SUB_DATA_TO_CONVERT.get(timeout=.2)]
+            except Empty:
+                continue
 
-    async def __poll_nodes(self):
+            # Notifications that have arrived meanwhile are sent with one message per device
+            while len(notifications) < MAX_NOTIFICATIONS_PER_BATCH:
+                try:
+                    notifications.append(OpcUaConnectorAsyncIO.SUB_DATA_TO_CONVERT.get_nowait())
+                except Empty:
+                    break
+
+            devices = {}
+            for sub_node, data in notifications:
+                for device, section, key in self.__subscribed_nodes.get(sub_node.nodeid, ()):
+                    device.converter_for_sub.convert(config={'section': section, 'key': key},
+                                                     val=data.monitored_item.Value)
+                    devices[id(device)] = device
+
+            for device in devices.values():
+                converter_data = device.converter_for_sub.get_data()
+
+                if converter_data:
+                    OpcUaConnectorAsyncIO.DATA_TO_SEND.put(*converter_data)
+                    device.converter_for_sub.clear_data()
+
+    def __batches(self, items):
+        for offset in range(0, len(items), self.__max_nodes_per_request):
+            yield items[offset:offset + self.__max_nodes_per_request]
+
+    async def __resolve_nodes(self):
+        """
+        Finds NodeIds of the configured variables, browse paths of many variables are translated with one
+        TranslateBrowsePathsToNodeIds request.
+        """
+        browse_paths = []
         for device in self.__validated_nodes:
             for section in ('attributes', 'timeseries'):
                 for node in device.values.get(section, []):
-                    if not node.get('invalid', False):
-                        try:
-                            var = await self.__client.nodes.root.get_child(node['path'])
-                            value = await var.read_data_value()
-
-                            device.converter.convert(config={'section': section, 'key': node['key']}, val=value)
-                        except Exception as e:
-                            self.__log.exception(e)
-                            node['invalid'] = True
-                        else:
-                            if not self.__server_conf.get('disableSubscriptions', False) and not node.get('sub_on',
-                                                                                                          False):
-                                handler = SubHandler()
-                                sub = await self.__client.create_subscription(10, handler)
-                                handle = await sub.subscribe_data_change(var)
-                                node['sub_on'] = True
-                                node['id'] = f'ns={var.nodeid.NamespaceIndex};i={var.nodeid.Identifier}'
-                                self.__subscriptions.append((sub, handle))
-                                node['invalid'] = False
+                    if node.get('node') is not None or node.get('invalid', False):
+                        continue
 
+                    if isinstance(node['path'], str):
+                        node['node'] = self.__client.get_node(node['path'])
+                        node['id'] = str(node['node'])
+                    else:
+                        browse_path = ua.BrowsePath()
+                        browse_path.StartingNode = self.__client.nodes.root.nodeid
+                        browse_path.RelativePath = self.__make_relative_path(node['path'])
+                        browse_paths.append((node, browse_path))
+
+        for batch in self.__batches(browse_paths):
+            results = await self.__client.uaclient.translate_browsepaths_to_nodeids(
+                [browse_path for _, browse_path in batch])
+            for (node, _), result in zip(batch, results):
+                if result.StatusCode.is_good() and result.Targets:
+                    node['node'] = self.__client.get_node(result.Targets[0].TargetId)
+                    node['id'] = str(node['node'])
+                else:
+                    self.__log.error('Node with path %s not found: %s', '.'.join(node['path']), result.StatusCode)
+                    node['invalid'] = True
+
+    @staticmethod
+    def __make_relative_path(path):
+        relative_path = ua.RelativePath()
+        for name in path:
+            element = ua.RelativePathElement()
+            element.ReferenceTypeId = ua.NodeId(ua.ObjectIds.HierarchicalReferences)
+            element.IsInverse = False
+            element.IncludeSubtypes = True
+            element.TargetName = ua.QualifiedName.from_string(name)
+            relative_path.Elements.append(element)
+        return relative_path
+
+    async def __poll_nodes(self):
+        await self.__resolve_nodes()
+
+        nodes = [(device, section, node) for device in self.__validated_nodes
+                 for section in ('attributes', 'timeseries') for node in device.values.get(section, [])
+                 if not node.get('invalid', False)]
+        new_nodes = []
+        for batch in self.__batches(nodes):
+            try:
+                values = await self.__client.uaclient.read_attributes([node['node'].nodeid for _, _, node in batch],
+                                                                      ua.AttributeIds.Value)
+            except Exception as e:
+                self.__log.exception(e)
+                continue
+
+            for (device, section, node), value in zip(batch, values):
+                if value.StatusCode is not None and value.StatusCode.is_bad():
+                    self.__log.error('Cannot read node %s: %s', node['id'], value.StatusCode)
+                    node['invalid'] = True
+                    continue
+
+                device.converter.convert(config={'section': section, 'key': node['key']}, val=value)
+                if not self.__server_conf.get('disableSubscriptions', False) and not node.get('sub_on', False):
+                    new_nodes.append((device, section, node))
+
+        for device in self.__validated_nodes:
             converter_data = device.converter.get_data()
             if converter_data:
                 OpcUaConnectorAsyncIO.DATA_TO_SEND.put(*converter_data)
 
                 device.converter.clear_data()
 
+        if new_nodes:
+            await self.__subscribe_nodes(new_nodes)
+
+    async def __subscribe_nodes(self, nodes):
+        """
+        Devices of one mapping share a subscription, their nodes are added to it with one CreateMonitoredItems
+        request per batch.
+        """
+        groups = {}
+        for device, section, node in nodes:
+            groups.setdefault(device.config['deviceNodePattern'], []).append((device, section, node))
+
+        for group, group_nodes in groups.items():
+            sub = self.__subscriptions.get(group)
+            if sub is None:
+                sub = await self.__client.create_subscription(
+                    self.__server_conf.get('subCheckPeriodInMillis', DEFAULT_SUB_CHECK_PERIOD), SubHandler())
+                self.__subscriptions[group] = sub
+
+            for batch in self.__batches(group_nodes):
+                handles = await sub.subscribe_data_change([node['node'] for _, _, node in batch])
+                for (device, section, node), handle in zip(batch, handles):
+                    if isinstance(handle, ua.StatusCode):
+                        self.__log.error('Cannot subscribe to node %s: %s', node['id'], handle)
+                    else:
+                        node['sub_on'] = True
+                        self.__subscribed_nodes.setdefault(node['node'].nodeid, []).append(
+                            (device, section, node['key']))
+
     def __send_data(self):
         while not self.__stopped:
-            if not OpcUaConnectorAsyncIO.DATA_TO_SEND.empty():
-                data = OpcUaConnectorAsyncIO.DATA_TO_SEND.get()
-                self.statistics['MessagesReceived'] = self.statistics['MessagesReceived'] + 1
-                self.__log.debug(data)
-                self.__gateway.send_to_storage(self.get_name(), data)
-                self.statistics['MessagesSent'] = self.statistics['MessagesSent'] + 1
-                self.__log.info('Data to ThingsBoard %s', data)
+            try:
+                data = OpcUaConnectorAsyncIO.DATA_TO_SEND.get(timeout=.2)
+            except Empty:
+                continue
 
-            sleep(.2)
+            self.statistics['MessagesReceived'] = self.statistics['MessagesReceived'] + 1
+            self.__log.debug(data)
+            self.__gateway.send_to_storage(self.get_name(), data)
+            self.statistics['MessagesSent'] = self.statistics['MessagesSent'] + 1
+            self.__log.info('Data to ThingsBoard %s', data)
 
     def on_attributes_update(self, content):
         self.__log.debug(content)
         try:
             device = tuple(filter(lambda i: i.name == content['device'], self.__validated_nodes))[0]
 
-            for (key, value) in content['data'].items():
-                for attr_update in device.config['attributes_updates']:
-                    if attr_update['attributeOnThingsBoard'] == key:
-                        for section in ('attributes', 'timeseries'):
-                            for node in device.values[section]:
-                                if re.fullmatch(attr_update['attributeOnDevice'],
-                                                '.'.join(device.path) + f'.{node["path"]}'):
-                                    self.__loop.create_task(self.__write_value(node['id'], value))
+            writes = [(node, value) for (key, value) in content['data'].items()
+                      for node in self.__get_attribute_update_nodes(device, key)]
+            if not writes:
+                return
 
+            # Updates of all the attributes go to the server with one Write request
+            statuses = self.__run_coroutine(self.__write_nodes(writes))
+            for (node, value), status in zip(writes, statuses):
+                if isinstance(status, Exception) or status.is_bad():
+                    self.__log.error('Cannot write %s to node %s: %s', value, node, status)
         except Exception as e:
             self.__log.exception(e)
 
+    def __get_attribute_update_nodes(self, device, key):
+        nodes = self.__attribute_update_nodes.get((device.name, key))
+        if nodes is not None:
+            return nodes
+
+        nodes = []
+        for attr_update in device.config.get('attributes_updates', []):
+            if attr_update['attributeOnThingsBoard'] == key:
+                for section in ('attributes', 'timeseries'):
+                    for node in device.values.get(section, []):
+                        if node.get('node') is not None and any(
+                                re.fullmatch(attr_update['attributeOnDevice'], path)
+                                for path in self.__get_node_paths(device, node)):
+                            nodes.append(node['node'])
+
+        # Nodes are resolved by the first poll, the result is not kept before that
+        if nodes:
+            self.__attribute_update_nodes[(device.name, key)] = nodes
+        return nodes
+
+    @staticmethod
+    def __get_node_paths(device, node):
+        if isinstance(node['path'], str):
+            return node['path'], '.'.join(device.path) + f'.{node["path"]}'
+
+        path = '.'.join(node['path'])
+        return path, '.'.join(name.split(':', 1)[-1] for name in node['path']), node['id']
+
     def server_side_rpc_handler(self, content):
         try:
             rpc_method = content["data"].get("method")
@@ -327,19 +493,14 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
                                                   content['data']['id'],
                                                   {content['data']['method']: 'Not enough arguments. Expected min 2.',
                                                    'code': 400})
+                    return
 
                 result = {}
                 if rpc_method == 'get':
-                    task = self.__loop.create_task(self.__read_value(full_path, result))
-
-                    while not task.done():
-                        sleep(.2)
+                    self.__run_coroutine(self.__read_value(full_path, result))
                 elif rpc_method == 'set':
                     value = args_list[2].split('=')[-1]
-                    task = self.__loop.create_task(self.__write_value(full_path, value, result))
-
-                    while not task.done():
-                        sleep(.2)
+                    self.__run_coroutine(self.__write_value(full_path, value, result))
 
                 self.__gateway.send_rpc_reply(content['device'],
                                               content['data']['id'],
@@ -347,54 +508,115 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
             else:
                 device = tuple(filter(lambda i: i.name == content['device'], self.__validated_nodes))[0]
 
-                for rpc in device.config['rpc_methods']:
-                    if rpc['method'] == content["data"]['method']:
-                        arguments_from_config = rpc["arguments"]
-                        arguments = content["data"].get("params") if content["data"].get(
-                            "params") is not None else arguments_from_config
-
-                        try:
-                            result = {}
-                            task = self.__loop.create_task(self.__call_method(device.path, arguments, result))
-
-                            while not task.done():
-                                sleep(.2)
-
-                            self.__gateway.send_rpc_reply(content["device"],
-                                                          content["data"]["id"],
-                                                          {content["data"]["method"]: result, "code": 200})
-                            log.debug("method %s result is: %s", rpc['method'], result)
-                        except Exception as e:
-                            log.exception(e)
-                            self.__gateway.send_rpc_reply(content["device"], content["data"]["id"],
-                                                          {"error": str(e), "code": 500})
-                    else:
-                        log.error("Method %s not found for device %s", rpc_method, content["device"])
-                        self.__gateway.send_rpc_reply(content["device"], content["data"]["id"],
-                                                      {"error": "%s - Method not found" % rpc_method,
-                                                       "code": 404})
+                rpc = next((rpc for rpc in device.config.get('rpc_methods', []) if rpc['method'] == rpc_method), None)
+                if rpc is None:
+                    log.error("Method %s not found for device %s", rpc_method, content["device"])
+                    self.__gateway.send_rpc_reply(content["device"], content["data"]["id"],
+                                                  {"error": "%s - Method not found" % rpc_method,
+                                                   "code": 404})
+                    return
+
+                arguments_from_config = rpc.get("arguments", [])
+                arguments = content["data"].get("params") if content["data"].get(
+                    "params") is not None else arguments_from_config
+
+                try:
+                    result = {}
+                    self.__run_coroutine(self.__call_method(device.path, rpc['method'], arguments, result))
+
+                    self.__gateway.send_rpc_reply(content["device"],
+                                                  content["data"]["id"],
+                                                  {content["data"]["method"]: result, "code": 200})
+                    log.debug("method %s result is: %s", rpc['method'], result)
+                except Exception as e:
+                    log.exception(e)
+                    self.__gateway.send_rpc_reply(content["device"], content["data"]["id"],
+                                                  {"error": str(e), "code": 500})
 
         except Exception as e:
             self.__log.exception(e)
 
+    async def __get_downlink_node(self, path):
+        node = self.__downlink_nodes.get(path)
+        if node is None:
+            if re.match(r'ns=\d+;[isgb]=', path):
+                node = self.__client.get_node(path)
+            else:
+                node = await self.__client.nodes.root.get_child(path.replace('\\.', '.').split('.'))
+            self.__downlink_nodes[path] = node
+        return node
+
+    async def __process_writes(self):
+        """Writes queued meanwhile are sent with one Write request."""
+        while True:
+            writes = [await self.__writes.get()]
+            while not self.__writes.empty() and len(writes) < self.__max_nodes_per_request:
+                writes.append(self.__writes.get_nowait())
+
+            try:
+                results = await self.__client.uaclient.write_attributes(
+                    [node_id for node_id, _, _ in writes], [data_value for _, data_value, _ in writes],
+                    ua.AttributeIds.Value)
+            except Exception as e:
+                results = [e] * len(writes)
+
+            for (_, _, future), result in zip(writes, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def __write_nodes(self, writes):
+        """Returns the StatusCode of every (node, value) write or the exception it failed with."""
+        for node, _ in writes:
+            if node.nodeid not in self.__variant_types:
+                try:
+                    self.__variant_types[node.nodeid] = await node.read_data_type_as_variant_type()
+                except Exception as e:
+                    self.__log.exception(e)
+
+        # Everything is queued at once so the writer sends it with one request
+        futures = []
+        for node, value in writes:
+            future = self.__loop.create_future()
+            try:
+                variant_type = self.__variant_types.get(node.nodeid)
+                data_value = ua.DataValue(ua.Variant(cast_value(value, variant_type), variant_type))
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                self.__writes.put_nowait((node.nodeid, data_value, future))
+            futures.append(future)
+
+        return await asyncio.gather(*futures, return_exceptions=True)
+
     async def __write_value(self, path, value, result={}):
         try:
-            var = self.__client.get_node(path.replace('\\.', '.'))
-            await var.write_value(value)
+            var = await self.__get_downlink_node(path)
+            status = (await self.__write_nodes([(var, value)]))[0]
+            if isinstance(status, Exception):
+                raise status
+            status.check()
         except Exception as e:
             result['error'] = e.__str__()
 
     async def __read_value(self, path, result={}):
         try:
-            var = self.__client.get_node(path)
+            var = await self.__get_downlink_node(path)
             result['value'] = await var.read_value()
         except Exception as e:
             result['error'] = e.__str__()
 
-    async def __call_method(self, path, arguments, result={}):
+    async def __call_method(self, path, method, arguments, result={}):
         try:
-            var = self.__client.get_node(path)
-            result['result'] = await var.call_method(*arguments)
+            var = await self.__get_downlink_node('.'.join(path))
+            if ':' not in method:
+                method = f'{var.nodeid.NamespaceIndex}:{method}'
+            method_node = await self.__get_downlink_node('.'.join(path + [method]))
+            result['result'] = await var.call_method(method_node.nodeid,
+                                                     *(arguments if isinstance(arguments, list) else [arguments]))
         except Exception as e:
             result['error'] = e.__str__()
 
@@ -402,7 +624,7 @@ class OpcUaConnectorAsyncIO(Connector, Thread):
 class SubHandler:
     @staticmethod
     def datachange_notification(node, _, data):
-        log.info("New data change event %s %s", node, data)
+        log.debug("New data change event %s %s", node, data)
         OpcUaConnectorAsyncIO.SUB_DATA_TO_CONVERT.put((node, data))
 
     @staticmethod
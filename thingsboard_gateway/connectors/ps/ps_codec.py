@@ -0,0 +1,170 @@
+from collections import namedtuple
+from struct import Struct
+
+from thingsboard_gateway.connectors.ps.ps_constant import PACK_NUM, DOT_LEN, START_REGISTER_ADDRESS, ProtocolTypeEnum, \
+    FrameSchemeType
+from thingsboard_gateway.connectors.ps.ps_frame_decoder import SYNC_HEADER, xor_checksum
+from thingsboard_gateway.tb_utility.bcd import bcd_to_int
+
+# sync header, frame length, pack number, pack type, flag length, sender flag, flag length, receiver flag
+FRAME_HEADER = Struct('>3sHBBB6sB6s')
+CHECK_SIZE = 1
+PACK_NUMBER = int(PACK_NUM, 16)
+FLAG_SIZE = int(DOT_LEN, 16)
+FUNCTIONS = {int(item.value, 16): item for item in ProtocolTypeEnum}
+# Register values follow the RTU address, function and two more bytes of the content package
+REGISTERS_OFFSET = 4
+BITWISE_UNIT = '按位解释'
+# (scheme, size in bytes) -> struct format of the integer registers
+INTEGER_FORMATS = {
+    (FrameSchemeType.NONE_FLAG.value, 2): 'H',
+    (FrameSchemeType.NONE_FLAG.value, 4): 'I',
+    (FrameSchemeType.NONE_FLAG.value, 8): 'Q',
+    (FrameSchemeType.HAVE_FLAG.value, 2): 'h',
+    (FrameSchemeType.HAVE_FLAG.value, 4): 'i',
+    (FrameSchemeType.HAVE_FLAG.value, 8): 'q',
+}
+
+PsFrame = namedtuple('PsFrame', ('raw', 'pack_type', 'device_flag', 'server_flag', 'payload'))
+
+
+def _build_crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _build_crc16_table()
+
+
+def crc16(data) -> bytes:
+    """Modbus CRC16, low byte first as it is sent in the frame."""
+    crc = 0xFFFF
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc.to_bytes(2, 'little')
+
+
+def parse_frame(frame: bytes) -> PsFrame:
+    _, _, _, pack_type, _, device_flag, _, server_flag = FRAME_HEADER.unpack_from(frame)
+    return PsFrame(frame, pack_type, device_flag.hex().upper(), server_flag.hex().upper(),
+                   memoryview(frame)[FRAME_HEADER.size:-CHECK_SIZE])
+
+
+def get_function(frame: PsFrame):
+    """Heartbeat carries the function in the first payload byte, other packages after the RTU address."""
+    payload = frame.payload
+    if len(payload) == 1:
+        return FUNCTIONS.get(payload[0])
+    return FUNCTIONS.get(payload[1]) if len(payload) > 1 else None
+
+
+def build_frame(pack_type: int, sender_flag: str, receiver_flag: str, payload: bytes) -> bytes:
+    frame = bytearray(FRAME_HEADER.size + len(payload) + CHECK_SIZE)
+    FRAME_HEADER.pack_into(frame, 0, SYNC_HEADER, len(frame), PACK_NUMBER, pack_type, FLAG_SIZE,
+                           bytes.fromhex(sender_flag), FLAG_SIZE, bytes.fromhex(receiver_flag))
+    frame[FRAME_HEADER.size:-CHECK_SIZE] = payload
+    frame[-1] = xor_checksum(memoryview(frame)[:-CHECK_SIZE])
+    return bytes(frame)
+
+
+def get_register_key(register, default):
+    return register.get('key') or register.get('keyVal') or default
+
+
+class RegisterLayout:
+    """
+    Decoder of the holding register values of a content package, compiled once from the "holdingRegister" config.
+    Every register value is read at its own offset, the offset is defined by the register address.
+    Integer registers are unpacked by one precompiled struct, other registers have their own decoders.
+    """
+
+    def __init__(self, holding_register):
+        self.__decoders = []
+        self.__keys = {}
+        self.size = 0
+
+        integers = []
+        for register in holding_register:
+            offset = REGISTERS_OFFSET + (register['address'] - START_REGISTER_ADDRESS) * 2
+            size = register['registerNum'] * 2
+            decimal_places = register.get('decimalPlaces', 0)
+            self.__decoders.append([register, None, slice(offset, offset + size), self.__get_value_decoder(register),
+                                    float('1e-' + str(decimal_places)) if decimal_places else None])
+            self.size = max(self.size, offset + size)
+
+            key = get_register_key(register, str(register['address']))
+            self.__keys[id(register)] = key
+            for number, ref in enumerate(register.get('refs', [])):
+                self.__keys[id(ref)] = get_register_key(ref, '%s_%i' % (key, number))
+
+            integer_format = INTEGER_FORMATS.get((register.get('scheme'), size))
+            if integer_format is not None:
+                integers.append((offset, size, integer_format, self.__decoders[-1]))
+
+        struct_format = '>'
+        position = REGISTERS_OFFSET
+        index = 0
+        for offset, size, integer_format, decoder in sorted(integers, key=lambda item: item[0]):
+            if offset < position:
+                # Overlapping registers keep their own decoders
+                continue
+            struct_format += 'x' * (offset - position) + integer_format
+            position = offset + size
+            decoder[1] = index
+            index += 1
+        self.__integers_struct = Struct(struct_format) if index else None
+
+    @staticmethod
+    def __get_value_decoder(register):
+        scheme = register.get('scheme')
+        size = register['registerNum'] * 2
+        if scheme == FrameSchemeType.NONE_FLAG.value:
+            return lambda data: int.from_bytes(data, 'big')
+        if scheme == FrameSchemeType.HAVE_FLAG.value:
+            return lambda data: int.from_bytes(data, 'big', signed=True)
+        if scheme == FrameSchemeType.DOUBLE.value:
+            # Decimal digits are sent as BCD
+            return lambda data: round(float(bcd_to_int(data)), 2)
+        if register.get('unit') == BITWISE_UNIT:
+            refs_count = len(register.get('refs', []))
+            # Up to eight flags are sent in the first byte, lowest bit first
+            bits_slice = slice(0, 1) if refs_count <= 8 else slice(0, size)
+            bits = range(refs_count)
+
+            def decode_bits(data):
+                value = int.from_bytes(data[bits_slice], 'big')
+                return tuple((value >> bit) & 1 for bit in bits)
+
+            return decode_bits
+        return lambda data: None
+
+    def decode(self, modbus_content) -> list:
+        """Returns (register config, value) pairs, bitwise registers also give (ref config, bit) pairs."""
+        integers = self.__integers_struct.unpack_from(modbus_content, REGISTERS_OFFSET) \
+            if self.__integers_struct is not None else ()
+
+        result = []
+        for register, integer_index, value_slice, decoder, scale in self.__decoders:
+            if integer_index is not None:
+                value = integers[integer_index]
+            else:
+                value = decoder(modbus_content[value_slice])
+                if isinstance(value, tuple):
+                    result.extend(zip(register.get('refs', []), value))
+
+            if scale is not None and value is not None and not isinstance(value, tuple):
+                value = float(value) * scale
+            result.append((register, value))
+        return result
+
+    def telemetry(self, modbus_content) -> dict:
+        """Returns telemetry key -> value, bitwise registers give a value for every ref."""
+        keys = self.__keys
+        return {keys[id(config)]: value for config, value in self.decode(modbus_content)
+                if value is not None and not isinstance(value, tuple)}
@@ -0,0 +1,87 @@
+from struct import Struct
+
+from thingsboard_gateway.connectors.ps.ps_constant import SYS_IDENTIFIER
+
+SYNC_HEADER = bytes.fromhex(SYS_IDENTIFIER)
+# Length field holds the size of the whole frame: sync header, length, body and XOR check byte
+LENGTH_FIELD = Struct('>H')
+HEADER_SIZE = len(SYNC_HEADER) + LENGTH_FIELD.size
+# Heartbeat is the shortest frame
+MIN_FRAME_SIZE = 23
+MAX_FRAME_SIZE = 0xFFFF
+
+
+def xor_checksum(data) -> int:
+    """XOR of all bytes, folds the data as one integer instead of iterating over bytes."""
+    size = len(data)
+    if not size:
+        return 0
+
+    value = int.from_bytes(data, 'big')
+    width = 1 << (size - 1).bit_length()
+    while width > 1:
+        width >>= 1
+        value = (value >> (width * 8)) ^ (value & ((1 << (width * 8)) - 1))
+    return value
+
+
+class PsFrameDecoder:
+    """
+    Splits the TCP stream of one connection into whole frames.
+    Bytes before a sync header and frames with a wrong length or XOR check are dropped, the stream resyncs
+    on the next sync header.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.__buffer = bytearray()
+        self.__max_frame_size = max_frame_size
+        self.dropped_bytes = 0
+        self.bad_frames = 0
+
+    def __len__(self):
+        return len(self.__buffer)
+
+    def feed(self, data) -> list:
+        """Appends received bytes to the buffer and returns the list of complete frames."""
+        buffer = self.__buffer
+        buffer += data
+        buffer_size = len(buffer)
+
+        frames = []
+        position = 0
+        while True:
+            start = buffer.find(SYNC_HEADER, position)
+            if start < 0:
+                # The end of the buffer can hold the beginning of the next sync header
+                start = max(position, buffer_size - len(SYNC_HEADER) + 1)
+                self.dropped_bytes += start - position
+                position = start
+                break
+
+            self.dropped_bytes += start - position
+            position = start
+            if buffer_size - start < HEADER_SIZE:
+                break
+
+            frame_size, = LENGTH_FIELD.unpack_from(buffer, start + len(SYNC_HEADER))
+            if not MIN_FRAME_SIZE <= frame_size <= self.__max_frame_size:
+                self.bad_frames += 1
+                position = start + 1
+                continue
+
+            end = start + frame_size
+            if end > buffer_size:
+                break
+
+            frame = bytes(buffer[start:end])
+            if xor_checksum(memoryview(frame)[:-1]) != frame[-1]:
+                self.bad_frames += 1
+                position = start + 1
+                continue
+
+            frames.append(frame)
+            position = end
+
+        if position:
+            del buffer[:position]
+        return frames
@@ -0,0 +1,207 @@
+from abc import ABC, abstractmethod
+from threading import Lock
+from time import monotonic
+
+import redis
+
+from thingsboard_gateway.connectors.connector import log
+from thingsboard_gateway.connectors.ps.ps_constant import PHOTO_DATA_, PS_PHOTO_INFO_HEAD_
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+
+
+class PhotoStore(ABC):
+    """Collects photo packets of every device until the photo is complete."""
+
+    @abstractmethod
+    def start(self, device, packets_count):
+        """Starts a new photo of the device, packets of the previous incomplete photo are dropped."""
+
+    @abstractmethod
+    def add(self, device, number, data) -> bool:
+        """Saves a packet, returns True when all packets of the photo are received."""
+
+    @abstractmethod
+    def pop(self, device) -> list:
+        """Returns the photo data as bytes-like chunks ordered by packet number and forgets the photo."""
+
+    @abstractmethod
+    def discard(self, device):
+        pass
+
+
+class MemoryPhotoStore(PhotoStore):
+    """
+    Keeps packets in process memory. Every photo has one preallocated bytearray with a slot per packet, a packet is
+    copied into its slot at number * packet size. The head frame only has the packets count, so the buffer is
+    allocated when the first packet tells the packet size. Only the last packet may be shorter, it is kept apart.
+    Photos that are not completed in ttl seconds are dropped, when stored photos take more than max_memory bytes
+    the oldest photos are dropped.
+    """
+
+    class Photo:
+        __slots__ = ('packets_count', 'packet_size', 'buffer', 'last', 'received', 'received_count', 'started')
+
+        def __init__(self, packets_count):
+            self.packets_count = packets_count
+            self.packet_size = None
+            self.buffer = bytearray()
+            self.last = b''
+            self.received = bytearray(packets_count + 1)
+            self.received_count = 0
+            self.started = monotonic()
+
+        @property
+        def size(self):
+            return len(self.buffer) + len(self.last)
+
+        def add(self, number, data):
+            if number == self.packets_count:
+                self.last = bytes(data)
+            else:
+                if self.packet_size is None:
+                    self.packet_size = len(data)
+                    self.buffer = bytearray((self.packets_count - 1) * self.packet_size)
+                if len(data) != self.packet_size:
+                    raise ValueError('packet %i has %i bytes, expected %i' % (number, len(data), self.packet_size))
+                offset = (number - 1) * self.packet_size
+                memoryview(self.buffer)[offset:offset + self.packet_size] = data
+
+            if not self.received[number]:
+                self.received[number] = 1
+                self.received_count += 1
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_memory=DEFAULT_MAX_MEMORY_BYTES):
+        self.__ttl = ttl
+        self.__max_memory = max_memory
+        self.__photos = {}
+        self.__size = 0
+        self.__lock = Lock()
+
+    @property
+    def size(self):
+        return self.__size
+
+    def __len__(self):
+        return len(self.__photos)
+
+    def start(self, device, packets_count):
+        with self.__lock:
+            self.__remove(device)
+            self.__remove_expired()
+            self.__photos[device] = MemoryPhotoStore.Photo(packets_count)
+
+    def add(self, device, number, data) -> bool:
+        with self.__lock:
+            self.__remove_expired()
+            photo = self.__photos.get(device)
+            if photo is None:
+                log.debug('PS photo packet %s from %s without photo head', number, device)
+                return False
+            if not 1 <= number <= photo.packets_count:
+                log.warning('PS photo packet %s from %s is out of %i packets', number, device, photo.packets_count)
+                return False
+
+            size = photo.size
+            try:
+                photo.add(number, data)
+            except ValueError as e:
+                log.warning('PS photo of %s is dropped: %s', device, e)
+                self.__remove(device)
+                return False
+            self.__size += photo.size - size
+
+            # Dict keeps photos in the start order, the first ones are the oldest
+            while self.__size > self.__max_memory:
+                oldest = next(iter(self.__photos))
+                log.warning('PS photo store is full, photo of %s is dropped', oldest)
+                self.__remove(oldest)
+                if oldest == device:
+                    return False
+
+            return photo.received_count >= photo.packets_count
+
+    def pop(self, device) -> list:
+        with self.__lock:
+            photo = self.__remove(device)
+        if photo is None:
+            return []
+        return [memoryview(photo.buffer), photo.last]
+
+    def discard(self, device):
+        with self.__lock:
+            self.__remove(device)
+
+    def __remove(self, device):
+        photo = self.__photos.pop(device, None)
+        if photo is not None:
+            self.__size -= photo.size
+        return photo
+
+    def __remove_expired(self):
+        expired = monotonic() - self.__ttl
+        while self.__photos:
+            device, photo = next(iter(self.__photos.items()))
+            if photo.started > expired:
+                break
+            log.warning('PS photo of %s is not completed in %i seconds, dropped', device, self.__ttl)
+            self.__remove(device)
+
+
+class RedisPhotoStore(PhotoStore):
+    """
+    Keeps packets in Redis hashes, so they are not lost on gateway restart.
+    Every call is sent as one pipeline.
+    """
+
+    def __init__(self, config, ttl=DEFAULT_TTL_SECONDS):
+        self.__ttl = ttl
+        self.__client = redis.Redis(host=config.get('host', 'localhost'),
+                                    port=config.get('port', 6379),
+                                    db=config.get('db', 0),
+                                    password=config.get('password') or None)
+
+    @staticmethod
+    def __keys(device):
+        return PS_PHOTO_INFO_HEAD_ + '@' + device, PHOTO_DATA_ + '@' + device
+
+    def start(self, device, packets_count):
+        info_key, data_key = self.__keys(device)
+        pipeline = self.__client.pipeline(transaction=False)
+        pipeline.delete(data_key)
+        pipeline.set(info_key, packets_count, ex=self.__ttl)
+        pipeline.execute()
+
+    def add(self, device, number, data) -> bool:
+        info_key, data_key = self.__keys(device)
+        pipeline = self.__client.pipeline(transaction=False)
+        pipeline.get(info_key)
+        pipeline.hset(data_key, number, bytes(data))
+        pipeline.expire(data_key, self.__ttl)
+        pipeline.hlen(data_key)
+        packets_count, _, _, received = pipeline.execute()
+        if packets_count is None:
+            log.debug('PS photo packet %s from %s without photo head', number, device)
+            self.__client.delete(data_key)
+            return False
+        return received >= int(packets_count)
+
+    def pop(self, device) -> list:
+        info_key, data_key = self.__keys(device)
+        pipeline = self.__client.pipeline(transaction=True)
+        pipeline.hgetall(data_key)
+        pipeline.delete(info_key, data_key)
+        packets, _ = pipeline.execute()
+        return [packets[number] for number in sorted(packets, key=int)]
+
+    def discard(self, device):
+        self.__client.delete(*self.__keys(device))
+
+
+def create_photo_store(config) -> PhotoStore:
+    store_type = config.get('type', 'memory').lower()
+    ttl = config.get('ttlSeconds', DEFAULT_TTL_SECONDS)
+    if store_type == 'redis':
+        return RedisPhotoStore(config.get('redis', {}), ttl=ttl)
+    return MemoryPhotoStore(ttl=ttl, max_memory=config.get('maxMemoryBytes', DEFAULT_MAX_MEMORY_BYTES))
@@ -0,0 +1,91 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from itertools import chain
+from json import JSONDecodeError, JSONDecoder
+from re import compile as compile_regex
+
+WHITESPACE = compile_regex(r'\s*')
+DELIMITERS = frozenset(' \t\n\r,]')
+
+# Parser states
+ARRAY_START = 0
+FIRST_ITEM = 1
+ITEM = 2
+SEPARATOR = 3
+ARRAY_END = 4
+
+
+def iter_json_array(chunks):
+    """
+    Yields items of a top level JSON array as soon as each of them has been received, so only the item that is being
+    received is kept in memory. A document that is not an array is yielded whole when it has been received.
+    chunks is an iterable of str, e.g. codecs.iterdecode(response.iter_content(chunk_size), 'utf-8').
+    """
+    decoder = JSONDecoder()
+    buffer = ''
+    position = 0
+    state = ARRAY_START
+    ended = False
+
+    # None marks the end of the stream
+    for chunk in chain(chunks, (None,)):
+        if chunk is None:
+            ended = True
+        else:
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+
+            if state == ARRAY_START:
+                if buffer[position] != '[':
+                    if ended:
+                        yield decoder.decode(buffer[position:])
+                        return
+                    break
+                position += 1
+                state = FIRST_ITEM
+            elif state == FIRST_ITEM and buffer[position] == ']':
+                position += 1
+                state = ARRAY_END
+            elif state in (FIRST_ITEM, ITEM):
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except JSONDecodeError:
+                    if ended:
+                        raise
+                    break
+                # A number is complete only when it is followed by a delimiter, it can continue in the next chunk
+                if not ended and (end == len(buffer) or buffer[end] not in DELIMITERS):
+                    break
+                yield item
+                position = end
+                state = SEPARATOR
+            elif state == SEPARATOR:
+                if buffer[position] == ',':
+                    state = ITEM
+                elif buffer[position] == ']':
+                    state = ARRAY_END
+                else:
+                    raise JSONDecodeError("Expecting ',' delimiter", buffer, position)
+                position += 1
+            else:
+                raise JSONDecodeError('Extra data', buffer, position)
+
+    if state != ARRAY_END:
+        raise JSONDecodeError('Unexpected end of the array', buffer, position)
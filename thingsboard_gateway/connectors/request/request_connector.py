@@ -12,40 +12,62 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 
+from codecs import iterdecode
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from heapq import heapify, heappop, heappush
 from json import JSONDecodeError
-from queue import Queue
-from random import choice
+from queue import Empty, Queue, SimpleQueue
+from random import choice, uniform
 from re import fullmatch
 from string import ascii_lowercase
-from threading import Thread
-from time import sleep, time
+from threading import Lock, Thread
+from time import time
 
 from thingsboard_gateway.tb_utility.tb_loader import TBModuleLoader
 from thingsboard_gateway.tb_utility.tb_utility import TBUtility
 
 try:
-    from requests import Timeout, request
+    from requests import Timeout
 except ImportError:
     print("Requests library not found - installing...")
     TBUtility.install_package("requests")
-    from requests import Timeout, request
+    from requests import Timeout
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from requests.exceptions import RequestException
 
 from thingsboard_gateway.connectors.connector import Connector, log
+from thingsboard_gateway.connectors.http_downlink_executor import HttpDownlinkExecutor
+from thingsboard_gateway.connectors.request.json_array_stream import iter_json_array
 from thingsboard_gateway.connectors.request.json_request_uplink_converter import JsonRequestUplinkConverter
 from thingsboard_gateway.connectors.request.json_request_downlink_converter import JsonRequestDownlinkConverter
 
 # pylint: disable=E1101
 requests.packages.urllib3.util.ssl_.DEFAULT_CIPHERS += ':ADH-AES128-SHA256'
 
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_SCAN_PERIOD_JITTER = .1
+MAX_SCHEDULER_WAIT = 1
+LATENESS_PARAMETER = 'ScanLatenessMs'
+MISSED_SCANS_PARAMETER = 'MissedScans'
+DOWNLINK_QUEUE_DEPTH_PARAMETER = 'DownlinkQueueDepth'
+LATENESS_SMOOTHING = .1
+STREAM_CHUNK_SIZE = 65536
+DEFAULT_STREAM_BATCH_SIZE = 1000
+
 
 class RequestConnector(Connector, Thread):
     def __init__(self, gateway, config, connector_type):
         super().__init__()
         self.statistics = {'MessagesReceived': 0,
-                           'MessagesSent': 0}
+                           'MessagesSent': 0,
+                           LATENESS_PARAMETER: 0,
+                           MISSED_SCANS_PARAMETER: 0,
+                           DOWNLINK_QUEUE_DEPTH_PARAMETER: 0}
+        # Requests are polled from the executor threads, they update the statistics concurrently
+        self.__statistics_lock = Lock()
         self.__rpc_requests = []
         self.__config = config
         self._connector_type = connector_type
@@ -65,23 +87,54 @@ class RequestConnector(Connector, Thread):
         self.__stopped = False
         self.__requests_in_progress = []
         self.__convert_queue = Queue(1000000)
+
+        # All endpoints are on one host, the pool holds at most maxConnections keep-alive connections to it
+        # and the executor runs at most that many requests at once
+        self.__max_connections = max(int(self.__config.get("maxConnections", DEFAULT_MAX_CONNECTIONS)), 1)
+        self.__scan_period_jitter = self.__config.get("scanPeriodJitter", DEFAULT_SCAN_PERIOD_JITTER)
+        self.__session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.__max_connections, pool_block=True)
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+        self.__executor = None
+        self.__finished_requests = SimpleQueue()
+        self.__downlink_executor = HttpDownlinkExecutor(self.get_name(), self.__config.get("downlink"))
         self.__attribute_updates = []
         self.__fill_attribute_updates()
         self.__fill_rpc_requests()
         self.__fill_requests()
 
     def run(self):
-        while not self.__stopped:
-            if self.__requests_in_progress:
-                for request in self.__requests_in_progress:
-                    if time() >= request["next_time"]:
-                        thread = Thread(target=self.__send_request, args=(request, self.__convert_queue, log),
-                                        daemon=True,
-                                        name="Request to endpoint \'%s\' Thread" % (request["config"].get("url")))
-                        thread.start()
-            else:
-                sleep(.2)
-            self.__process_data()
+        """
+        Scheduler of the polled endpoints. An endpoint is scheduled again only when its request has finished,
+        so every endpoint has exactly one request in flight. Requests run on a pool of maxConnections threads.
+        """
+        self.__connected = True
+        self.__executor = ThreadPoolExecutor(max_workers=self.__max_connections,
+                                             thread_name_prefix="%s requests" % self.get_name())
+        schedule = [(request["next_time"], number) for number, request in enumerate(self.__requests_in_progress)]
+        heapify(schedule)
+        try:
+            while not self.__stopped:
+                now = time()
+                while schedule and schedule[0][0] <= now:
+                    _, number = heappop(schedule)
+                    self.__executor.submit(self.__poll, number, self.__requests_in_progress[number])
+
+                wait = min(schedule[0][0] - now, MAX_SCHEDULER_WAIT) if schedule else MAX_SCHEDULER_WAIT
+                try:
+                    number = self.__finished_requests.get(timeout=max(wait, 0))
+                    while True:
+                        heappush(schedule, (self.__schedule_next(self.__requests_in_progress[number]), number))
+                        number = self.__finished_requests.get_nowait()
+                except Empty:
+                    pass
+
+                self.__process_data()
+                self.statistics[DOWNLINK_QUEUE_DEPTH_PARAMETER] = len(self.__downlink_executor)
+        finally:
+            self.__executor.shutdown(wait=False)
+            self.__session.close()
 
     def on_attributes_update(self, content):
         try:
@@ -89,20 +142,8 @@ class RequestConnector(Connector, Thread):
                 if fullmatch(attribute_request["deviceNameFilter"], content["device"]) and fullmatch(
                         attribute_request["attributeFilter"], list(content["data"].keys())[0]):
                     converted_data = attribute_request["converter"].convert(attribute_request, content)
-                    response_queue = Queue(1)
-                    request_dict = {"config": {**attribute_request,
-                                               **converted_data},
-                                    "request": request}
-                    attribute_update_request_thread = Thread(target=self.__send_request,
-                                                             args=(request_dict, response_queue, log),
-                                                             daemon=True,
-                                                             name="Attribute request to %s" % (converted_data["url"]))
-                    attribute_update_request_thread.start()
-                    attribute_update_request_thread.join()
-                    if not response_queue.empty():
-                        response = response_queue.get_nowait()
-                        log.debug(response)
-                    del response_queue
+                    params = self.__get_request_params({**attribute_request, **converted_data})
+                    self.__downlink_executor.submit(params, self.__log_attribute_update_response)
         except Exception as e:
             log.exception(e)
 
@@ -112,29 +153,30 @@ class RequestConnector(Connector, Thread):
                 if fullmatch(rpc_request["deviceNameFilter"], content["device"]) and fullmatch(
                         rpc_request["methodFilter"], content["data"]["method"]):
                     converted_data = rpc_request["converter"].convert(rpc_request, content)
-                    response_queue = Queue(1)
-                    request_dict = {"config": {**rpc_request,
-                                               **converted_data},
-                                    "request": request}
-                    request_dict["config"].get("uplink_converter")
-                    rpc_request_thread = Thread(target=self.__send_request,
-                                                args=(request_dict, response_queue, log),
-                                                daemon=True,
-                                                name="RPC request to %s" % (converted_data["url"]))
-                    rpc_request_thread.start()
-                    rpc_request_thread.join()
-                    if not response_queue.empty():
-                        response = response_queue.get_nowait()
-                        log.debug(response)
-                        self.__gateway.send_rpc_reply(device=content["device"], req_id=content["data"]["id"],
-                                                      content=response[2])
-                    self.__gateway.send_rpc_reply(device=content["device"], req_id=content["data"]["id"],
-                                                  success_sent=True)
-
-                    del response_queue
+                    params = self.__get_request_params({**rpc_request, **converted_data})
+                    reply = partial(self.__send_rpc_reply, content["device"], content["data"]["id"])
+                    if not self.__downlink_executor.submit(params, reply):
+                        reply(None, "Downlink queue is full")
         except Exception as e:
             log.exception(e)
 
+    @staticmethod
+    def __log_attribute_update_response(response, error):
+        if error is None:
+            log.debug("Attribute update request to %s finished with code: %i", response.url, response.status_code)
+
+    def __send_rpc_reply(self, device, request_id, response, error):
+        if error is not None:
+            content = {"error": str(error)}
+        elif not response.ok:
+            content = {"error": response.reason, "code": response.status_code}
+        else:
+            try:
+                content = response.json()
+            except ValueError:
+                content = response.text
+        self.__gateway.send_rpc_reply(device=device, req_id=request_id, content=content)
+
     def __fill_requests(self):
         log.debug(self.__config["mapping"])
         for endpoint in self.__config["mapping"]:
@@ -151,10 +193,13 @@ class RequestConnector(Connector, Thread):
                                   endpoint["url"])
                 else:
                     converter = JsonRequestUplinkConverter(endpoint)
+                scan_period = endpoint.get("scanPeriod", 10)
+                # Endpoints with the same period are spread over the jitter window instead of starting at once
                 self.__requests_in_progress.append({"config": endpoint,
                                                     "converter": converter,
-                                                    "next_time": time(),
-                                                    "request": request})
+                                                    "next_time": time() + uniform(0, scan_period *
+                                                                                  self.__scan_period_jitter),
+                                                    "request": self.__session.request})
             except Exception as e:
                 log.exception(e)
 
@@ -176,44 +221,73 @@ class RequestConnector(Connector, Thread):
             rpc_request_dict = {**rpc_request, "converter": converter}
             self.__rpc_requests.append(rpc_request_dict)
 
+    def __poll(self, number, request):
+        lateness = time() - request["next_time"]
+        with self.__statistics_lock:
+            self.statistics[LATENESS_PARAMETER] += (lateness * 1000 - self.statistics[LATENESS_PARAMETER]) * \
+                LATENESS_SMOOTHING
+        try:
+            self.__send_request(request, self.__convert_queue, log)
+        finally:
+            self.__finished_requests.put(number)
+
+    def __schedule_next(self, request):
+        scan_period = request["config"].get("scanPeriod", 10)
+        jitter = self.__scan_period_jitter
+        next_time = request["next_time"] + scan_period * (1 + uniform(-jitter, jitter))
+        now = time()
+        if next_time < now - scan_period:
+            # The request took longer than the scan period, the missed scans are skipped
+            with self.__statistics_lock:
+                self.statistics[MISSED_SCANS_PARAMETER] += int((now - next_time) // scan_period)
+            next_time = now
+        request["next_time"] = next_time
+        return next_time
+
+    def __get_request_params(self, config):
+        request_url_from_config = config["url"]
+        request_url_from_config = str('/' + request_url_from_config) if request_url_from_config[
+                                                                            0] != '/' else request_url_from_config
+        params = {
+            "method": config.get("httpMethod", "GET"),
+            "url": self.__host + request_url_from_config,
+            "timeout": config.get("timeout", 1),
+            "allow_redirects": config.get("allowRedirects", False),
+            "verify": self.__ssl_verify,
+            "auth": self.__security,
+            "data": config.get("data", {})
+        }
+        if config.get("httpHeaders") is not None:
+            params["headers"] = config["httpHeaders"]
+        return params
+
     def __send_request(self, request, converter_queue, logger):
         url = ""
         try:
-            request["next_time"] = time() + request["config"].get("scanPeriod", 10)
-            request_url_from_config = request["config"]["url"]
-            request_url_from_config = str('/' + request_url_from_config) if request_url_from_config[
-                                                                                0] != '/' else request_url_from_config
-            logger.debug(request_url_from_config)
-            url = self.__host + request_url_from_config
-            logger.debug(url)
-            request_timeout = request["config"].get("timeout", 1)
-            params = {
-                "method": request["config"].get("httpMethod", "GET"),
-                "url": url,
-                "timeout": request_timeout,
-                "allow_redirects": request["config"].get("allowRedirects", False),
-                "verify": self.__ssl_verify,
-                "auth": self.__security,
-                "data": request["config"].get("data", {})
-                }
+            params = self.__get_request_params(request["config"])
+            url = params["url"]
             logger.debug(url)
-            if request["config"].get("httpHeaders") is not None:
-                params["headers"] = request["config"]["httpHeaders"]
+            stream = request["config"].get("streamResponse", False)
+            if stream:
+                params["stream"] = True
             logger.debug("Request to %s will be sent", url)
             response = request["request"](**params)
             if response and response.ok:
-                if not converter_queue.full():
+                if stream:
+                    self.__convert_stream(url, request, response)
+                    self.__count_statistic("MessagesReceived")
+                elif not converter_queue.full():
                     data_to_storage = [url, request["converter"]]
                     try:
                         data_to_storage.append(response.json())
                     except UnicodeDecodeError:
-                        data_to_storage.append(response.content())
+                        data_to_storage.append(response.content)
                     except JSONDecodeError:
-                        data_to_storage.append(response.content())
+                        data_to_storage.append(response.content)
 
                     if len(data_to_storage) == 3:
                         self.__convert_data(data_to_storage)
-                        self.statistics["MessagesReceived"] = self.statistics["MessagesReceived"] + 1
+                        self.__count_statistic("MessagesReceived")
             else:
                 logger.error("Request to URL: %s finished with code: %i", url, response.status_code)
         except Timeout:
@@ -234,36 +308,69 @@ class RequestConnector(Connector, Thread):
             if isinstance(data, list):
                 for data_item in data:
                     self.__add_ts(data_item)
-                    converted_data = converter.convert(url, data_item)
+                    self.__merge_converted_data(data_to_send, converter.convert(url, data_item))
 
-                    if data_to_send.get(converted_data["deviceName"]) is None:
-                        data_to_send[converted_data["deviceName"]] = converted_data
-                    else:
-                        if converted_data["telemetry"]:
-                            data_to_send[converted_data["deviceName"]]["telemetry"].append(
-                                converted_data["telemetry"][0])
-                        if converted_data["attributes"]:
-                            data_to_send[converted_data["deviceName"]]["attributes"].append(
-                                converted_data["attributes"][0])
+                for device_data in data_to_send.values():
+                    self.__convert_queue.put(device_data)
             else:
                 self.__add_ts(data)
-                data_to_send = converter.convert(url, data)
-
-            self.__convert_queue.put(data_to_send)
+                self.__convert_queue.put(converter.convert(url, data))
 
         except Exception as e:
             log.exception(e)
 
+    def __convert_stream(self, url, request, response):
+        """
+        Converts items of a JSON array response while it is being received. Converted items are merged per device
+        and sent every streamBatchSize items, so memory does not depend on the size of the response.
+        """
+        converter = request["converter"]
+        batch_size = request["config"].get("streamBatchSize", DEFAULT_STREAM_BATCH_SIZE)
+        data_to_send = {}
+        items_count = 0
+        try:
+            chunks = iterdecode(response.iter_content(STREAM_CHUNK_SIZE), response.encoding or 'utf-8')
+            for item in iter_json_array(chunks):
+                if isinstance(item, dict):
+                    self.__add_ts(item)
+                self.__merge_converted_data(data_to_send, converter.convert(url, item))
+                items_count += 1
+                if items_count >= batch_size:
+                    self.__send_converted_data(data_to_send)
+                    data_to_send = {}
+                    items_count = 0
+        finally:
+            response.close()
+            self.__send_converted_data(data_to_send)
+
+    @staticmethod
+    def __merge_converted_data(data_to_send, converted_data):
+        device_data = data_to_send.get(converted_data["deviceName"])
+        if device_data is None:
+            data_to_send[converted_data["deviceName"]] = converted_data
+        else:
+            device_data["telemetry"].extend(converted_data["telemetry"])
+            device_data["attributes"].extend(converted_data["attributes"])
+
+    def __send_converted_data(self, data_to_send):
+        for device_data in data_to_send.values():
+            self.__gateway.send_to_storage(self.get_name(), device_data)
+            self.__count_statistic("MessagesSent")
+
+    def __count_statistic(self, parameter):
+        with self.__statistics_lock:
+            self.statistics[parameter] += 1
+
     def __add_ts(self, data):
         if data.get("ts") is None:
             data["ts"] = time() * 1000
 
     def __process_data(self):
         try:
-            if not self.__convert_queue.empty():
+            while not self.__convert_queue.empty():
                 data = self.__convert_queue.get()
                 self.__gateway.send_to_storage(self.get_name(), data)
-                self.statistics["MessagesSent"] = self.statistics["MessagesSent"] + 1
+                self.__count_statistic("MessagesSent")
 
         except Exception as e:
             log.exception(e)
@@ -276,7 +383,9 @@ class RequestConnector(Connector, Thread):
 
     def open(self):
         self.__stopped = False
+        self.__downlink_executor.start()
         self.start()
 
     def close(self):
         self.__stopped = True
+        self.__downlink_executor.stop()
@@ -11,32 +11,32 @@
 #     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
+import asyncio
 import json
-from queue import Queue
+import multiprocessing
+import socket
+from collections import deque
+from functools import partial
+from queue import Empty
 from random import choice
 from re import fullmatch
 from string import ascii_lowercase
-from threading import Thread
-from time import time, sleep
+from threading import Lock, Thread
+from time import monotonic
 import ssl
 import os
 
-from simplejson import JSONDecodeError, dumps
+from simplejson import dumps
 import requests
 from requests.auth import HTTPBasicAuth as HTTPBasicAuthRequest
-from requests.exceptions import RequestException
 
+from thingsboard_gateway.connectors.http_downlink_executor import HttpDownlinkExecutor
+from thingsboard_gateway.connectors.rest.rest_worker import ATTRIBUTE_REQUEST_MESSAGE, ATTRIBUTE_RESPONSE_MESSAGE, \
+    DATA_MESSAGE, RESPONSE_DROPPED_MESSAGE, RESPONSES_MESSAGE, WORKER_STARTED_MESSAGE, run_worker
 from thingsboard_gateway.tb_utility.tb_loader import TBModuleLoader
 from thingsboard_gateway.tb_utility.tb_utility import TBUtility
 from thingsboard_gateway.connectors.connector import Connector, log
 
-try:
-    from requests import Timeout, request as regular_request
-except ImportError:
-    print("Requests library not found - installing...")
-    TBUtility.install_package("requests")
-    from requests import Timeout, request as regular_request
-
 try:
     from aiohttp import web, BasicAuth
 except ImportError:
@@ -46,6 +46,8 @@ except ImportError:
 
 requests.packages.urllib3.util.ssl_.DEFAULT_CIPHERS += ':ADH-AES128-SHA256'
 
+WORKERS_CHECK_PERIOD = 1
+
 
 class RESTConnector(Connector, Thread):
     def __init__(self, gateway, config, connector_type):
@@ -73,8 +75,30 @@ class RESTConnector(Connector, Thread):
         self.__attribute_type = {}
         self.__rpc_requests = []
         self.__attribute_updates = []
+        self.__pending_responses = PendingResponses()
+        self.on_server_started = None
+        # (device name, response attribute) -> numbers of the workers that wait for it, the oldest request first
+        self.__response_workers = {}
+        self.__response_workers_lock = Lock()
+        self.__started_workers = set()
+        self.__workers_count = max(int(config.get('workersCount', 1)), 1)
+        if self.__workers_count > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+            log.error('Worker processes need SO_REUSEPORT that is not supported on this platform, '
+                      'the server runs in the gateway process')
+            self.__workers_count = 1
+        self.__workers = []
+        self.__workers_queues = []
+        self.__uplink_queue = None
+        self.__downlink_executor = HttpDownlinkExecutor(self.get_name(), config.get("downlink"))
+        self.__response_attributes = {mapping['response']['responseAttribute']
+                                       for mapping in self.__config.get('mapping', [])
+                                       if mapping.get('response', {}).get('responseAttribute')}
         self.__fill_requests_from_TB()
 
+    @property
+    def pending_responses(self):
+        return self.__pending_responses
+
     def load_endpoints(self):
         endpoints = {}
         for mapping in self.__config.get("mapping"):
@@ -85,10 +109,7 @@ class RESTConnector(Connector, Thread):
 
         # configuring Attribute Request endpoints
         if len(self.__config.get('attributeRequests', [])):
-            self.__attribute_type = {
-                'client': self.__gateway.tb_client.client.gw_request_client_attributes,
-                'shared': self.__gateway.tb_client.client.gw_request_shared_attributes
-            }
+            self.__load_attribute_types()
 
             for attr in self.__config['attributeRequests']:
                 config = {
@@ -100,6 +121,12 @@ class RESTConnector(Connector, Thread):
 
         return endpoints
 
+    def __load_attribute_types(self):
+        self.__attribute_type = {
+            'client': self.__gateway.tb_client.client.gw_request_client_attributes,
+            'shared': self.__gateway.tb_client.client.gw_request_shared_attributes
+        }
+
     def load_handlers(self):
         data_handlers = {
             "basic": BasicDataHandler,
@@ -117,7 +144,8 @@ class RESTConnector(Connector, Thread):
                 for http_method in mapping['HTTPMethods']:
                     handler = data_handlers[security_type](self.collect_statistic_and_send, self.get_name(),
                                                            self.endpoints[mapping["endpoint"]],
-                                                           provider=self.__event_provider)
+                                                           provider=self.__event_provider,
+                                                           pending_responses=self.__pending_responses)
                     handlers.append(web.route(http_method, mapping['endpoint'], handler))
             except Exception as e:
                 log.error("Error on creating handlers - %s", str(e))
@@ -125,6 +153,7 @@ class RESTConnector(Connector, Thread):
 
     def open(self):
         self.__stopped = False
+        self.__downlink_executor.start()
         self.start()
 
     def __run_server(self):
@@ -137,10 +166,7 @@ class RESTConnector(Connector, Thread):
         key = None
         if self.__config.get('SSL', False):
             if not self.__config.get('security'):
-                if not os.path.exists('domain_srv.crt'):
-                    from thingsboard_gateway.connectors.rest.ssl_generator import SSLGenerator
-                    n = SSLGenerator(self.__config['host'])
-                    n.generate_certificate()
+                self.__generate_certificate()
 
                 cert = 'domain_srv.crt'
                 key = 'domain_srv.key'
@@ -156,20 +182,138 @@ class RESTConnector(Connector, Thread):
             ssl_context.load_cert_chain(cert, key)
 
         self.load_handlers()
+        # run_app calls print once the server listens on the port
         web.run_app(self._app, host=self.__config['host'], port=self.__config['port'], handle_signals=False,
-                    ssl_context=ssl_context, reuse_port=self.__config['port'], reuse_address=self.__config['host'])
+                    ssl_context=ssl_context, reuse_port=self.__config['port'], reuse_address=self.__config['host'],
+                    print=self.__server_started)
 
-    def run(self):
+    def __server_started(self, message):
+        log.info('%s: %s', self.get_name(), message.splitlines()[0])
         self._connected = True
+        if self.on_server_started is not None:
+            self.on_server_started()
+
+    def __generate_certificate(self):
+        if not os.path.exists('domain_srv.crt'):
+            from thingsboard_gateway.connectors.rest.ssl_generator import SSLGenerator
+            n = SSLGenerator(self.__config['host'])
+            n.generate_certificate()
+
+    def __run_workers(self):
+        """
+        Serves the endpoints from worker processes that share the port with SO_REUSEPORT, requests are parsed and
+        converted in the workers. Converted data comes back in batches, the connector thread sends it to the storage
+        and handles attribute requests and responses of the workers.
+        """
+        if self.__config.get('SSL', False) and not self.__config.get('security'):
+            self.__generate_certificate()
+        if len(self.__config.get('attributeRequests', [])):
+            self.__load_attribute_types()
+
+        # Workers are spawned, forking the gateway process with its running threads is not safe
+        context = multiprocessing.get_context('spawn')
+        self.__uplink_queue = context.Queue()
+        self.__workers_queues = [context.Queue() for _ in range(self.__workers_count)]
+        self.__workers = [None] * self.__workers_count
+        for number in range(self.__workers_count):
+            self.__start_worker(context, number)
+        log.info('%s started %i worker processes on %s:%s', self.get_name(), self.__workers_count,
+                 self.__config['host'], self.__config['port'])
+
+        next_check = monotonic() + WORKERS_CHECK_PERIOD
+        while not self.__stopped:
+            try:
+                self.__process_worker_message(self.__uplink_queue.get(timeout=WORKERS_CHECK_PERIOD))
+            except Empty:
+                pass
+            except Exception as e:
+                log.exception(e)
+
+            if monotonic() >= next_check:
+                next_check = monotonic() + WORKERS_CHECK_PERIOD
+                self.__check_workers(context)
+
+        self.__stop_workers()
+
+    def __start_worker(self, context, number):
+        self.__workers[number] = context.Process(target=run_worker, name='%s worker %i' % (self.get_name(), number),
+                                                 args=(number, self.__config, self._connector_type,
+                                                       self.__uplink_queue, self.__workers_queues[number]),
+                                                 daemon=True)
+        self.__workers[number].start()
+
+    def __check_workers(self, context):
+        for number, worker in enumerate(self.__workers):
+            if not worker.is_alive() and not self.__stopped:
+                log.error('%s worker %i exited with code %s, restarting', self.get_name(), number, worker.exitcode)
+                self.__forget_response_worker(number)
+                self.__start_worker(context, number)
+
+    def __stop_workers(self):
+        for worker_queue in self.__workers_queues:
+            worker_queue.put(None)
+        for worker in self.__workers:
+            if worker is not None and worker.is_alive():
+                worker.terminate()
+                worker.join(1)
+
+    def __process_worker_message(self, message):
+        if message[0] == DATA_MESSAGE:
+            _, number, batch = message
+            for data, expected_keys in batch:
+                # The worker is registered before the data goes to ThingsBoard that answers it
+                if expected_keys:
+                    with self.__response_workers_lock:
+                        for key in expected_keys:
+                            self.__response_workers.setdefault(key, deque()).append(number)
+                self.collect_statistic_and_send(self.get_name(), data)
+        elif message[0] == ATTRIBUTE_REQUEST_MESSAGE:
+            _, number, request_id, attribute_type, device_name, keys = message
+            self.__attribute_type[attribute_type](device_name, keys,
+                                                  partial(self.__send_attribute_response, number, request_id))
+            self.statistic_message_received()
+        elif message[0] == RESPONSE_DROPPED_MESSAGE:
+            _, number, key = message
+            with self.__response_workers_lock:
+                workers = self.__response_workers.get(key)
+                if workers and number in workers:
+                    workers.remove(number)
+                    if not workers:
+                        del self.__response_workers[key]
+        elif message[0] == WORKER_STARTED_MESSAGE:
+            self.__started_workers.add(message[1])
+            if len(self.__started_workers) == self.__workers_count:
+                log.info('%s: all worker processes are listening', self.get_name())
+                self._connected = True
+
+    def __forget_response_worker(self, number):
+        # Requests of the exited worker are gone with it
+        with self.__response_workers_lock:
+            for key, workers in list(self.__response_workers.items()):
+                remaining = deque(worker for worker in workers if worker != number)
+                if remaining:
+                    self.__response_workers[key] = remaining
+                else:
+                    del self.__response_workers[key]
 
+    def __send_attribute_response(self, number, request_id, content, error):
+        self.__workers_queues[number].put((ATTRIBUTE_RESPONSE_MESSAGE, request_id, content,
+                                           None if error is None else str(error)))
+        self.statistic_message_send()
+
+    def run(self):
         try:
-            self.__run_server()
+            if self.__workers_count > 1:
+                self.__run_workers()
+            else:
+                self.__run_server()
         except Exception as e:
             log.exception(e)
 
     def close(self):
         self.__stopped = True
         self._connected = False
+        self.__downlink_executor.stop()
 
     def get_name(self):
         return self.name
@@ -183,48 +327,50 @@ class RESTConnector(Connector, Thread):
                 if fullmatch(attribute_request["deviceNameFilter"], content["device"]) and \
                         fullmatch(attribute_request["attributeFilter"], list(content["data"].keys())[0]):
                     converted_data = attribute_request["downlink_converter"].convert(attribute_request, content)
-                    response_queue = Queue(1)
-                    request_dict = {"config": {**attribute_request,
-                                               **converted_data},
-                                    "request": regular_request}
-                    attribute_update_request_thread = Thread(target=self.__send_request,
-                                                             args=(request_dict, response_queue, log),
-                                                             daemon=True,
-                                                             name="Attribute request to %s" % (
-                                                                 converted_data["url"]))
-                    attribute_update_request_thread.start()
-                    if not response_queue.empty():
-                        response = response_queue.get_nowait()
-                        log.debug(response)
-                    del response_queue
+                    params = self.__get_request_params({**attribute_request, **converted_data})
+                    self.__downlink_executor.submit(params, self.__process_attribute_update_response)
 
             # ONLY if initialized "response" section for endpoint
             # check if attribute update relates to some responseAttribute
-            for endpoint in self.__config['mapping']:
-                response_attribute = endpoint.get('response', {}).get('responseAttribute')
-                if list(content['data'].keys())[0] == response_attribute:
-                    BaseDataHandler.responses_queue.put(content['data'][response_attribute])
+            responses = {response_attribute: content['data'][response_attribute]
+                         for response_attribute in self.__response_attributes
+                         if response_attribute in content['data']}
+            if responses:
+                self.resolve_responses(content['device'], responses)
         except Exception as e:
             log.exception(e)
 
+    def resolve_responses(self, device_name, responses):
+        if self.__workers_queues:
+            # Every response goes only to the worker with the oldest request waiting for it
+            workers_responses = {}
+            with self.__response_workers_lock:
+                for response_attribute, response in responses.items():
+                    key = (device_name, response_attribute)
+                    workers = self.__response_workers.get(key)
+                    if not workers:
+                        continue
+                    workers_responses.setdefault(workers.popleft(), {})[response_attribute] = response
+                    if not workers:
+                        del self.__response_workers[key]
+
+            for number, worker_responses in workers_responses.items():
+                self.__workers_queues[number].put((RESPONSES_MESSAGE, device_name, worker_responses))
+            return
+
+        for response_attribute, response in responses.items():
+            self.__pending_responses.resolve((device_name, response_attribute), response)
+
     def server_side_rpc_handler(self, content):
         try:
             for rpc_request in self.__rpc_requests:
                 if fullmatch(rpc_request["deviceNameFilter"], content["device"]) and \
                         fullmatch(rpc_request["methodFilter"], content["data"]["method"]):
                     converted_data = rpc_request["downlink_converter"].convert(rpc_request, content)
-
-                    request_dict = {"config": {**rpc_request,
-                                               **converted_data},
-                                    "request": regular_request}
-                    request_dict["converter"] = request_dict["config"].get("uplink_converter")
-
-                    response = self.__send_request(request_dict, Queue(1), log, with_queue=False)
-
-                    log.debug('Response from RPC request: %s', response)
-                    self.__gateway.send_rpc_reply(device=content["device"],
-                                                  req_id=content["data"]["id"],
-                                                  content=response[2] if response and len(response) >= 3 else response)
+                    params = self.__get_request_params({**rpc_request, **converted_data})
+                    reply = partial(self.__send_rpc_reply, content["device"], content["data"]["id"])
+                    if not self.__downlink_executor.submit(params, reply):
+                        reply(None, "Downlink queue is full")
         except Exception as e:
             log.exception(e)
 
@@ -268,95 +414,133 @@ class RESTConnector(Connector, Thread):
                                 }
                 requests_from_tb[request_section].append(request_dict)
 
-    def __send_request(self, request_dict, converter_queue, logger, with_queue=True):
-        url = ""
-        try:
-            request_dict["next_time"] = time() + request_dict["config"].get("scanPeriod", 10)
+    def __get_request_params(self, config):
+        if str(config["url"]).lower().startswith("http"):
+            url = config["url"]
+        else:
+            url = "http://" + config["url"]
+
+        security = None
+        if config["security"]["type"].lower() == "basic":
+            security = HTTPBasicAuthRequest(config["security"]["username"], config["security"]["password"])
+
+        params = {
+            "method": config.get("HTTPMethod", "GET"),
+            "url": url,
+            "timeout": config.get("timeout"),
+            "allow_redirects": config.get("allowRedirects", False),
+            "verify": config.get("SSLVerify"),
+            "auth": security,
+            "data": config["data"],
+        }
+        if config.get("httpHeaders") is not None:
+            params["headers"] = config["httpHeaders"]
+        return params
 
-            if str(request_dict["config"]["url"]).lower().startswith("http"):
-                url = request_dict["config"]["url"]
-            else:
-                url = "http://" + request_dict["config"]["url"]
+    def __get_response_content(self, response, error):
+        if error is not None:
+            return {"error": str(error)}
 
-            logger.debug(url)
-            security = None
+        self.statistics["MessagesReceived"] = self.statistics["MessagesReceived"] + 1
+        if not response.ok:
+            log.error("Request to URL: %s finished with code: %i. Cat information: http://http.cat/%i",
+                      response.url, response.status_code, response.status_code)
+            log.debug("Response: %r", response.text)
+            return {"error": response.reason, "code": response.status_code}
 
-            if request_dict["config"]["security"]["type"].lower() == "basic":
-                security = HTTPBasicAuthRequest(request_dict["config"]["security"]["username"],
-                                                request_dict["config"]["security"]["password"])
+        try:
+            return response.json()
+        except ValueError:
+            return response.text
+
+    def __process_attribute_update_response(self, response, error):
+        if error is None:
+            log.debug("Response from attribute update request: %s", self.__get_response_content(response, error))
+
+    def __send_rpc_reply(self, device, request_id, response, error):
+        content = self.__get_response_content(response, error)
+        log.debug('Response from RPC request: %s', content)
+        self.__gateway.send_rpc_reply(device=device, req_id=request_id, content=content)
+
+
+class PendingResponses:
+    """
+    Futures of HTTP requests waiting for a response attribute from ThingsBoard, keyed by (device name, attribute).
+    Futures are created in the server loop and resolved from the TB client thread, the oldest request of the key
+    gets the response. Futures that timed out are removed by their done callback. The listener, if any, is told
+    about every created future and every future that was removed without a response.
+    """
+
+    def __init__(self, listener=None):
+        self.__futures = {}
+        self.__lock = Lock()
+        self.listener = listener
+
+    def __len__(self):
+        with self.__lock:
+            return sum(len(futures) for futures in self.__futures.values())
+
+    def create(self, key):
+        future = asyncio.get_running_loop().create_future()
+        with self.__lock:
+            self.__futures.setdefault(key, deque()).append(future)
+        future.add_done_callback(partial(self.__discard, key))
+        if self.listener is not None:
+            self.listener.response_expected(key)
+        return future
+
+    def resolve(self, key, value):
+        with self.__lock:
+            futures = self.__futures.get(key)
+            if not futures:
+                return False
+            future = futures.popleft()
+            if not futures:
+                del self.__futures[key]
 
-            request_timeout = request_dict["config"].get("timeout")
+        self.set_result_threadsafe(future, value)
+        return True
 
-            data = {"data": request_dict["config"]["data"]}
-            params = {
-                "method": request_dict["config"].get("HTTPMethod", "GET"),
-                "url": url,
-                "timeout": request_timeout,
-                "allow_redirects": request_dict["config"].get("allowRedirects", False),
-                "verify": request_dict["config"].get("SSLVerify"),
-                "auth": security,
-                **data,
-            }
-            logger.debug(url)
+    @staticmethod
+    def set_result_threadsafe(future, value):
+        try:
+            future.get_loop().call_soon_threadsafe(PendingResponses.__set_result, future, value)
+        except RuntimeError:
+            # The server loop is already closed
+            pass
 
-            if request_dict["config"].get("httpHeaders") is not None:
-                params["headers"] = request_dict["config"]["httpHeaders"]
+    @staticmethod
+    def __set_result(future, value):
+        if not future.done():
+            future.set_result(value)
 
-            logger.debug("Request to %s will be sent", url)
-            response = request_dict["request"](**params)
-            data_to_storage = [url, request_dict["config"]["uplink_converter"]]
+    def __discard(self, key, future):
+        with self.__lock:
+            futures = self.__futures.get(key)
+            if not futures or future not in futures:
+                return
+            futures.remove(future)
+            if not futures:
+                del self.__futures[key]
 
-            if response and response.ok:
-                try:
-                    data_to_storage.append(response.json())
-                except UnicodeDecodeError:
-                    data_to_storage.append(response.content)
-                except JSONDecodeError:
-                    data_to_storage.append(response.content)
-
-                if len(data_to_storage) == 3 and with_queue and not converter_queue.full():
-                    converter_queue.put(data_to_storage)
-                    self.statistics["MessagesReceived"] = self.statistics["MessagesReceived"] + 1
-            else:
-                logger.error("Request to URL: %s finished with code: %i. Cat information: http://http.cat/%i",
-                             url,
-                             response.status_code,
-                             response.status_code)
-                logger.debug("Response: %r", response.text)
-                data_to_storage.append({"error": response.reason, "code": response.status_code})
-
-                if with_queue:
-                    converter_queue.put(data_to_storage)
-
-                self.statistics["MessagesReceived"] = self.statistics["MessagesReceived"] + 1
-
-            if not with_queue:
-                return data_to_storage
-
-        except Timeout:
-            logger.error("Timeout error on request %s.", url)
-        except RequestException as e:
-            logger.error("Cannot connect to %s. Connection error.", url)
-            logger.debug(e)
-        except ConnectionError:
-            logger.error("Cannot connect to %s. Connection error.", url)
-        except Exception as e:
-            logger.exception(e)
+        if self.listener is not None:
+            self.listener.response_dropped(key)
 
 
 class BaseDataHandler:
-    responses_queue = Queue()
-    response_attribute_request = Queue()
-
-    def __init__(self, send_to_storage, name, endpoint, provider=None):
+    def __init__(self, send_to_storage, name, endpoint, provider=None, pending_responses=None):
         self.send_to_storage = send_to_storage
         self.__name = name
         self.__endpoint = endpoint
         self.__provider = provider
+        self.__pending_responses = pending_responses if pending_responses is not None else PendingResponses()
 
-        self.success_response = self.__endpoint['config'].get('response', {}).get('successResponse')
-        self.unsuccessful_response = self.__endpoint['config'].get('response', {}).get('unsuccessfulResponse')
-        self.response_expected = self.__endpoint['config'].get('response', {}).get('responseExpected', False)
+        response_config = self.__endpoint['config'].get('response', {})
+        self.success_response = response_config.get('successResponse')
+        self.unsuccessful_response = response_config.get('unsuccessfulResponse')
+        self.response_expected = response_config.get('responseExpected', False)
+        self.response_attribute = response_config.get('responseAttribute')
+        self.response_timeout = response_config.get('timeout', 120)
 
     @property
     def name(self):
@@ -389,38 +573,38 @@ class BaseDataHandler:
         if modify:
             data['attributes'].append({'responseExpected': True})
 
-    def get_response(self):
+    def expect_response(self, device_name):
+        """Registers the request for the response attribute of the device, must be called before the data is sent."""
         if self.response_expected:
-            time_point = time()
-            while not time() - time_point >= self.endpoint['config'].get('response', {}).get('timeout', 120):
-                if not BaseDataHandler.responses_queue.empty():
-                    response = BaseDataHandler.responses_queue.get()
-                    return web.Response(body=str(response), status=200)
-
-                sleep(.2)
+            return self.__pending_responses.create((device_name, self.response_attribute))
 
-            return web.Response(body=str(self.unsuccessful_response) if self.unsuccessful_response else None,
-                                status=408)
+    async def get_response(self, response_future=None):
+        if response_future is not None:
+            try:
+                response = await asyncio.wait_for(response_future, self.response_timeout)
+                return web.Response(body=str(response), status=200)
+            except asyncio.TimeoutError:
+                return web.Response(body=str(self.unsuccessful_response) if self.unsuccessful_response else None,
+                                    status=408)
 
         return web.Response(body=str(self.success_response) if self.success_response else None, status=200)
 
-    def process_attribute_request(self, data):
-        if self.processed_attribute_request(data):
-            time_point = time()
-            while not time() - time_point >= self.endpoint['config']['timeout']:
-                if not BaseDataHandler.response_attribute_request.empty():
-                    self.__provider('STATISTICS_MESSAGE_SEND')
-                    return web.Response(body=BaseDataHandler.response_attribute_request.get())
-
-                sleep(.2)
+    async def process_attribute_request(self, data):
+        response_future = asyncio.get_running_loop().create_future()
+        if self.processed_attribute_request(data, partial(self.attribute_request_callback, response_future)):
+            try:
+                content = await asyncio.wait_for(response_future, self.endpoint['config']['timeout'])
+            except asyncio.TimeoutError:
+                return web.Response(status=408)
 
-            return web.Response(status=408)
+            self.__provider('STATISTICS_MESSAGE_SEND')
+            return web.Response(body=dumps(content))
 
     @staticmethod
-    def attribute_request_callback(content, _):
-        BaseDataHandler.response_attribute_request.put(dumps(content))
+    def attribute_request_callback(response_future, content, _):
+        PendingResponses.set_result_threadsafe(response_future, content)
 
-    def processed_attribute_request(self, data):
+    def processed_attribute_request(self, data, callback):
         if self.__endpoint.get('type') == 'attributeRequest':
             device_name_tags = TBUtility.get_values(self.__endpoint['config'].get("deviceNameExpression"), data,
                                                     get_tag=True)
@@ -446,7 +630,7 @@ class BaseDataHandler:
             if found_attribute_names is None:
                 return False
 
-            self.__endpoint['function'](device_name, found_attribute_names, self.attribute_request_callback)
+            self.__endpoint['function'](device_name, found_attribute_names, callback)
             self.__provider('STATISTICS_MESSAGE_RECEIVED')
             return True
 
@@ -469,23 +653,27 @@ class AnonymousDataHandler(BaseDataHandler):
         data = json_data if json_data else dict(request.query)
 
         # check if request is Attribute Request type
-        result = self.process_attribute_request(data)
+        result = await self.process_attribute_request(data)
         if isinstance(result, web.Response):
             return result
 
+        response_future = None
         try:
             log.info("CONVERTER CONFIG: %r", endpoint_config['converter'])
             converter = self.endpoint['converter'](endpoint_config['converter'])
             converted_data = converter.convert(config=endpoint_config['converter'], data=data)
 
             self.modify_data_for_remote_response(converted_data, self.response_expected)
+            response_future = self.expect_response(converted_data['deviceName'])
 
             self.send_to_storage(self.name, converted_data)
             log.info("CONVERTED_DATA: %r", converted_data)
 
-            return self.get_response()
+            return await self.get_response(response_future)
         except Exception as e:
             log.exception("Error while post to anonymous handler: %s", e)
+            if response_future is not None:
+                response_future.cancel()
             return web.Response(body=str(self.success_response) if self.success_response else None, status=500)
 
 
@@ -517,23 +705,27 @@ class BasicDataHandler(BaseDataHandler):
             data = json_data if json_data else dict(request.query)
 
             # check if request is Attribute Request type
-            result = self.process_attribute_request(data)
+            result = await self.process_attribute_request(data)
             if isinstance(result, web.Response):
                 return result
 
+            response_future = None
             try:
                 log.info("CONVERTER CONFIG: %r", endpoint_config['converter'])
                 converter = self.endpoint['converter'](endpoint_config['converter'])
                 converted_data = converter.convert(config=endpoint_config['converter'], data=data)
 
                 self.modify_data_for_remote_response(converted_data, self.response_expected)
+                response_future = self.expect_response(converted_data['deviceName'])
 
                 self.send_to_storage(self.name, converted_data)
                 log.info("CONVERTED_DATA: %r", converted_data)
 
-                return self.get_response()
+                return await self.get_response(response_future)
             except Exception as e:
                 log.exception("Error while post to basic handler: %s", e)
+                if response_future is not None:
+                    response_future.cancel()
                 return web.Response(body=str(self.unsuccessful_response) if self.unsuccessful_response else None,
                                     status=500)
 
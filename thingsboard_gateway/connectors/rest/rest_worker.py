@@ -0,0 +1,137 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from itertools import count
+from threading import Event, Lock, Thread
+from types import SimpleNamespace
+
+from thingsboard_gateway.connectors.connector import log
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_BATCH_PERIOD = 10
+
+# Messages from workers to the connector
+DATA_MESSAGE = 'data'
+ATTRIBUTE_REQUEST_MESSAGE = 'attributeRequest'
+WORKER_STARTED_MESSAGE = 'workerStarted'
+RESPONSE_DROPPED_MESSAGE = 'responseDropped'
+# Messages from the connector to workers
+RESPONSES_MESSAGE = 'responses'
+ATTRIBUTE_RESPONSE_MESSAGE = 'attributeResponse'
+
+
+class RESTWorkerGateway:
+    """
+    Gateway of the REST connector that runs in a worker process. Converted data is sent to the connector in the
+    gateway process in batches, attribute requests are forwarded there and their responses are returned by request id.
+    It is also the listener of the worker pending responses. Keys of the responses a request waits for are sent with
+    its data, so the connector knows which worker waits for a response in the order the data is stored.
+    """
+
+    def __init__(self, number, uplink_queue, batch_size=DEFAULT_BATCH_SIZE, batch_period=DEFAULT_BATCH_PERIOD):
+        self.number = number
+        self.tb_client = SimpleNamespace(client=SimpleNamespace(
+            gw_request_client_attributes=lambda *args: self.__request_attributes('client', *args),
+            gw_request_shared_attributes=lambda *args: self.__request_attributes('shared', *args)))
+        self.__uplink_queue = uplink_queue
+        self.__batch_size = batch_size
+        self.__batch_period = batch_period / 1000
+        # Items are (data, keys of the responses expected for it)
+        self.__batch = []
+        self.__expected_keys = []
+        self.__batch_lock = Lock()
+        self.__request_ids = count(1)
+        self.__attribute_callbacks = {}
+        self.__stopped = Event()
+
+    def send_to_storage(self, connector_name, data):
+        with self.__batch_lock:
+            self.__batch.append((data, self.__expected_keys))
+            self.__expected_keys = []
+            if len(self.__batch) < self.__batch_size:
+                return
+            batch, self.__batch = self.__batch, []
+        self.__uplink_queue.put((DATA_MESSAGE, self.number, batch))
+
+    def flush(self):
+        with self.__batch_lock:
+            batch, self.__batch = self.__batch, []
+        if batch:
+            self.__uplink_queue.put((DATA_MESSAGE, self.number, batch))
+
+    def stop(self):
+        self.__stopped.set()
+
+    def server_started(self):
+        self.__uplink_queue.put((WORKER_STARTED_MESSAGE, self.number))
+
+    def response_expected(self, key):
+        with self.__batch_lock:
+            self.__expected_keys.append(key)
+
+    def response_dropped(self, key):
+        with self.__batch_lock:
+            if key in self.__expected_keys:
+                # The data of the request has not been sent
+                self.__expected_keys.remove(key)
+                return
+        self.__uplink_queue.put((RESPONSE_DROPPED_MESSAGE, self.number, key))
+
+    def process_batches(self):
+        while not self.__stopped.wait(self.__batch_period):
+            self.flush()
+
+    def process_downlink(self, connector, downlink_queue):
+        while not self.__stopped.is_set():
+            message = downlink_queue.get()
+            if message is None:
+                break
+
+            try:
+                if message[0] == RESPONSES_MESSAGE:
+                    _, device_name, responses = message
+                    connector.resolve_responses(device_name, responses)
+                elif message[0] == ATTRIBUTE_RESPONSE_MESSAGE:
+                    _, request_id, content, error = message
+                    callback = self.__attribute_callbacks.pop(request_id, None)
+                    if callback is not None:
+                        callback(content, error)
+            except Exception as e:
+                log.exception(e)
+
+    def __request_attributes(self, attribute_type, device_name, keys, callback):
+        request_id = next(self.__request_ids)
+        self.__attribute_callbacks[request_id] = callback
+        self.__uplink_queue.put((ATTRIBUTE_REQUEST_MESSAGE, self.number, request_id, attribute_type, device_name, keys))
+
+
+def run_worker(number, config, connector_type, uplink_queue, downlink_queue):
+    """Entry point of a worker process, serves the endpoints of the connector on the port shared by all workers."""
+    from thingsboard_gateway.connectors.rest.rest_connector import RESTConnector
+
+    gateway = RESTWorkerGateway(number, uplink_queue, config.get('workerBatchSize', DEFAULT_BATCH_SIZE),
+                                config.get('workerBatchPeriod', DEFAULT_BATCH_PERIOD))
+    connector = RESTConnector(gateway, {**config, 'name': '%s worker %i' % (config.get('name', 'REST Connector'),
+                                                                          number),
+                                        'workersCount': 1}, connector_type)
+    connector.pending_responses.listener = gateway
+    connector.on_server_started = gateway.server_started
+    Thread(target=gateway.process_batches, name='REST worker batches', daemon=True).start()
+    Thread(target=gateway.process_downlink, args=(connector, downlink_queue), name='REST worker downlink',
+           daemon=True).start()
+    try:
+        connector.run()
+    finally:
+        gateway.stop()
+        gateway.flush()
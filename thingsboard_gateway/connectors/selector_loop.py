@@ -0,0 +1,235 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+import selectors
+import socket
+from collections import deque
+from threading import Thread
+from time import monotonic
+
+from thingsboard_gateway.connectors.connector import log
+
+WAKEUP_BUFFER_SIZE = 4096
+
+
+class SelectorConnection:
+    """
+    TCP connection with its receive buffer (the framer, anything with feed(data) -> messages) and the queue of data
+    to send.
+    Any thread can send, the loop of the connection writes the data without blocking. Data sent before the loop
+    gets to the connection is coalesced and written with one call.
+    """
+
+    def __init__(self, sock, address, framer, request_flush, request_close, outbound=False):
+        self.socket = sock
+        self.address = address
+        self.framer = framer
+        self.outbound = outbound
+        self.closed = False
+        self.writing = False
+        self.flush_requested = False
+        self.last_activity = monotonic()
+        self.__outgoing = deque()
+        self.__pending = bytearray()
+        self.__request_flush = request_flush
+        self.__request_close = request_close
+
+    def getpeername(self):
+        return self.address
+
+    def send(self, data):
+        if self.closed:
+            raise ConnectionResetError('Connection %s:%s is closed' % self.address)
+        self.last_activity = monotonic()
+        self.__outgoing.append(bytes(data))
+        if not self.flush_requested:
+            self.flush_requested = True
+            self.__request_flush(self)
+
+    def close(self):
+        """Closes the connection after queued data is written, can be called from any thread."""
+        self.__request_close(self)
+
+    def flush(self) -> bool:
+        """Writes as much queued data as the socket accepts, returns True if nothing is left. Loop thread only."""
+        while self.__outgoing:
+            self.__pending += self.__outgoing.popleft()
+
+        if self.__pending:
+            try:
+                sent = self.socket.send(self.__pending)
+            except BlockingIOError:
+                sent = 0
+            del self.__pending[:sent]
+
+        return not self.__pending
+
+
+class SelectorLoop(Thread):
+    """
+    Selector loop that multiplexes many connections with non-blocking reads and writes.
+    Received data goes through the framer of the connection, whole messages are passed to
+    on_messages(connection, messages). Connectors build their servers and clients on it and keep only their protocol
+    handling.
+    """
+
+    def __init__(self, name, buffer_size, on_messages, on_close):
+        super().__init__(name=name, daemon=True)
+        self.stopped = False
+        self.bytes_received = 0
+        self.__buffer_size = buffer_size
+        self.__on_messages = on_messages
+        self.__on_close = on_close
+        self.__connections = {}
+        self.__new_connections = deque()
+        self.__flush_requests = deque()
+        self.__close_requests = deque()
+        self.__selector = selectors.DefaultSelector()
+        self.__wakeup_reader, self.__wakeup_writer = socket.socketpair()
+        self.__wakeup_reader.setblocking(False)
+        self.__wakeup_writer.setblocking(False)
+        self.__selector.register(self.__wakeup_reader, selectors.EVENT_READ, self.__process_requests)
+
+    def __len__(self):
+        return len(self.__connections)
+
+    def add_listener(self, sock, callback):
+        """Registers a listening or UDP socket, callback(sock, mask) is called in the loop. Before start only."""
+        sock.setblocking(False)
+        self.__selector.register(sock, selectors.EVENT_READ, callback)
+
+    def add_connection(self, sock, address, framer, outbound=False) -> SelectorConnection:
+        sock.setblocking(False)
+        connection = SelectorConnection(sock, address, framer, self.__request_flush, self.__request_close, outbound)
+        self.__new_connections.append(connection)
+        self.__wakeup()
+        return connection
+
+    def stop(self):
+        self.stopped = True
+        if self.is_alive():
+            self.__wakeup()
+        else:
+            self.__close_sockets()
+
+    def run(self):
+        try:
+            while not self.stopped:
+                for key, mask in self.__selector.select():
+                    key.data(key.fileobj, mask)
+        except Exception as e:
+            log.exception(e)
+        finally:
+            self.__close_sockets()
+
+    def __close_sockets(self):
+        for connection in list(self.__connections.values()):
+            self.__close(connection)
+        self.__selector.close()
+        self.__wakeup_reader.close()
+        self.__wakeup_writer.close()
+
+    def __wakeup(self):
+        try:
+            self.__wakeup_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            # Wakeup socket is full or the loop is already closed
+            pass
+
+    def __request_flush(self, connection):
+        self.__flush_requests.append(connection)
+        self.__wakeup()
+
+    def __request_close(self, connection):
+        self.__close_requests.append(connection)
+        self.__wakeup()
+
+    def __process_requests(self, wakeup_reader, mask):
+        try:
+            while wakeup_reader.recv(WAKEUP_BUFFER_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+
+        while self.__new_connections:
+            connection = self.__new_connections.popleft()
+            self.__connections[connection.socket] = connection
+            self.__selector.register(connection.socket, selectors.EVENT_READ, self.__receive)
+
+        while self.__flush_requests:
+            connection = self.__flush_requests.popleft()
+            # Cleared before the queue is drained, data sent after this point requests a new flush
+            connection.flush_requested = False
+            self.__flush(connection)
+
+        while self.__close_requests:
+            connection = self.__close_requests.popleft()
+            if connection.socket in self.__connections:
+                self.__flush(connection)
+                self.__close(connection)
+
+    def __receive(self, sock, mask):
+        connection = self.__connections[sock]
+        if mask & selectors.EVENT_WRITE:
+            self.__flush(connection)
+        if not mask & selectors.EVENT_READ or connection.closed:
+            return
+
+        try:
+            data = sock.recv(self.__buffer_size)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            log.debug('Connection %s error: %s', connection.address, e)
+            data = b''
+
+        if not data:
+            self.__close(connection)
+            return
+
+        self.bytes_received += len(data)
+        connection.last_activity = monotonic()
+        messages = connection.framer.feed(data)
+        if messages:
+            self.__on_messages(connection, messages)
+
+    def __flush(self, connection):
+        if connection.closed or connection.socket not in self.__connections:
+            return
+
+        try:
+            flushed = connection.flush()
+        except OSError as e:
+            log.debug('Connection %s error: %s', connection.address, e)
+            self.__close(connection)
+            return
+
+        # Wait for the socket to become writable only while there is something left to write
+        if flushed == connection.writing:
+            connection.writing = not flushed
+            events = selectors.EVENT_READ | selectors.EVENT_WRITE if connection.writing else selectors.EVENT_READ
+            self.__selector.modify(connection.socket, events, self.__receive)
+
+    def __close(self, connection):
+        if connection.closed:
+            return
+
+        connection.closed = True
+        self.__connections.pop(connection.socket, None)
+        try:
+            self.__selector.unregister(connection.socket)
+        except (KeyError, ValueError):
+            pass
+        connection.socket.close()
+        self.__on_close(connection)
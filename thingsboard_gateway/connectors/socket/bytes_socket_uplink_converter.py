@@ -19,10 +19,6 @@ from thingsboard_gateway.gateway.statistics_service import StatisticsService
 class BytesSocketUplinkConverter(SocketUplinkConverter):
     def __init__(self, config):
         self.__config = config
-        self.dict_result = {
-            "deviceName": config['deviceName'],
-            "deviceType": config['deviceType']
-        }
 
     @StatisticsService.CollectStatistics(start_stat_type='receivedBytesFromDevices',
                                          end_stat_type='convertedBytesFromDevice')
@@ -30,10 +26,15 @@ class BytesSocketUplinkConverter(SocketUplinkConverter):
         if data is None:
             return {}
 
-        try:
-            self.dict_result["telemetry"] = []
-            self.dict_result["attributes"] = []
+        # A new result every time, the previous one can still be in the storage queue
+        dict_result = {
+            "deviceName": self.__config['deviceName'],
+            "deviceType": self.__config['deviceType'],
+            "telemetry": [],
+            "attributes": []
+        }
 
+        try:
             for section in ('telemetry', 'attributes'):
                 for item in config[section]:
                     try:
@@ -49,7 +50,7 @@ class BytesSocketUplinkConverter(SocketUplinkConverter):
                             converted_data = str(converted_data)
 
                         if item.get('key') is not None:
-                            self.dict_result[section].append(
+                            dict_result[section].append(
                                 {item['key']: converted_data})
                         else:
                             log.error('Key for %s not found in config: %s', config['type'], config['section_config'])
@@ -58,5 +59,5 @@ class BytesSocketUplinkConverter(SocketUplinkConverter):
         except Exception as e:
             log.exception(e)
 
-        log.debug(self.dict_result)
-        return self.dict_result
+        log.debug(dict_result)
+        return dict_result
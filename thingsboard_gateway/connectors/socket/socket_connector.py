@@ -13,12 +13,13 @@
 #     limitations under the License.
 
 import socket
-from queue import Queue
+from collections import defaultdict
+from queue import Empty, SimpleQueue
 from random import choice
-from re import findall
+from re import compile as compile_regex
 from string import ascii_lowercase
-from threading import Thread
-from time import sleep
+from threading import Lock, Thread
+from time import monotonic, sleep
 
 from simplejson import dumps
 
@@ -26,12 +27,20 @@ from thingsboard_gateway.connectors.connector import Connector, log
 from thingsboard_gateway.tb_utility.tb_loader import TBModuleLoader
 from thingsboard_gateway.gateway.statistics_service import StatisticsService
 from thingsboard_gateway.connectors.socket.socket_decorators import CustomCollectStatistics
+from thingsboard_gateway.connectors.socket.socket_framing import create_framer
+from thingsboard_gateway.connectors.selector_loop import SelectorLoop
 
 SOCKET_TYPE = {
     'TCP': socket.SOCK_STREAM,
     'UDP': socket.SOCK_DGRAM
 }
 DEFAULT_UPLINK_CONVERTER = 'BytesSocketUplinkConverter'
+STATISTICS_PERIOD = 1
+MESSAGE_WAIT_TIMEOUT = 1
+MAX_MESSAGES_PER_BATCH = 100
+DEFAULT_OUTBOUND_IDLE_TIMEOUT = 60
+DEFAULT_CONNECT_TIMEOUT = 5
+INDEX_EXPRESSION = compile_regex(r'\[[^\s][0-9:]*]')
 
 
 class SocketConnector(Connector, Thread):
@@ -41,7 +50,9 @@ class SocketConnector(Connector, Thread):
         self.__config = config
         self._connector_type = connector_type
         self.statistics = {'MessagesReceived': 0,
-                           'MessagesSent': 0}
+                           'MessagesSent': 0,
+                           'ConnectionsCount': 0,
+                           'BytesReceivedPerSecond': 0}
         self.__gateway = gateway
         self.setName(config.get("name", 'TCP Connector ' + ''.join(choice(ascii_lowercase) for _ in range(5))))
         self.daemon = True
@@ -53,11 +64,33 @@ class SocketConnector(Connector, Thread):
         self.__socket_port = config['port']
         self.__socket_buff_size = config['bufferSize']
         self.__socket = socket.socket(socket.AF_INET, SOCKET_TYPE[self.__socket_type])
-        self.__converting_requests = Queue(-1)
+        if self.__socket_type == 'TCP':
+            # Connections of the previous run in TIME_WAIT do not block the restart
+            self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Messages of one peer always go to the same converter worker, so they keep their order and one converter
+        # is never used by two threads at once
+        self.__converting_queues = [SimpleQueue() for _ in range(max(int(config.get('workersCount', 4)), 1))]
 
+        self.__devices_by_name = {}
         self.__devices = self.__convert_devices_list()
         self.__connections = {}
 
+        # All connections are multiplexed by a few selector loops, the first one also accepts connections
+        # (or receives datagrams). Messages are split from the stream by the framing config.
+        self.__framing = config.get('framing', {})
+        self.__loops = [SelectorLoop('%s Loop %i' % (self.name, number), self.__socket_buff_size,
+                                     self.__on_messages, self.__on_connection_closed)
+                        for number in range(max(int(config.get('loopsCount', 1)), 1))]
+        self.__next_loop = 0
+        self.__udp_bytes_received = 0
+
+        # Downlink to devices that are not connected reuses outbound connections until they are idle
+        self.__outbound_idle_timeout = config.get('outboundIdleTimeout', DEFAULT_OUTBOUND_IDLE_TIMEOUT)
+        self.__connect_timeout = config.get('connectTimeout', DEFAULT_CONNECT_TIMEOUT)
+        # Only writers to the same device wait for its connect, the global lock guards the locks and the loop choice
+        self.__connect_lock = Lock()
+        self.__address_locks = defaultdict(Lock)
+
     def __convert_devices_list(self):
         devices = self.__config.get('devices', [])
 
@@ -69,17 +102,25 @@ class SocketConnector(Connector, Thread):
                 {'deviceName': device['deviceName'],
                  'deviceType': device.get('deviceType', 'default')}) if module else None
             device['converter'] = converter
+            device['converterConfig'] = {
+                'encoding': device.get('encoding', 'utf-8').lower(),
+                'telemetry': device.get('telemetry', []),
+                'attributes': device.get('attributes', [])
+            }
 
             # validate attributeRequests requestExpression
             attr_requests = device.get('attributeRequests', [])
             device['attributeRequests'] = self.__validate_attr_requests(attr_requests)
+            device['attributeRequestsIndex'] = self.__index_attr_requests(device['attributeRequests'])
             if len(device['attributeRequests']):
                 self.__attribute_type = {
                     'client': self.__gateway.tb_client.client.gw_request_client_attributes,
                     'shared': self.__gateway.tb_client.client.gw_request_shared_attributes
                 }
 
-            converted_devices[address] = device
+            host, port = address.split(':')
+            converted_devices[(host, int(port))] = device
+            self.__devices_by_name[device['deviceName']] = device
 
         return converted_devices
 
@@ -94,35 +135,48 @@ class SocketConnector(Connector, Thread):
         log.error("Cannot find converter for %s device", self.name)
         return None
 
+    @staticmethod
+    def __compile_index(expression):
+        """'[from:to]' or '[index]' expression -> slice of the data"""
+        indexes = expression[1:-1].split(':')
+        if len(indexes) == 2:
+            return slice(*(int(index) if index != '' else None for index in indexes))
+        index = int(indexes[0])
+        return slice(index, index + 1 if index != -1 else None)
+
     def __validate_attr_requests(self, attr_requests):
+        """Compiles request and attribute name expressions into slices and byte patterns once."""
         validated_attrs = []
         for attr in attr_requests:
             valid_attr = False
+            try:
+                attr['attributeNameSlices'] = [self.__compile_index(expression) for expression in
+                                               INDEX_EXPRESSION.findall(attr.get('attributeNameExpression', ''))]
+            except ValueError:
+                self.__log.error(f'{attr.get("attributeNameExpression")} not valid expression')
+                continue
+
             if attr['requestExpression'] != '':
                 if '${' in attr['requestExpression'] and '}' in attr['requestExpression']:
                     if '==' in attr['requestExpression']:
-                        expression_arr = findall(r'\[[^\s][0-9:]*]', attr['requestExpression'])
+                        expression_arr = INDEX_EXPRESSION.findall(attr['requestExpression'])
                         if expression_arr:
-                            indexes = expression_arr[0][1:-1].split(':')
-                            if len(indexes) == 2:
-                                from_index, to_index = indexes
-                                attr['requestIndexFrom'] = from_index
-                                attr['requestIndexTo'] = to_index
-                            else:
-                                attr['requestIndex'] = int(indexes[0])
-
-                            attr['haveIndex'] = True
                             try:
-                                attr['requestEqual'] = attr['requestExpression'].split('==')[-1][:-1]
-                            except IndexError:
-                                self.__log.error(f'{attr["requestExpression"]} not valid. Index out of range.')
+                                attr['requestSlice'] = self.__compile_index(expression_arr[0])
+                            except ValueError:
+                                self.__log.error(f'{attr["requestExpression"]} not valid. Index is not a number.')
                                 continue
 
+                            attr['haveIndex'] = True
+                            attr['requestEqual'] = attr['requestExpression'].split('==')[-1][:-1].encode('utf-8')
                             valid_attr = True
                             validated_attrs.append(attr)
                 else:
                     valid_attr = True
                     attr['haveIndex'] = False
+                    # Without index the whole packet is compared with the expression
+                    attr['requestSlice'] = slice(None)
+                    attr['requestEqual'] = attr['requestExpression'].encode('utf-8')
                     validated_attrs.append(attr)
 
             if not valid_attr:
@@ -130,6 +184,19 @@ class SocketConnector(Connector, Thread):
 
         return validated_attrs
 
+    @staticmethod
+    def __index_attr_requests(attr_requests):
+        """
+        Groups requests by the compared part of the packet: (slice, {bytes of the part: requests}).
+        A packet is checked with one dictionary lookup per distinct slice instead of every request.
+        """
+        index = {}
+        for attr in attr_requests:
+            request_slice = attr['requestSlice']
+            _, patterns = index.setdefault((request_slice.start, request_slice.stop), (request_slice, {}))
+            patterns.setdefault(attr['requestEqual'], []).append(attr)
+        return tuple(index.values())
+
     def open(self):
         self.__stopped = False
         self.start()
@@ -137,10 +204,11 @@ class SocketConnector(Connector, Thread):
     def run(self):
         self._connected = True
 
-        converting_thread = Thread(target=self.__process_data, daemon=True, name='Converter Thread')
-        converting_thread.start()
+        for number, converting_queue in enumerate(self.__converting_queues):
+            Thread(target=self.__process_data, args=(converting_queue,), daemon=True,
+                   name='Converter Thread %i' % number).start()
 
-        while not self.__bind:
+        while not self.__bind and not self.__stopped:
             try:
                 self.__socket.bind((self.__socket_address, self.__socket_port))
             except OSError:
@@ -150,127 +218,152 @@ class SocketConnector(Connector, Thread):
                 self.__bind = True
 
         if self.__socket_type == 'TCP':
-            self.__socket.listen(5)
+            self.__socket.listen(socket.SOMAXCONN)
+            self.__loops[0].add_listener(self.__socket, self.__accept)
+        else:
+            self.__loops[0].add_listener(self.__socket, self.__receive_datagrams)
+
+        for loop in self.__loops:
+            loop.start()
 
         self.__log.info('%s socket is up', self.__socket_type)
 
+        bytes_received = 0
+        started = monotonic()
         while not self.__stopped:
-            try:
-                if self.__socket_type == 'TCP':
-                    conn, address = self.__socket.accept()
-                    self.__connections[address] = conn
-
-                    self.__log.debug('New connection %s established', address)
-                    thread = Thread(target=self.__process_tcp_connection, daemon=True,
-                                    name=f'Processing {address} connection',
-                                    args=(conn, address))
-                    thread.start()
-                else:
-                    data, client_address = self.__socket.recvfrom(self.__socket_buff_size)
-                    self.__converting_requests.put((client_address, data))
-            except ConnectionAbortedError:
-                self.__socket.close()
+            sleep(STATISTICS_PERIOD)
+            total = sum(loop.bytes_received for loop in self.__loops) + self.__udp_bytes_received
+            now = monotonic()
+            self.statistics['ConnectionsCount'] = len(self.__connections)
+            self.statistics['BytesReceivedPerSecond'] = int((total - bytes_received) / (now - started))
+            bytes_received, started = total, now
+            self.__close_idle_connections(now)
+
+    def __close_idle_connections(self, now):
+        for connection in list(self.__connections.values()):
+            if connection.outbound and now - connection.last_activity > self.__outbound_idle_timeout:
+                self.__log.debug('Outbound connection %s is idle, closing', connection.address)
+                connection.close()
+
+    def __add_connection(self, sock, address, outbound=False):
+        with self.__connect_lock:
+            loop = self.__loops[self.__next_loop]
+            self.__next_loop = (self.__next_loop + 1) % len(self.__loops)
+        connection = loop.add_connection(sock, address, create_framer(self.__framing), outbound)
+        self.__connections[address] = connection
+        return connection
+
+    def __accept(self, server, mask):
+        try:
+            conn, address = server.accept()
+        except (BlockingIOError, ConnectionAbortedError):
+            return
+
+        self.__add_connection(conn, address)
+        self.__log.debug('New connection %s established', address)
 
-    def __process_tcp_connection(self, connection, address):
+    def __receive_datagrams(self, sock, mask):
+        while True:
+            try:
+                data, client_address = sock.recvfrom(self.__socket_buff_size)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                self.__log.debug('UDP socket error: %s', e)
+                return
+            self.__udp_bytes_received += len(data)
+            self.__converting_queues[hash(client_address) % len(self.__converting_queues)].put((client_address, data))
+
+    def __on_messages(self, connection, messages):
+        address = connection.address
+        converting_queue = self.__converting_queues[hash(address) % len(self.__converting_queues)]
+        for message in messages:
+            converting_queue.put((address, message))
+
+    def __on_connection_closed(self, connection):
+        if self.__connections.get(connection.address) is connection:
+            del self.__connections[connection.address]
+        self.__log.debug('Connection %s closed', connection.address)
+
+    def __process_data(self, converting_queue):
         while not self.__stopped:
-            data = connection.recv(self.__socket_buff_size)
+            try:
+                messages = [converting_queue.get(timeout=MESSAGE_WAIT_TIMEOUT)]
+            except Empty:
+                continue
 
-            if data:
-                self.__converting_requests.put((address, data))
-            else:
-                break
+            # Messages that are already queued are handled without waiting on the queue again
+            while len(messages) < MAX_MESSAGES_PER_BATCH:
+                try:
+                    messages.append(converting_queue.get_nowait())
+                except Empty:
+                    break
 
-        connection.close()
-        self.__connections.pop(address)
-        self.__log.debug('Connection %s closed', address)
+            for address, data in messages:
+                try:
+                    self.__process_message(address, data)
+                except Exception as e:
+                    self.__log.exception(e)
 
-    def __process_data(self):
-        while not self.__stopped:
-            if not self.__converting_requests.empty():
-                (address, port), data = self.__converting_requests.get()
-
-                device = self.__devices.get(f'{address}:{port}', None)
-                if not device:
-                    self.__log.error('Can\'t convert data from %s:%s - not in config file', address, port)
-
-                # check data for attribute requests
-                is_attribute_request = False
-                attr_requests = device.get('attributeRequests', [])
-                if len(attr_requests):
-                    for attr in attr_requests:
-                        equal = data
-                        if attr['haveIndex']:
-                            if attr.get('requestIndexFrom') and attr.get('requestIndexTo'):
-                                index_from = int(attr['requestIndexFrom']) if attr['requestIndexFrom'] != '' else None
-                                index_to = int(attr['requestIndexTo']) if attr['requestIndexTo'] != '' else None
-                                equal = data[index_from:index_to]
-                            else:
-                                equal = data[int(attr['requestIndex'])]
-
-                        if attr['requestEqual'] == equal.decode('utf-8'):
-                            is_attribute_request = True
-                            self.__process_attribute_request(device['deviceName'], attr, data)
-
-                    if is_attribute_request:
-                        continue
-
-                self.__convert_data(device, data)
-
-            sleep(.2)
+    def __process_message(self, address, data):
+        device = self.__devices.get(address)
+        if not device:
+            self.__log.error('Can\'t convert data from %s:%s - not in config file', *address)
+            return
+
+        # check data for attribute requests
+        is_attribute_request = False
+        for request_slice, patterns in device['attributeRequestsIndex']:
+            for attr in patterns.get(data[request_slice], ()):
+                is_attribute_request = True
+                self.__process_attribute_request(device['deviceName'], attr, data)
+
+        if is_attribute_request:
+            return
+
+        self.__convert_data(device, data)
 
     def __convert_data(self, device, data):
-        address, port = device['address'].split(':')
         converter = device['converter']
         if not converter:
-            self.__log.error('Converter not found for %s:%s', address, port)
+            self.__log.error('Converter not found for %s', device['address'])
+            return
 
         try:
-            device_config = {
-                'encoding': device.get('encoding', 'utf-8').lower(),
-                'telemetry': device.get('telemetry', []),
-                'attributes': device.get('attributes', [])
-            }
-            converted_data = converter.convert(device_config, data)
+            converted_data = converter.convert(device['converterConfig'], data)
 
             self.statistics['MessagesReceived'] = self.statistics['MessagesReceived'] + 1
 
             if converted_data is not None:
                 self.__gateway.send_to_storage(self.get_name(), converted_data)
                 self.statistics['MessagesSent'] = self.statistics['MessagesSent'] + 1
-                log.info('Data to ThingsBoard %s', converted_data)
+                log.debug('Data to ThingsBoard %s', converted_data)
         except Exception as e:
             self.__log.exception(e)
 
     def __process_attribute_request(self, device_name, attr, data):
-        expression_arr = findall(r'\[[^\s][0-9:]*]', attr['attributeNameExpression'])
-
         found_attributes = []
-        if expression_arr:
-            for exp in expression_arr:
-                indexes = exp[1:-1].split(':')
+        for name_slice in attr['attributeNameSlices']:
+            attribute = data[name_slice]
+            if not attribute and name_slice.start is not None and name_slice.start >= len(data):
+                self.__log.error('Data length not valid due to attributeNameExpression')
+                return
 
-                try:
-                    if len(indexes) == 2:
-                        from_index, to_index = indexes
-                        attribute = data[int(from_index) if from_index != '' else None:int(
-                            to_index) if to_index != '' else None]
-                    else:
-                        attribute = data[int(indexes[0])]
-
-                    found_attributes.append(attribute.decode('utf-8'))
-                except IndexError:
-                    self.__log.error('Data length not valid due to attributeNameExpression')
-                    return
+            try:
+                found_attributes.append(attribute.decode('utf-8'))
+            except UnicodeDecodeError:
+                self.__log.error('Attribute name %s is not valid UTF-8', attribute)
+                return
 
         self.statistics['MessagesReceived'] = self.statistics['MessagesReceived'] + 1
         self.__attribute_type[attr['type']](device_name, found_attributes, self.__attribute_request_callback)
 
     def __attribute_request_callback(self, response, _):
-        device = response.get('device')
+        device = self.__devices_by_name.get(response.get('device'))
         if not device:
             self.__log.error('Attribute request does\'t return device name')
+            return
 
-        device = tuple(filter(lambda item: item['deviceName'] == device, self.__config['devices']))[0]
         address, port = device['address'].split(':')
 
         value = response.get('value') or response.get('values')
@@ -285,6 +378,12 @@ class SocketConnector(Connector, Thread):
     def close(self):
         self.__stopped = True
         self._connected = False
+        for loop in self.__loops:
+            loop.stop()
+        for loop in self.__loops:
+            if loop.is_alive():
+                loop.join(timeout=1)
+        self.__socket.close()
         self.__connections = {}
 
     def get_name(self):
@@ -293,70 +392,81 @@ class SocketConnector(Connector, Thread):
     def is_connected(self):
         return self._connected
 
+    def __get_connection(self, address):
+        """Connection of the device: the one it opened, otherwise an outbound one from the pool."""
+        connection = self.__connections.get(address)
+        if connection is not None and not connection.closed:
+            return connection
+
+        with self.__connect_lock:
+            address_lock = self.__address_locks[address]
+
+        with address_lock:
+            connection = self.__connections.get(address)
+            if connection is None or connection.closed:
+                sock = socket.create_connection(address, timeout=self.__connect_timeout)
+                connection = self.__add_connection(sock, address, outbound=True)
+                self.__log.debug('Outbound connection %s established', address)
+            return connection
+
     @CustomCollectStatistics(start_stat_type='allBytesSentToDevices')
     def __write_value_via_tcp(self, address, port, value):
         try:
-            self.__connections[(address, int(port))].sendall(value)
+            self.__get_connection((address, int(port))).send(value)
             return 'ok'
-        except KeyError:
-            try:
-                new_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                new_socket.connect((address, int(port)))
-                new_socket.sendall(value)
-                new_socket.close()
-                return 'ok'
-            except ConnectionRefusedError as e:
-                self.__log.error('Can\'t connect to %s:%s', address, port)
-                self.__log.exception(e)
-                return e
+        except OSError as e:
+            self.__log.error('Can\'t connect to %s:%s', address, port)
+            self.__log.exception(e)
+            return e
 
-    @staticmethod
-    @StatisticsService.CollectStatistics(start_stat_type='allBytesSentToDevices')
-    def __write_value_via_udp(address, port, value):
-        new_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        new_socket.sendto(value, (address, int(port)))
-        new_socket.close()
+    @CustomCollectStatistics(start_stat_type='allBytesSentToDevices')
+    def __write_value_via_udp(self, address, port, value):
+        # Datagrams go from the connector socket, devices see replies from the port they send to
+        try:
+            self.__socket.sendto(value, (address, int(port)))
+        except OSError as e:
+            self.__log.error('Can\'t send datagram to %s:%s: %s', address, port, e)
 
     @StatisticsService.CollectAllReceivedBytesStatistics(start_stat_type='allReceivedBytesFromTB')
     def on_attributes_update(self, content):
-        try:
-            device = tuple(filter(lambda item: item['deviceName'] == content['device'], self.__config['devices']))[0]
-
-            for attribute_update_config in device['attributeUpdates']:
-                for attribute_update in content['data']:
-                    if attribute_update_config['attributeOnThingsBoard'] == attribute_update:
-                        address, port = device['address'].split(':')
-                        encoding = device.get('encoding', 'utf-8').lower()
-                        converted_data = bytes(str(content['data'][attribute_update]), encoding=encoding)
-                        self.__write_value_via_tcp(address, port, converted_data)
-        except IndexError:
+        device = self.__devices_by_name.get(content['device'])
+        if device is None:
             self.__log.error('Device not found')
+            return
+
+        for attribute_update_config in device['attributeUpdates']:
+            for attribute_update in content['data']:
+                if attribute_update_config['attributeOnThingsBoard'] == attribute_update:
+                    address, port = device['address'].split(':')
+                    encoding = device.get('encoding', 'utf-8').lower()
+                    converted_data = bytes(str(content['data'][attribute_update]), encoding=encoding)
+                    self.__write_value_via_tcp(address, port, converted_data)
 
     @StatisticsService.CollectAllReceivedBytesStatistics(start_stat_type='allReceivedBytesFromTB')
     def server_side_rpc_handler(self, content):
-        try:
-            device = tuple(filter(lambda item: item['deviceName'] == content['device'], self.__config['devices']))[0]
-
-            for rpc_config in device['serverSideRpc']:
-                for (key, value) in content['data'].items():
-                    if value == rpc_config['methodRPC']:
-                        rpc_method = rpc_config['methodProcessing']
-                        return_result = rpc_config['withResponse']
-                        result = None
-
-                        address, port = device['address'].split(':')
-                        encoding = device.get('encoding', 'utf-8').lower()
-                        converted_data = bytes(str(content['data']['params']), encoding=encoding)
-
-                        if rpc_method.upper() == 'WRITE':
-                            if self.__socket_type == 'TCP':
-                                result = self.__write_value_via_tcp(address, port, converted_data)
-                            else:
-                                self.__write_value_via_udp(address, port, converted_data)
-
-                        if return_result and self.__socket_type == 'TCP':
-                            self.__gateway.send_rpc_reply(content['device'], content['data']['id'], str(result))
-
-                        return
-        except IndexError:
+        device = self.__devices_by_name.get(content['device'])
+        if device is None:
             self.__log.error('Device not found')
+            return
+
+        for rpc_config in device['serverSideRpc']:
+            for (key, value) in content['data'].items():
+                if value == rpc_config['methodRPC']:
+                    rpc_method = rpc_config['methodProcessing']
+                    return_result = rpc_config['withResponse']
+                    result = None
+
+                    address, port = device['address'].split(':')
+                    encoding = device.get('encoding', 'utf-8').lower()
+                    converted_data = bytes(str(content['data']['params']), encoding=encoding)
+
+                    if rpc_method.upper() == 'WRITE':
+                        if self.__socket_type == 'TCP':
+                            result = self.__write_value_via_tcp(address, port, converted_data)
+                        else:
+                            self.__write_value_via_udp(address, port, converted_data)
+
+                    if return_result and self.__socket_type == 'TCP':
+                        self.__gateway.send_rpc_reply(content['device'], content['data']['id'], str(result))
+
+                    return
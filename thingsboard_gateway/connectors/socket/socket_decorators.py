@@ -10,6 +10,6 @@ class CustomCollectStatistics(StatisticsService.CollectStatistics):
             except ValueError:
                 pass
 
-            func(*args, **kwargs)
+            return func(*args, **kwargs)
 
         return inner
@@ -0,0 +1,105 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from codecs import escape_decode
+
+from thingsboard_gateway.connectors.connector import log
+
+DEFAULT_MAX_FRAME_SIZE = 65536
+
+
+class StreamFramer:
+    """Every received chunk is a message, the behaviour of the connector without framing config."""
+
+    def __len__(self):
+        return 0
+
+    def feed(self, data) -> list:
+        return [bytes(data)]
+
+
+class DelimiterFramer(StreamFramer):
+    """Messages end with the delimiter, the delimiter is not a part of the message."""
+
+    def __init__(self, delimiter, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        self.__delimiter = delimiter
+        self.__max_frame_size = max_frame_size
+        self.__buffer = bytearray()
+
+    def __len__(self):
+        return len(self.__buffer)
+
+    def feed(self, data) -> list:
+        buffer = self.__buffer
+        buffer += data
+        frames = buffer.split(self.__delimiter)
+        buffer[:] = frames.pop()
+        if len(buffer) > self.__max_frame_size:
+            log.warning('Message is longer than %i bytes without delimiter, %i bytes dropped',
+                        self.__max_frame_size, len(buffer))
+            buffer.clear()
+        return [bytes(frame) for frame in frames]
+
+
+class LengthPrefixFramer(StreamFramer):
+    """Messages start with their length, the length field is not a part of the message."""
+
+    def __init__(self, field_size=2, byteorder='big', includes_field=False, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        self.__field_size = field_size
+        self.__byteorder = byteorder
+        self.__adjustment = field_size if includes_field else 0
+        self.__max_frame_size = max_frame_size
+        self.__buffer = bytearray()
+
+    def __len__(self):
+        return len(self.__buffer)
+
+    def feed(self, data) -> list:
+        buffer = self.__buffer
+        buffer += data
+        field_size = self.__field_size
+
+        frames = []
+        position = 0
+        while len(buffer) - position >= field_size:
+            size = int.from_bytes(buffer[position:position + field_size], self.__byteorder) - self.__adjustment
+            if not 0 <= size <= self.__max_frame_size:
+                # The stream can not be resynced without a length, what is received is dropped
+                log.warning('Wrong message length %i, %i bytes dropped', size, len(buffer) - position)
+                position = len(buffer)
+                break
+
+            end = position + field_size + size
+            if end > len(buffer):
+                break
+            frames.append(bytes(buffer[position + field_size:end]))
+            position = end
+
+        if position:
+            del buffer[:position]
+        return frames
+
+
+def create_framer(config):
+    """Framer of one connection from the framing section of the connector configuration."""
+    framing_type = config.get('type', 'none').lower()
+    max_frame_size = config.get('maxFrameSize', DEFAULT_MAX_FRAME_SIZE)
+    if framing_type == 'delimiter':
+        # The delimiter is written as a JSON string with escape sequences, e.g. "\r\n" or "\x03"
+        delimiter, _ = escape_decode(config.get('delimiter', '\n').encode('utf-8'))
+        return DelimiterFramer(delimiter, max_frame_size)
+    if framing_type == 'length':
+        return LengthPrefixFramer(config.get('lengthFieldSize', 2), config.get('byteorder', 'big'),
+                                  config.get('lengthIncludesField', False), max_frame_size)
+    return StreamFramer()
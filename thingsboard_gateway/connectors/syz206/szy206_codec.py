@@ -0,0 +1,334 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+
+from thingsboard_gateway.tb_utility.bcd import BCD_TABLE, bcd_le_to_int
+
+# 68H, length of the user data area, 68H, user data area (control, address, AFN, data), CRC, 16H
+START_BYTE = 0x68
+END_BYTE = 0x16
+HEADER_SIZE = 3
+TRAILER_SIZE = 2
+ADDRESS_SIZE = 5
+CONTROL_OFFSET = HEADER_SIZE
+ADDRESS_OFFSET = CONTROL_OFFSET + 1
+AFN_OFFSET = ADDRESS_OFFSET + ADDRESS_SIZE
+DATA_OFFSET = AFN_OFFSET + 1
+# Control, address and AFN
+MIN_USER_DATA_SIZE = DATA_OFFSET - HEADER_SIZE
+MAX_USER_DATA_SIZE = 0xFF
+
+# Control byte: D7 direction (1 - from the station), D6 division, D5-D4 frame count, D3-D0 function code
+DIRECTION_UP = 0x80
+DIVISION = 0x40
+FUNCTION_CODE_MASK = 0x0F
+
+# Reported data ends with the 4 bytes of alarm and status bits and optionally the 5 bytes time label
+# (second, minute, hour, day in BCD and the allowed delay)
+STATUS_SIZE = 4
+TIME_LABEL_SIZE = 5
+WATER_QUALITY_MASK_SIZE = 5
+
+LINK_CHECK = 0x02
+QUERY_WATER_AMOUNT = 0x55
+QUERY_REMAINING_WATER = 0x56
+QUERY_STATUS = 0x5E
+QUERY_PUMP = 0x5F
+ALARM_REPORT = 0x81
+QUERY_REALTIME = 0xB0
+QUERY_MEMORY_REPORT = 0xB2
+REALTIME_REPORT = 0xC0
+
+# AFN -> name, the center station only receives responses and reports, the other functions are logged
+FUNCTIONS = {
+    0x02: 'linkCheck',
+    0x10: 'setAddress',
+    0x11: 'setClock',
+    0x12: 'setWorkMode',
+    0x15: 'setRecharge',
+    0x16: 'setRemainingWaterAlarm',
+    0x17: 'setWaterLevelLimits',
+    0x18: 'setWaterPressureLimits',
+    0x19: 'setWaterQualityUpperLimits',
+    0x1A: 'setWaterQualityLowerLimits',
+    0x1B: 'setWaterMeterBase',
+    0x1C: 'setRelayPreambleLength',
+    0x1D: 'setRelayForwardAddresses',
+    0x1E: 'setRelaySwitchMode',
+    0x1F: 'setFlowUpperLimits',
+    0x20: 'setReportThresholds',
+    0x30: 'enableIcCard',
+    0x31: 'disableIcCard',
+    0x32: 'enableFixedValueControl',
+    0x33: 'disableFixedValueControl',
+    0x34: 'setFixedValue',
+    0x50: 'queryAddress',
+    0x51: 'queryClock',
+    0x52: 'queryWorkMode',
+    0x53: 'queryReportTypes',
+    0x54: 'queryRealtimeTypes',
+    0x55: 'queryWaterAmount',
+    0x56: 'queryRemainingWater',
+    0x57: 'queryWaterLevelLimits',
+    0x58: 'queryWaterPressureLimits',
+    0x59: 'queryWaterQualityUpperLimits',
+    0x5A: 'queryWaterQualityLowerLimits',
+    0x5D: 'queryEventRecords',
+    0x5E: 'queryStatus',
+    0x5F: 'queryPump',
+    0x60: 'queryRelayPreambleLength',
+    0x61: 'queryImageRecords',
+    0x62: 'queryRelayForwardAddresses',
+    0x63: 'queryRelayStatus',
+    0x64: 'queryFlowUpperLimits',
+    0x81: 'alarmReport',
+    0x82: 'manualInput',
+    0x90: 'reset',
+    0x91: 'clearHistory',
+    0x92: 'startPump',
+    0x93: 'stopPump',
+    0x94: 'switchCommunication',
+    0x95: 'switchRelay',
+    0x96: 'changePassword',
+    0xA0: 'setRealtimeTypes',
+    0xA1: 'setReportTypes',
+    0xB0: 'queryRealtime',
+    0xB1: 'queryStoredData',
+    0xB2: 'queryMemoryReport',
+    0xC0: 'realtimeReport',
+}
+# Frames the station waits a confirmation for
+ACK_FUNCTIONS = frozenset((LINK_CHECK, ALARM_REPORT, REALTIME_REPORT))
+
+# Value of a data element: little-endian packed BCD, the high nibble of the last byte of signed values is the sign
+Element = namedtuple('Element', ('key', 'size', 'decimal_places', 'signed'))
+
+# Function code of the control byte -> elements of one measuring point, frames carry one or more points
+DATA_TYPES = {
+    1: (Element('rainfall', 3, 1, False),),
+    2: (Element('waterLevel', 4, 3, True),),
+    3: (Element('flow', 5, 3, True), Element('countFlow', 5, 0, True)),
+    4: (Element('velocity', 3, 3, True),),
+    5: (Element('gatePosition', 3, 2, False),),
+    6: (Element('power', 3, 0, False),),
+    7: (Element('airPressure', 3, 0, False),),
+    8: (Element('windSpeed', 3, 2, False),),
+    9: (Element('waterTemperature', 2, 1, False),),
+    # Water quality frames list their parameters in a bit mask, see WATER_QUALITY
+    10: (),
+    11: (Element('soilMoisture', 2, 1, False),),
+    12: (Element('evaporation', 3, 1, False),),
+    # Alarm and status frames carry only the status bits
+    13: (),
+    14: (Element('statisticRainfall', 3, 1, False),),
+    15: (Element('waterPressure', 4, 2, False),),
+}
+WATER_QUALITY_TYPE = 10
+
+# Bit of the water quality mask -> parameter
+WATER_QUALITY = (
+    Element('waterTemperature', 4, 1, False),
+    Element('ph', 4, 2, False),
+    Element('dissolvedOxygen', 4, 1, False),
+    Element('permanganateIndex', 4, 1, False),
+    Element('conductivity', 4, 0, False),
+    Element('redoxPotential', 4, 1, False),
+    Element('turbidity', 4, 0, False),
+    Element('cod', 4, 1, False),
+    Element('bod5', 4, 1, False),
+    Element('ammoniaNitrogen', 4, 2, False),
+    Element('totalNitrogen', 4, 2, False),
+    Element('copper', 4, 4, False),
+    Element('zinc', 4, 4, False),
+    Element('fluoride', 4, 2, False),
+    Element('selenium', 4, 5, False),
+    Element('arsenic', 4, 5, False),
+    Element('mercury', 4, 5, False),
+    Element('cadmium', 4, 5, False),
+    Element('chromium6', 4, 3, False),
+    Element('lead', 4, 5, False),
+    Element('cyanide', 4, 3, False),
+    Element('volatilePhenol', 4, 3, False),
+    Element('petroleum', 4, 2, False),
+    Element('anionicSurfactant', 4, 2, False),
+    Element('sulfide', 4, 3, False),
+    Element('fecalColiform', 5, 0, False),
+)
+
+# AFN -> layout of the query responses that do not depend on the function code of the control byte
+RESPONSE_LAYOUTS = {
+    QUERY_WATER_AMOUNT: (Element('rechargeAmount', 4, 0, False), Element('remainingWater', 5, 0, True)),
+    QUERY_REMAINING_WATER: (Element('remainingWater', 5, 0, True), Element('remainingWaterAlarm', 3, 0, False)),
+    QUERY_PUMP: (Element('voltageA', 2, 0, False), Element('voltageB', 2, 0, False), Element('voltageC', 2, 0, False),
+                 Element('currentA', 2, 1, False), Element('currentB', 2, 1, False), Element('currentC', 2, 1, False)),
+}
+# AFNs of the frames that carry measuring points of the control byte data type
+DATA_FUNCTIONS = frozenset((ALARM_REPORT, QUERY_REALTIME, QUERY_MEMORY_REPORT, REALTIME_REPORT))
+
+DIVISORS = tuple(10 ** decimal_places for decimal_places in range(10))
+
+Szy206Frame = namedtuple('Szy206Frame', ('raw', 'control', 'station', 'afn', 'data'))
+
+
+def _build_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0xE5) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC_TABLE = _build_crc_table()
+
+
+def crc(data) -> int:
+    """CRC of the user data area, polynomial x^7 + x^6 + x^5 + x^2 + 1, most significant bit first."""
+    value = 0
+    table = CRC_TABLE
+    for byte in data:
+        value = table[value ^ byte]
+    return value
+
+
+def decode_element(element, data, offset):
+    if offset + element.size > len(data):
+        raise ValueError('%s does not fit the data size %i' % (element.key, len(data)))
+    value = bcd_le_to_int(data[offset:offset + element.size], element.signed)
+    if element.decimal_places:
+        return value / DIVISORS[element.decimal_places]
+    return value
+
+
+def parse_frame(raw) -> Szy206Frame:
+    """Splits a frame checked by the frame decoder, data is a memoryview over the raw frame."""
+    return Szy206Frame(raw, raw[CONTROL_OFFSET], raw[ADDRESS_OFFSET:AFN_OFFSET].hex().upper(), raw[AFN_OFFSET],
+                       memoryview(raw)[DATA_OFFSET:-TRAILER_SIZE])
+
+
+def build_frame(control, address, afn, data=b'') -> bytes:
+    user_data = bytes((control,)) + bytes(address) + bytes((afn,)) + bytes(data)
+    return bytes((START_BYTE, len(user_data), START_BYTE)) + user_data + bytes((crc(user_data), END_BYTE))
+
+
+def build_reply(frame) -> bytes:
+    """Confirmation of the frame: the same function codes and address, the direction is down."""
+    data = frame.data[:1] if frame.afn == LINK_CHECK else b''
+    return build_frame(frame.control & ~(DIRECTION_UP | DIVISION) & 0xFF, frame.raw[ADDRESS_OFFSET:AFN_OFFSET],
+                       frame.afn, data)
+
+
+@lru_cache(maxsize=1024)
+def _hour_ts(year, month, day, hour) -> int:
+    return int(datetime(year, month, day, hour).timestamp() * 1000)
+
+
+def time_label_to_ts(data, offset, received_ts) -> int:
+    """
+    The time label holds only the second, minute, hour and day, the month and year are taken from the receive time,
+    a day after the current one belongs to the previous month.
+    """
+    second, minute, hour, day = BCD_TABLE[data[offset]], BCD_TABLE[data[offset + 1]], BCD_TABLE[data[offset + 2]], \
+        BCD_TABLE[data[offset + 3]]
+    if second is None or minute is None or second > 59 or minute > 59:
+        return received_ts
+    received = datetime.fromtimestamp(received_ts / 1000)
+    year, month = received.year, received.month
+    if day is not None and day > received.day:
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    try:
+        return _hour_ts(year, month, day, hour) + (minute * 60 + second) * 1000
+    except (TypeError, ValueError):
+        return received_ts
+
+
+@lru_cache(maxsize=256)
+def _points_layout(data_type, points_size) -> tuple:
+    """(key, start, end, signed, divisor) of every element of the points, keys of the next points get the number."""
+    elements = DATA_TYPES[data_type]
+    point_size = sum(element.size for element in elements)
+    layout = []
+    offset = 0
+    for point in range(1, points_size // point_size + 1 if point_size else 1):
+        for element in elements:
+            layout.append((element.key if point == 1 else element.key + str(point), offset, offset + element.size,
+                           element.signed, DIVISORS[element.decimal_places] if element.decimal_places else 0))
+            offset += element.size
+    return tuple(layout)
+
+
+@lru_cache(maxsize=256)
+def _points_size(data_type, data_size) -> int:
+    """Size of the measuring points, what is left is the status and the optional time label."""
+    point_size = sum(element.size for element in DATA_TYPES[data_type])
+    for tail_size in (STATUS_SIZE + TIME_LABEL_SIZE, STATUS_SIZE):
+        size = data_size - tail_size
+        if size >= 0 and (size % point_size == 0 if point_size else size == 0):
+            return size
+    raise ValueError('Data size %i does not match the data type %i' % (data_size, data_type))
+
+
+def _decode_points(data_type, data, values) -> int:
+    points_size = _points_size(data_type, len(data))
+    for key, start, end, signed, divisor in _points_layout(data_type, points_size):
+        value = bcd_le_to_int(data[start:end], signed)
+        values[key] = value / divisor if divisor else value
+    return points_size
+
+
+def _decode_water_quality(data, values) -> int:
+    mask = int.from_bytes(data[:WATER_QUALITY_MASK_SIZE], 'little')
+    offset = WATER_QUALITY_MASK_SIZE
+    for bit, element in enumerate(WATER_QUALITY):
+        if mask >> bit & 1:
+            values[element.key] = decode_element(element, data, offset)
+            offset += element.size
+    if len(data) - offset not in (STATUS_SIZE, STATUS_SIZE + TIME_LABEL_SIZE):
+        raise ValueError('Water quality parameters do not match the data size %i' % len(data))
+    return offset
+
+
+def decode_telemetry(frame, received_ts):
+    """Returns the telemetry entry of the frame, None for frames without values."""
+    data = frame.data
+    afn = frame.afn
+    values = {}
+    ts = received_ts
+
+    if afn in DATA_FUNCTIONS:
+        data_type = frame.control & FUNCTION_CODE_MASK
+        if data_type not in DATA_TYPES:
+            raise ValueError('Unknown SZY206 data type %i' % data_type)
+        if data_type == WATER_QUALITY_TYPE:
+            points_size = _decode_water_quality(data, values)
+        else:
+            points_size = _decode_points(data_type, data, values)
+        values['status'] = int.from_bytes(data[points_size:points_size + STATUS_SIZE], 'little')
+        if len(data) - points_size > STATUS_SIZE:
+            ts = time_label_to_ts(data, points_size + STATUS_SIZE, received_ts)
+    elif afn in RESPONSE_LAYOUTS:
+        offset = 0
+        for element in RESPONSE_LAYOUTS[afn]:
+            values[element.key] = decode_element(element, data, offset)
+            offset += element.size
+    elif afn == QUERY_STATUS:
+        values['status'] = int.from_bytes(data[:STATUS_SIZE], 'little')
+    else:
+        return None
+
+    return {'ts': ts, 'values': values}
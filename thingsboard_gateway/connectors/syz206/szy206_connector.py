@@ -0,0 +1,56 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from thingsboard_gateway.connectors.connector import log
+from thingsboard_gateway.connectors.frame_server_connector import FrameServerConnector
+from thingsboard_gateway.connectors.syz206.szy206_codec import ACK_FUNCTIONS, ADDRESS_OFFSET, AFN_OFFSET, \
+    FUNCTIONS, build_reply, decode_telemetry, parse_frame
+from thingsboard_gateway.connectors.syz206.szy206_frame_decoder import Szy206FrameDecoder
+
+DEFAULT_ADDRESS = ('0.0.0.0', 6206)
+STATION_ADDRESS_SLICE = slice(ADDRESS_OFFSET, AFN_OFFSET)
+DEFAULT_DEVICE_NAME_FORMAT = 'SZY206 ${stationAddress}'
+
+
+class Szy206Connector(FrameServerConnector):
+    """
+    Center station of the SZY206 water resources monitoring protocol, telemetry stations connect over TCP.
+    Replies to the functions that need an acknowledgement and sends the decoded reports as telemetry of the station.
+    """
+
+    DEFAULT_ADDRESS = DEFAULT_ADDRESS
+    DEVICE_KEY_SLICE = STATION_ADDRESS_SLICE
+    DEVICE_NAME_VARIABLE = '${stationAddress}'
+    DEFAULT_DEVICE_NAME_FORMAT = DEFAULT_DEVICE_NAME_FORMAT
+
+    def __init__(self, gateway, config, connector_type):
+        super().__init__(gateway, config, connector_type, config.get('name', 'SZY206 Connector'))
+        self.__check_crc = config.get('checkCrc', True)
+        self.__ack_functions = frozenset(int(afn, 16) for afn in config['ackFunctions']) \
+            if 'ackFunctions' in config else ACK_FUNCTIONS
+
+    def create_framer(self):
+        return Szy206FrameDecoder(check_crc=self.__check_crc)
+
+    def process_frame(self, connection, frame, ts, telemetry_batch):
+        frame = parse_frame(frame)
+        if frame.afn in self.__ack_functions and not connection.closed:
+            connection.send(build_reply(frame))
+
+        telemetry = decode_telemetry(frame, ts)
+        if telemetry is None:
+            log.debug('SZY206 %s frame from %s without telemetry', FUNCTIONS.get(frame.afn, hex(frame.afn)),
+                      frame.station)
+        else:
+            telemetry_batch.setdefault(frame.station, []).append(telemetry)
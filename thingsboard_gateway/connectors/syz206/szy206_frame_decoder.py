@@ -0,0 +1,79 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+from thingsboard_gateway.connectors.syz206.szy206_codec import END_BYTE, HEADER_SIZE, MIN_USER_DATA_SIZE, \
+    START_BYTE, TRAILER_SIZE, crc
+
+START = bytes((START_BYTE,))
+
+
+class Szy206FrameDecoder:
+    """
+    Splits the TCP stream of one station into whole frames.
+    Bytes before a start byte and frames with a wrong header, end byte or CRC are dropped, the stream resyncs
+    on the next start byte.
+    """
+
+    def __init__(self, check_crc=True):
+        self.__buffer = bytearray()
+        self.__check_crc = check_crc
+        self.dropped_bytes = 0
+        self.bad_frames = 0
+
+    def __len__(self):
+        return len(self.__buffer)
+
+    def feed(self, data) -> list:
+        """Appends received bytes to the buffer and returns the list of complete frames."""
+        buffer = self.__buffer
+        buffer += data
+        buffer_size = len(buffer)
+
+        frames = []
+        position = 0
+        while True:
+            start = buffer.find(START, position)
+            if start < 0:
+                self.dropped_bytes += buffer_size - position
+                position = buffer_size
+                break
+
+            self.dropped_bytes += start - position
+            position = start
+            if buffer_size - start < HEADER_SIZE:
+                break
+
+            user_data_size = buffer[start + 1]
+            if buffer[start + 2] != START_BYTE or user_data_size < MIN_USER_DATA_SIZE:
+                self.bad_frames += 1
+                position = start + 1
+                continue
+
+            end = start + HEADER_SIZE + user_data_size + TRAILER_SIZE
+            if end > buffer_size:
+                break
+
+            frame = bytes(buffer[start:end])
+            if frame[-1] != END_BYTE or \
+                    self.__check_crc and crc(memoryview(frame)[HEADER_SIZE:-TRAILER_SIZE]) != frame[-2]:
+                self.bad_frames += 1
+                position = start + 1
+                continue
+
+            frames.append(frame)
+            position = end
+
+        if position:
+            del buffer[:position]
+        return frames
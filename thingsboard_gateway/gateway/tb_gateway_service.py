@@ -72,7 +72,8 @@ DEFAULT_CONNECTORS = {
     "ftp": "FTPConnector",
     "socket": "SocketConnector",
     "xmpp": "XMPPConnector",
-    "ps": "PsConnector"
+    "ps": "PsConnector",
+    "syz206": "Szy206Connector"
 }
 
 DEFAULT_STATISTIC = {
@@ -1131,9 +1132,6 @@ class TBGatewayService:
         summary_messages = {"eventsProduced": 0, "eventsSent": 0}
         telemetry = {}
         for connector in self.available_connectors:
-            # todo.delete
-            if connector == 'ps Connector':
-                continue
             connector_camel_case = connector.lower().replace(' ', '')
             telemetry[(connector_camel_case + ' EventsProduced').replace(' ', '')] = \
                 self.available_connectors[connector].statistics['MessagesReceived']
@@ -1145,6 +1143,10 @@ class TBGatewayService:
                 str(connector_camel_case + ' EventsProduced').replace(' ', '')]
             summary_messages['eventsSent'] += telemetry[
                 str(connector_camel_case + ' EventsSent').replace(' ', '')]
+            # Other connector statistics (queue depth, latencies, etc.) are gauges and are sent as is
+            for key, value in list(self.available_connectors[connector].statistics.items()):
+                if key not in ('MessagesReceived', 'MessagesSent'):
+                    telemetry[connector_camel_case + key] = value
             summary_messages.update(**telemetry)
         return summary_messages
 
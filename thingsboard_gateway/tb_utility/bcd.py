@@ -0,0 +1,47 @@
+#     Copyright 2022. ThingsBoard
+#
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+
+# Packed binary coded decimal byte -> value, None for bytes with nibbles above 9
+BCD_TABLE = tuple((byte >> 4) * 10 + (byte & 0x0F) if byte >> 4 < 10 and byte & 0x0F < 10 else None
+                  for byte in range(256))
+
+
+def bcd_to_int(data) -> int:
+    """Big-endian packed BCD."""
+    value = 0
+    for byte in data:
+        digits = BCD_TABLE[byte]
+        if digits is None:
+            raise ValueError('Not a BCD value: %s' % bytes(data).hex())
+        value = value * 100 + digits
+    return value
+
+
+def bcd_le_to_int(data, signed=False) -> int:
+    """Little-endian packed BCD, the high nibble of the last byte is the sign of signed values."""
+    table = BCD_TABLE
+    index = len(data) - 1
+    last = data[index]
+    negative = False
+    if signed:
+        negative = last >> 4 != 0
+        last &= 0x0F
+    value = table[last]
+    while value is not None and index:
+        index -= 1
+        digits = table[data[index]]
+        value = value * 100 + digits if digits is not None else None
+    if value is None:
+        raise ValueError('Not a BCD value: %s' % bytes(data).hex())
+    return -value if negative else value
@@ -1,24 +1,13 @@
+from functools import reduce
+from operator import xor
+
+
 class ByteMathCal:
 
     @staticmethod
     def yihuo(content=''):
-        new_content = ''
-        for i in range(len(content)):
-            if i != 0 and i % 2 == 0:
-                print(content[i:i + 1])
-                new_content += ' ' + content[i:i + 1]
-            else:
-                new_content += content[i:i + 1]
-
-        contents = new_content.split(' ')
-        a = 0
-        for i in range(len(contents)):
-            a ^= int(contents[i], 16)
-
-        if a < 10:
-            b = '0' + a
-            return b
-        return str(hex(a)[2:])
+        """XOR of all bytes of the hex string, returned as a two digit hex string."""
+        return '%02X' % reduce(xor, bytes.fromhex(content), 0)
 
     @staticmethod
     def hex_str_2_binary_str(hex_str='') -> '':